@@ -0,0 +1,61 @@
+#!/usr/bin/env python
+"""Benchmark vectorized analyze_vitals on a synthetic 15-minute window"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'dags'))
+
+from vitals_analysis import summarize_vitals, build_user_stats  # noqa: E402
+
+
+def make_window(users: int, readings_per_user: int, seed: int = 42) -> pd.DataFrame:
+    """Synthetic readings shaped like the extract_vitals_data query result"""
+    rng = np.random.default_rng(seed)
+    rows = users * readings_per_user
+    start = pd.Timestamp.now().floor('min') - pd.Timedelta(minutes=15)
+
+    df = pd.DataFrame({
+        'id': np.arange(rows),
+        'device_id': np.repeat(np.arange(users), readings_per_user),
+        'user_id': np.repeat(np.arange(1, users + 1), readings_per_user),
+        'heart_rate': rng.normal(80, 15, rows).round(),
+        'spo2': rng.normal(97, 1.5, rows).round(1),
+        'blood_pressure_systolic': rng.normal(125, 12, rows).round(),
+        'blood_pressure_diastolic': rng.normal(80, 8, rows).round(),
+        'temperature': rng.normal(36.7, 0.3, rows).round(1),
+        'timestamp': start + pd.to_timedelta(rng.integers(0, 900, rows), unit='s'),
+    })
+    # Часть устройств не меряет SpO2 и температуру
+    df.loc[rng.random(rows) < 0.1, 'spo2'] = np.nan
+    df.loc[rng.random(rows) < 0.2, 'temperature'] = np.nan
+    return df
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--users', type=int, default=10_000)
+    parser.add_argument('--readings', type=int, default=90, help='readings per user (90 = every 10s)')
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    df = make_window(args.users, args.readings)
+    print(f"Rows: {len(df):,}, users: {args.users:,}")
+
+    timings = []
+    for _ in range(args.repeat):
+        started = time.perf_counter()
+        user_stats = build_user_stats(summarize_vitals(df))
+        timings.append(time.perf_counter() - started)
+
+    anomalies = sum(len(s['anomalies']) for s in user_stats)
+    print(f"Users analyzed: {len(user_stats):,}, anomalies: {anomalies:,}")
+    print(f"best {min(timings) * 1000:.1f} ms, median {sorted(timings)[len(timings) // 2] * 1000:.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,103 @@
+"""Hourly vitals rollup shared by the processing DAG and the backfill DAG"""
+import os
+from datetime import datetime, timedelta
+
+# Имена таблиц backend: models.PrefixedBase добавляет TABLE_PREFIX (по умолчанию med_)
+TABLE_PREFIX = os.getenv("TABLE_PREFIX", "med_")
+HEART_DATA_TABLE = f"{TABLE_PREFIX}heart_datas"
+DEVICES_TABLE = f"{TABLE_PREFIX}devices"
+
+CREATE_SUMMARY_TABLE = """
+CREATE TABLE IF NOT EXISTS hourly_vitals_summary (
+    id SERIAL PRIMARY KEY,
+    user_id INTEGER NOT NULL,
+    hour_timestamp TIMESTAMP NOT NULL,
+    readings_count INTEGER,
+    heart_rate_avg FLOAT,
+    heart_rate_min FLOAT,
+    heart_rate_max FLOAT,
+    spo2_avg FLOAT,
+    spo2_min FLOAT,
+    temperature_avg FLOAT,
+    temperature_max FLOAT,
+    bp_systolic_avg FLOAT,
+    bp_systolic_max FLOAT,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    UNIQUE(user_id, hour_timestamp)
+);
+"""
+
+# Идемпотентный upsert: повторный прогон того же диапазона перезаписывает строки
+UPSERT_SUMMARY = f"""
+INSERT INTO hourly_vitals_summary (
+    user_id, hour_timestamp, readings_count,
+    heart_rate_avg, heart_rate_min, heart_rate_max,
+    spo2_avg, spo2_min,
+    temperature_avg, temperature_max,
+    bp_systolic_avg, bp_systolic_max
+)
+SELECT
+    d.user_id,
+    date_trunc('hour', hd.timestamp) as hour_timestamp,
+    COUNT(*) as readings_count,
+    AVG(hd.heart_rate) as heart_rate_avg,
+    MIN(hd.heart_rate) as heart_rate_min,
+    MAX(hd.heart_rate) as heart_rate_max,
+    AVG(hd.spo2) as spo2_avg,
+    MIN(hd.spo2) as spo2_min,
+    AVG(hd.temperature) as temperature_avg,
+    MAX(hd.temperature) as temperature_max,
+    AVG(hd.blood_pressure_systolic) as bp_systolic_avg,
+    MAX(hd.blood_pressure_systolic) as bp_systolic_max
+FROM {HEART_DATA_TABLE} hd
+JOIN {DEVICES_TABLE} d ON hd.device_id = d.id
+WHERE hd.timestamp >= %(start)s
+  AND hd.timestamp < %(end)s
+GROUP BY d.user_id, date_trunc('hour', hd.timestamp)
+ON CONFLICT (user_id, hour_timestamp)
+DO UPDATE SET
+    readings_count = EXCLUDED.readings_count,
+    heart_rate_avg = EXCLUDED.heart_rate_avg,
+    heart_rate_min = EXCLUDED.heart_rate_min,
+    heart_rate_max = EXCLUDED.heart_rate_max,
+    spo2_avg = EXCLUDED.spo2_avg,
+    spo2_min = EXCLUDED.spo2_min,
+    temperature_avg = EXCLUDED.temperature_avg,
+    temperature_max = EXCLUDED.temperature_max,
+    bp_systolic_avg = EXCLUDED.bp_systolic_avg,
+    bp_systolic_max = EXCLUDED.bp_systolic_max,
+    created_at = CURRENT_TIMESTAMP;
+"""
+
+SHARD_SIZES = {
+    'hour': timedelta(hours=1),
+    'day': timedelta(days=1),
+}
+
+
+def aggregate_range(pg_hook, start: datetime, end: datetime) -> int:
+    """Upsert hourly summaries for [start, end), returns the number of summary rows written"""
+    conn = pg_hook.get_conn()
+    try:
+        with conn.cursor() as cursor:
+            cursor.execute(UPSERT_SUMMARY, {'start': start, 'end': end})
+            rows = cursor.rowcount
+        conn.commit()
+    finally:
+        conn.close()
+    return rows
+
+
+def split_range(start: datetime, end: datetime, shard: str = 'day') -> list:
+    """Split [start, end) into hour-aligned shards"""
+    if shard not in SHARD_SIZES:
+        raise ValueError(f"Unknown shard size '{shard}', use one of {list(SHARD_SIZES)}")
+
+    step = SHARD_SIZES[shard]
+    current = start.replace(minute=0, second=0, microsecond=0)
+    shards = []
+    while current < end:
+        shard_end = min(current + step, end)
+        shards.append({'shard_start': current.isoformat(), 'shard_end': shard_end.isoformat()})
+        current = shard_end
+    return shards
@@ -1,11 +1,20 @@
 from datetime import datetime, timedelta
 from airflow import DAG
+from airflow.models import Variable
 from airflow.operators.python import PythonOperator
 from airflow.providers.postgres.operators.postgres import PostgresOperator
 from airflow.providers.postgres.hooks.postgres import PostgresHook
+from airflow.providers.redis.hooks.redis import RedisHook
+from psycopg2.extras import execute_values
 import pandas as pd
 import numpy as np
 import json
+import logging
+
+from hourly_aggregation import CREATE_SUMMARY_TABLE, DEVICES_TABLE, HEART_DATA_TABLE, aggregate_range
+from vitals_analysis import summarize_vitals, build_user_stats
+
+logger = logging.getLogger(__name__)
 
 default_args = {
     'owner': 'medical_team',
@@ -30,7 +39,7 @@ def extract_vitals_data(**context):
     """Extract vital signs data from last 15 minutes"""
     pg_hook = PostgresHook(postgres_conn_id='medical_postgres')
 
-    query = """
+    query = f"""
     SELECT 
         hd.id,
         hd.device_id,
@@ -41,8 +50,8 @@ def extract_vitals_data(**context):
         hd.blood_pressure_diastolic,
         hd.temperature,
         hd.timestamp
-    FROM heart_data hd
-    JOIN devices d ON hd.device_id = d.id
+    FROM {HEART_DATA_TABLE} hd
+    JOIN {DEVICES_TABLE} d ON hd.device_id = d.id
     WHERE hd.timestamp >= NOW() - INTERVAL '15 minutes'
     ORDER BY hd.timestamp DESC
     """
@@ -64,60 +73,9 @@ def analyze_vitals(**context):
     if df.empty:
         return "No data to analyze"
 
-    # Group by user
-    user_stats = []
-
-    for user_id, user_data in df.groupby('user_id'):
-        stats = {
-            'user_id': int(user_id),
-            'period_start': user_data['timestamp'].min(),
-            'period_end': user_data['timestamp'].max(),
-            'readings_count': len(user_data)
-        }
-
-        # Calculate statistics for each vital
-        if user_data['heart_rate'].notna().any():
-            hr_data = user_data['heart_rate'].dropna()
-            stats['heart_rate'] = {
-                'avg': float(hr_data.mean()),
-                'min': float(hr_data.min()),
-                'max': float(hr_data.max()),
-                'std': float(hr_data.std())
-            }
-
-        if user_data['spo2'].notna().any():
-            spo2_data = user_data['spo2'].dropna()
-            stats['spo2'] = {
-                'avg': float(spo2_data.mean()),
-                'min': float(spo2_data.min()),
-                'max': float(spo2_data.max())
-            }
-
-        if user_data['temperature'].notna().any():
-            temp_data = user_data['temperature'].dropna()
-            stats['temperature'] = {
-                'avg': float(temp_data.mean()),
-                'min': float(temp_data.min()),
-                'max': float(temp_data.max())
-            }
-
-        # Detect anomalies
-        anomalies = []
-
-        if 'heart_rate' in stats:
-            hr_avg = stats['heart_rate']['avg']
-            if hr_avg > 100:
-                anomalies.append({'type': 'high_hr', 'value': hr_avg})
-            elif hr_avg < 60:
-                anomalies.append({'type': 'low_hr', 'value': hr_avg})
-
-        if 'spo2' in stats:
-            spo2_min = stats['spo2']['min']
-            if spo2_min < 95:
-                anomalies.append({'type': 'low_spo2', 'value': spo2_min})
-
-        stats['anomalies'] = anomalies
-        user_stats.append(stats)
+    # Все статистики и флаги аномалий считаются одним groupby без цикла по пользователям
+    summary = summarize_vitals(df)
+    user_stats = build_user_stats(summary)
 
     # Store results
     context['task_instance'].xcom_push(key='user_stats', value=json.dumps(user_stats))
@@ -130,77 +88,77 @@ def aggregate_hourly_data(**context):
     pg_hook = PostgresHook(postgres_conn_id='medical_postgres')
 
     # Create aggregation table if not exists
-    create_table = """
-    CREATE TABLE IF NOT EXISTS hourly_vitals_summary (
-        id SERIAL PRIMARY KEY,
-        user_id INTEGER NOT NULL,
-        hour_timestamp TIMESTAMP NOT NULL,
-        readings_count INTEGER,
-        heart_rate_avg FLOAT,
-        heart_rate_min FLOAT,
-        heart_rate_max FLOAT,
-        spo2_avg FLOAT,
-        spo2_min FLOAT,
-        temperature_avg FLOAT,
-        temperature_max FLOAT,
-        bp_systolic_avg FLOAT,
-        bp_systolic_max FLOAT,
-        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-        UNIQUE(user_id, hour_timestamp)
-    );
-    """
-
-    pg_hook.run(create_table)
+    pg_hook.run(CREATE_SUMMARY_TABLE)
 
     # Aggregate last hour's data
-    aggregate_query = """
-    INSERT INTO hourly_vitals_summary (
-        user_id, hour_timestamp, readings_count,
-        heart_rate_avg, heart_rate_min, heart_rate_max,
-        spo2_avg, spo2_min,
-        temperature_avg, temperature_max,
-        bp_systolic_avg, bp_systolic_max
+    start, end = pg_hook.get_first(
+        "SELECT date_trunc('hour', NOW() - INTERVAL '1 hour'), date_trunc('hour', NOW())"
     )
-    SELECT 
-        d.user_id,
-        date_trunc('hour', hd.timestamp) as hour_timestamp,
-        COUNT(*) as readings_count,
-        AVG(hd.heart_rate) as heart_rate_avg,
-        MIN(hd.heart_rate) as heart_rate_min,
-        MAX(hd.heart_rate) as heart_rate_max,
-        AVG(hd.spo2) as spo2_avg,
-        MIN(hd.spo2) as spo2_min,
-        AVG(hd.temperature) as temperature_avg,
-        MAX(hd.temperature) as temperature_max,
-        AVG(hd.blood_pressure_systolic) as bp_systolic_avg,
-        MAX(hd.blood_pressure_systolic) as bp_systolic_max
-    FROM heart_data hd
-    JOIN devices d ON hd.device_id = d.id
-    WHERE hd.timestamp >= date_trunc('hour', NOW() - INTERVAL '1 hour')
-      AND hd.timestamp < date_trunc('hour', NOW())
-    GROUP BY d.user_id, date_trunc('hour', hd.timestamp)
-    ON CONFLICT (user_id, hour_timestamp) 
-    DO UPDATE SET
-        readings_count = EXCLUDED.readings_count,
-        heart_rate_avg = EXCLUDED.heart_rate_avg,
-        heart_rate_min = EXCLUDED.heart_rate_min,
-        heart_rate_max = EXCLUDED.heart_rate_max,
-        spo2_avg = EXCLUDED.spo2_avg,
-        spo2_min = EXCLUDED.spo2_min,
-        temperature_avg = EXCLUDED.temperature_avg,
-        temperature_max = EXCLUDED.temperature_max,
-        bp_systolic_avg = EXCLUDED.bp_systolic_avg,
-        bp_systolic_max = EXCLUDED.bp_systolic_max,
-        created_at = CURRENT_TIMESTAMP;
-    """
-
-    result = pg_hook.run(aggregate_query)
+    rows = aggregate_range(pg_hook, start, end)
+
+    return f"Hourly aggregation completed: {rows} summary rows"
+
+
+# Повторное срабатывание по тому же пользователю и типу внутри окна не создаёт новый алерт
+ALERT_DEDUP_WINDOW_MINUTES = 60
+
+# high_hr/low_hr/low SpO2 поднимаются при ингесте правилами backend (core/trend_rules.py,
+# core/alert_rules.py) без 15-минутной задержки; пакетные алерты включаются только для сверки
+BATCH_ALERTS_VARIABLE = 'medical_batch_alerts_enabled'
+
+# Формат и ограничения списка совпадают с RedisService.store_alert
+REDIS_ALERTS_MAX_ITEMS = 100
+REDIS_ALERTS_TTL_SECONDS = 86400
+
+
+def _build_alert(anomaly: dict):
+    """Severity and message for a single anomaly"""
+    severity = 'warning'
+    message = ""
+    value = anomaly['value']
+
+    if anomaly['type'] == 'high_hr':
+        message = f"Average heart rate is elevated: {value:.1f} bpm"
+        if value > 120:
+            severity = 'critical'
+    elif anomaly['type'] == 'low_hr':
+        message = f"Average heart rate is low: {value:.1f} bpm"
+    elif anomaly['type'] == 'low_spo2':
+        message = f"Oxygen saturation dropped to: {value:.1f}%"
+        if value < 90:
+            severity = 'critical'
+
+    return severity, message
+
+
+def _push_critical_alerts(alerts: list):
+    """Push critical alerts into the same Redis lists the API reads (alerts:{user_id})"""
+    client = RedisHook(redis_conn_id='medical_redis').get_conn()
+    pipe = client.pipeline(transaction=False)
+
+    for user_id, alert_type, severity, metric_name, metric_value, message, created_at in alerts:
+        key = f"alerts:{user_id}"
+        alert = {
+            "type": severity,
+            "metric": metric_name,
+            "value": metric_value,
+            "message": message,
+            "source": "airflow",
+            "alert_type": alert_type,
+            "timestamp": created_at.isoformat()
+        }
+        pipe.lpush(key, json.dumps(alert))
+        pipe.ltrim(key, 0, REDIS_ALERTS_MAX_ITEMS - 1)
+        pipe.expire(key, REDIS_ALERTS_TTL_SECONDS)
 
-    return "Hourly aggregation completed"
+    pipe.execute()
 
 
 def generate_alerts(**context):
     """Generate alerts based on analysis"""
+    if Variable.get(BATCH_ALERTS_VARIABLE, default_var='false').lower() != 'true':
+        return "Batch alerts disabled: anomalies are alerted in real time on ingest"
+
     user_stats_json = context['task_instance'].xcom_pull(key='user_stats')
     if not user_stats_json:
         return "No stats to process"
@@ -220,56 +178,63 @@ def generate_alerts(**context):
         message TEXT,
         created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
     );
+    CREATE INDEX IF NOT EXISTS idx_generated_alerts_user_type_created
+        ON generated_alerts (user_id, alert_type, created_at);
     """
 
     pg_hook.run(create_table)
 
-    # Generate alerts for anomalies
-    alerts_generated = 0
-
+    rows = []
     for user_stat in user_stats:
         user_id = user_stat['user_id']
-
         for anomaly in user_stat.get('anomalies', []):
-            severity = 'warning'
-            message = ""
-
-            if anomaly['type'] == 'high_hr':
-                message = f"Average heart rate is elevated: {anomaly['value']:.1f} bpm"
-                if anomaly['value'] > 120:
-                    severity = 'critical'
-            elif anomaly['type'] == 'low_hr':
-                message = f"Average heart rate is low: {anomaly['value']:.1f} bpm"
-            elif anomaly['type'] == 'low_spo2':
-                message = f"Oxygen saturation dropped to: {anomaly['value']:.1f}%"
-                if anomaly['value'] < 90:
-                    severity = 'critical'
-
-            insert_alert = f"""
-            INSERT INTO generated_alerts (user_id, alert_type, severity, metric_name, metric_value, message)
-            VALUES ({user_id}, '{anomaly['type']}', '{severity}', 
-                    '{anomaly['type'].replace('_', ' ')}', {anomaly['value']}, '{message}');
-            """
-
-            pg_hook.run(insert_alert)
-            alerts_generated += 1
-
-    return f"Generated {alerts_generated} alerts"
-
-
-def cleanup_old_data(**context):
-    """Clean up old raw data (keep aggregated)"""
-    pg_hook = PostgresHook(postgres_conn_id='medical_postgres')
-
-    # Delete raw data older than 7 days
-    cleanup_query = """
-    DELETE FROM heart_data
-    WHERE timestamp < NOW() - INTERVAL '7 days';
+            severity, message = _build_alert(anomaly)
+            rows.append((
+                user_id, anomaly['type'], severity,
+                anomaly['type'].replace('_', ' '), anomaly['value'], message
+            ))
+
+    if not rows:
+        return "Generated 0 alerts"
+
+    # Одна параметризованная вставка; уже поднятые в окне алерты отсекаются в том же запросе
+    insert_alerts = f"""
+    INSERT INTO generated_alerts (user_id, alert_type, severity, metric_name, metric_value, message)
+    SELECT v.user_id, v.alert_type, v.severity, v.metric_name, v.metric_value, v.message
+    FROM (VALUES %s) AS v(user_id, alert_type, severity, metric_name, metric_value, message)
+    WHERE NOT EXISTS (
+        SELECT 1 FROM generated_alerts ga
+        WHERE ga.user_id = v.user_id
+          AND ga.alert_type = v.alert_type
+          AND ga.created_at >= NOW() - INTERVAL '{ALERT_DEDUP_WINDOW_MINUTES} minutes'
+    )
+    RETURNING user_id, alert_type, severity, metric_name, metric_value, message, created_at
     """
 
-    result = pg_hook.run(cleanup_query, autocommit=True)
-
-    return "Cleanup completed"
+    conn = pg_hook.get_conn()
+    try:
+        with conn.cursor() as cursor:
+            inserted = execute_values(
+                cursor, insert_alerts, rows,
+                template="(%s::integer, %s, %s, %s, %s::float, %s)",
+                page_size=len(rows),
+                fetch=True
+            )
+        conn.commit()
+    finally:
+        conn.close()
+
+    critical = [alert for alert in inserted if alert[2] == 'critical']
+    if critical:
+        try:
+            _push_critical_alerts(critical)
+        except Exception as e:
+            # Алерты уже сохранены в БД, Redis только ускоряет доставку в API.
+            # Чаще всего причина — не заведено подключение medical_redis (см. FINAL_SETUP.md)
+            logger.warning(f"Failed to push {len(critical)} critical alerts to Redis "
+                           f"(connection 'medical_redis'): {e}")
+
+    return f"Generated {len(inserted)} alerts ({len(rows) - len(inserted)} deduplicated, {len(critical)} critical)"
 
 
 # Define tasks
@@ -297,12 +262,6 @@ task_alerts = PythonOperator(
     dag=dag
 )
 
-task_cleanup = PythonOperator(
-    task_id='cleanup_old_data',
-    python_callable=cleanup_old_data,
-    dag=dag
-)
-
 # Define dependencies
-task_extract >> task_analyze >> [task_aggregate, task_alerts]
-task_aggregate >> task_cleanup
\ No newline at end of file
+# Очистка сырых данных — backend/retention.py, сервис retention в docker-compose (каждые 15 минут)
+task_extract >> task_analyze >> [task_aggregate, task_alerts]
\ No newline at end of file
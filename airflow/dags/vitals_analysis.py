@@ -0,0 +1,90 @@
+"""Vectorized per-user vital statistics and anomaly detection for the processing DAG"""
+import operator
+
+import numpy as np
+import pandas as pd
+
+# Статистики по каждому показателю: колонка -> список агрегатов
+VITAL_AGGREGATIONS = {
+    'heart_rate': ('mean', 'min', 'max', 'std'),
+    'spo2': ('mean', 'min', 'max'),
+    'temperature': ('mean', 'min', 'max'),
+}
+
+# Правила аномалий: (тип, колонка сводной таблицы, оператор, порог)
+ANOMALY_RULES = (
+    ('high_hr', 'heart_rate_avg', operator.gt, 100),
+    ('low_hr', 'heart_rate_avg', operator.lt, 60),
+    ('low_spo2', 'spo2_min', operator.lt, 95),
+)
+
+_STAT_NAMES = {'mean': 'avg', 'min': 'min', 'max': 'max', 'std': 'std'}
+
+
+def summarize_vitals(df: pd.DataFrame) -> pd.DataFrame:
+    """One groupby pass over raw readings: a row per user with all stats and anomaly flags"""
+    named_aggs = {
+        'period_start': pd.NamedAgg('timestamp', 'min'),
+        'period_end': pd.NamedAgg('timestamp', 'max'),
+        'readings_count': pd.NamedAgg('timestamp', 'size'),
+    }
+    for column, funcs in VITAL_AGGREGATIONS.items():
+        for func in funcs:
+            named_aggs[f"{column}_{_STAT_NAMES[func]}"] = pd.NamedAgg(column, func)
+
+    summary = df.groupby('user_id', sort=True).agg(**named_aggs)
+
+    # NaN в сравнении даёт False, поэтому пользователи без показателя не попадают в аномалии
+    for anomaly_type, column, op, threshold in ANOMALY_RULES:
+        summary[anomaly_type] = op(summary[column], threshold)
+
+    return summary
+
+
+def _isoformat(column: pd.Series) -> list:
+    """Vectorized ISO-8601 formatting (Series.dt.strftime is a per-element Python loop)"""
+    return np.datetime_as_string(pd.to_datetime(column).to_numpy(dtype='datetime64[s]'), unit='s').tolist()
+
+
+def build_user_stats(summary: pd.DataFrame) -> list:
+    """Convert the summary frame to the JSON-friendly structure consumed by generate_alerts"""
+    if summary.empty:
+        return []
+
+    user_ids = summary.index.to_numpy().tolist()
+    period_start = _isoformat(summary['period_start'])
+    period_end = _isoformat(summary['period_end'])
+    counts = summary['readings_count'].to_numpy().tolist()
+
+    user_stats = [
+        {
+            'user_id': user_id,
+            'period_start': start,
+            'period_end': end,
+            'readings_count': count,
+            'anomalies': []
+        }
+        for user_id, start, end, count in zip(user_ids, period_start, period_end, counts)
+    ]
+
+    # Вложенные статистики добавляем только пользователям, у которых есть показания
+    for column, funcs in VITAL_AGGREGATIONS.items():
+        stat_columns = [f"{column}_{_STAT_NAMES[func]}" for func in funcs]
+        values = summary[stat_columns].to_numpy(dtype=float)
+        present = ~np.isnan(values[:, 0])
+        keys = [_STAT_NAMES[func] for func in funcs]
+        for idx in np.flatnonzero(present).tolist():
+            # std одного показания равно NaN, в JSON отдаём null
+            user_stats[idx][column] = {
+                key: (value if value == value else None)
+                for key, value in zip(keys, values[idx].tolist())
+            }
+
+    # Аномалии: обходим только отмеченные строки каждой маски
+    for anomaly_type, column, _, _ in ANOMALY_RULES:
+        flagged = np.flatnonzero(summary[anomaly_type].to_numpy())
+        values = summary[column].to_numpy(dtype=float)[flagged].tolist()
+        for idx, value in zip(flagged.tolist(), values):
+            user_stats[idx]['anomalies'].append({'type': anomaly_type, 'value': value})
+
+    return user_stats
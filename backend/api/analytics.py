@@ -1,6 +1,6 @@
 from fastapi import APIRouter, Depends, Query
 from sqlalchemy.orm import Session
-from sqlalchemy import func, desc
+from sqlalchemy import func, desc, case
 from datetime import datetime, timedelta
 from typing import Optional, List
 
@@ -222,24 +222,30 @@ async def get_device_stats(
         Device.user_id == current_user.id
     ).all()
 
+    # Счётчик за неделю и последнее показание по всем устройствам одним запросом, а не два на устройство
+    week_ago = datetime.now() - timedelta(days=7)
+    readings = {
+        device_id: (readings_week, last_timestamp)
+        for device_id, readings_week, last_timestamp in db.query(
+            HeartData.device_id,
+            func.count(case((HeartData.timestamp >= week_ago, 1))),
+            func.max(HeartData.timestamp)
+        ).join(Device).filter(
+            Device.user_id == current_user.id
+        ).group_by(HeartData.device_id)
+    }
+
     device_stats = []
 
     for device in devices:
-        readings_count = db.query(HeartData).filter(
-            HeartData.device_id == device.id,
-            HeartData.timestamp >= datetime.now() - timedelta(days=7)
-        ).count()
-
-        last_reading = db.query(HeartData).filter(
-            HeartData.device_id == device.id
-        ).order_by(HeartData.timestamp.desc()).first()
+        readings_count, last_reading = readings.get(device.id, (0, None))
 
         device_stats.append({
             "device_id": device.device_id,
             "device_name": device.name,
             "status": device.status.value,
             "readings_week": readings_count,
-            "last_reading": last_reading.timestamp.isoformat() if last_reading else None,
+            "last_reading": last_reading.isoformat() if last_reading else None,
             "is_active": device.last_seen and device.last_seen > datetime.now() - timedelta(minutes=30)
         })
 
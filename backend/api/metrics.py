@@ -0,0 +1,140 @@
+import time
+
+from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi.responses import PlainTextResponse
+
+from api.auth import get_current_user
+from core.metrics import registry
+from core.profiler import profiler
+from core.websocket import manager
+from core.ward_stream import ward_hub
+from core.loop_watchdog import loop_watchdog
+from database import engine
+from models import User, UserRole
+from services.redis_service import redis_service
+from services.notification_outbox import notification_outbox, notification_dispatcher
+
+router = APIRouter()
+
+
+@router.get("/metrics", response_class=PlainTextResponse, include_in_schema=False)
+async def metrics():
+    """Prometheus text exposition"""
+    return PlainTextResponse(await registry.render(), media_type="text/plain; version=0.0.4")
+
+
+@router.get("/api/debug/loop-stalls", tags=["monitoring"])
+async def loop_stalls(limit: int = 20, current_user: User = Depends(get_current_user)):
+    """Последние блокировки цикла событий со стеком (LOOP_WATCHDOG=1, только admin)"""
+    # Стеки содержат пути и строки исходников живых запросов
+    if current_user.role != UserRole.ADMIN:
+        raise HTTPException(status_code=403, detail="Only admins can read loop stalls")
+
+    return {
+        "enabled": loop_watchdog.running,
+        "threshold_ms": loop_watchdog.threshold * 1000,
+        "max_lag_ms": round(loop_watchdog.max_lag * 1000, 1),
+        "stalls": loop_watchdog.get_reports(limit)
+    }
+
+
+@router.post("/api/debug/profile", response_class=PlainTextResponse, tags=["monitoring"])
+async def profile_process(
+        seconds: float = Query(10, gt=0, le=120),
+        interval_ms: float = Query(5, ge=1, le=100),
+        loop_only: bool = False,
+        current_user: User = Depends(get_current_user)
+):
+    """Семплирующий профиль воркера за seconds в collapsed-формате (только admin)"""
+    if current_user.role != UserRole.ADMIN:
+        raise HTTPException(status_code=403, detail="Only admins can profile the server")
+
+    try:
+        sampler = await profiler.profile(seconds, interval_ms / 1000, loop_only)
+    except RuntimeError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+
+    return PlainTextResponse(sampler.collapsed(), headers={"X-Profile-Samples": str(sampler.samples)})
+
+
+@router.get("/api/debug/profiles/{profile_id}", response_class=PlainTextResponse, tags=["monitoring"])
+async def request_profile(profile_id: str, current_user: User = Depends(get_current_user)):
+    """Профиль одного запроса, снятый по заголовку X-Profile-Token (только admin)"""
+    if current_user.role != UserRole.ADMIN:
+        raise HTTPException(status_code=403, detail="Only admins can read profiles")
+
+    stored = profiler.get_profile(profile_id)
+    if stored is None:
+        raise HTTPException(status_code=404, detail="Profile not found")
+
+    return PlainTextResponse(stored["collapsed"], headers={
+        "X-Profile-Route": stored["route"],
+        "X-Profile-Samples": str(stored["samples"]),
+        "X-Profile-Duration-Ms": str(stored["duration_ms"])
+    })
+
+
+@registry.collector("db_pool_connections", "SQLAlchemy connection pool state")
+async def _db_pool():
+    pool = engine.pool
+    return [
+        ({"state": "size"}, pool.size()),
+        ({"state": "checked_out"}, pool.checkedout()),
+        ({"state": "checked_in"}, pool.checkedin()),
+        ({"state": "overflow"}, pool.overflow()),
+    ]
+
+
+@registry.collector("redis_up", "1 if Redis is connected")
+async def _redis_up():
+    return [({}, 1 if redis_service.connected else 0)]
+
+
+@registry.collector("redis_ping_seconds", "Redis PING round-trip time measured at scrape")
+async def _redis_ping():
+    if not redis_service.connected:
+        return []
+    started = time.perf_counter()
+    await redis_service.client.ping()
+    return [({}, round(time.perf_counter() - started, 6))]
+
+
+@registry.collector("redis_client_cache_total", "Local Redis cache lookups and invalidations", "counter")
+async def _redis_client_cache():
+    return [({"result": result}, count) for result, count in redis_service.local_cache.stats.items()]
+
+
+@registry.collector("redis_client_cache_entries", "Keys held in the local Redis cache")
+async def _redis_client_cache_entries():
+    cache = redis_service.local_cache
+    return [({"tracking": "on" if cache.tracking else "off"}, len(cache.entries))]
+
+
+@registry.collector("websocket_connections", "Open WebSocket connections")
+async def _websocket_connections():
+    return [
+        ({"kind": "total"}, manager.get_total_connections_count()),
+        ({"kind": "authenticated_users"}, manager.get_authenticated_users_count()),
+        ({"kind": "ward_viewers"}, len(ward_hub.viewers)),
+        ({"kind": "ward_cohorts"}, len(ward_hub.cohorts)),
+    ]
+
+
+@registry.collector("ward_pending_patients", "Patients with deltas waiting for the next ward tick")
+async def _ward_pending():
+    return [({}, len(ward_hub.pending.keys() | ward_hub.pending_alerts.keys()))]
+
+
+@registry.collector("ward_frames_total", "Ward stream frames sent", "counter")
+async def _ward_frames():
+    return [({}, ward_hub.stats["frames"])]
+
+
+@registry.collector("notification_outbox_pending", "Notifications waiting in the outbox, including retries")
+async def _outbox_pending():
+    return [({}, await notification_outbox.pending())]
+
+
+@registry.collector("notifications_total", "Notification dispatcher outcomes", "counter")
+async def _notifications():
+    return [({"outcome": outcome}, count) for outcome, count in notification_dispatcher.stats.items()]
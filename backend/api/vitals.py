@@ -1,14 +1,21 @@
-from fastapi import APIRouter, Depends, HTTPException, BackgroundTasks
+from fastapi import APIRouter, Depends, HTTPException, BackgroundTasks, Request, Response
+from sqlalchemy import func
 from sqlalchemy.orm import Session
-from typing import List, Optional
+from typing import Dict, List, Optional
 from datetime import datetime, timedelta
 from pydantic import BaseModel
 
 from database import get_db
-from models import User, Device, HeartData
-from services.redis_service import redis_service
+from models import User, UserRole, Device, HeartData, Doctor, PatientDoctor
+from services.redis_service import redis_service, VITAL_TYPES
 from services.iot_service import iot_service
 from api.auth import get_current_user
+from core.vitals_codec import decode_batch, PayloadTooLargeError
+from core.timing import StageTimer
+from core.metrics import INGEST_STAGE_DURATION
+from core.alert_rules import alert_rules, merge_thresholds
+from core.alert_episodes import alert_episodes
+from core.traffic_capture import traffic_capture
 
 router = APIRouter()
 
@@ -27,6 +34,11 @@ class IoTData(BaseModel):
     data: dict
 
 
+class AlertThresholds(BaseModel):
+    # {"heart_rate": {"high": 110, "critical_high": 130}, ...}
+    thresholds: Dict[str, Dict[str, float]]
+
+
 @router.post("/")
 async def add_vitals(
         vital_data: VitalData,
@@ -57,14 +69,22 @@ async def add_vitals(
 @router.post("/iot")
 async def receive_iot_data(
         iot_data: IoTData,
+        request: Request,
+        response: Response,
         db: Session = Depends(get_db)
 ):
     """Receive raw IoT device data"""
+    if traffic_capture.enabled:
+        traffic_capture.write(iot_data.device_id, "/vitals/iot", request.headers, await request.body())
+    timer = StageTimer(INGEST_STAGE_DURATION)
     success = await iot_service.process_device_data(
         iot_data.device_id,
         iot_data.data,
-        db
+        db,
+        timer
     )
+    # Тайминги этапов для replay/нагрузочных тестов
+    response.headers["Server-Timing"] = timer.header()
 
     if not success:
         raise HTTPException(status_code=400, detail="Failed to process IoT data")
@@ -72,6 +92,40 @@ async def receive_iot_data(
     return {"status": "success", "message": "IoT data processed"}
 
 
+@router.post("/iot/batch")
+async def receive_iot_batch(
+        request: Request,
+        response: Response,
+        db: Session = Depends(get_db)
+):
+    """Receive a batch of readings (JSON, msgpack or binary, optionally gzip-compressed)"""
+    timer = StageTimer(INGEST_STAGE_DURATION)
+    body = await request.body()
+    device_id = None
+    try:
+        with timer.stage("decode"):
+            device_id, readings = decode_batch(
+                body,
+                request.headers.get("content-type"),
+                request.headers.get("content-encoding")
+            )
+    except PayloadTooLargeError as e:
+        raise HTTPException(status_code=413, detail=str(e))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    finally:
+        # Нераскодированные пакеты тоже пишутся: их и нужно воспроизводить
+        traffic_capture.write(device_id, "/vitals/iot/batch", request.headers, body)
+
+    processed = await iot_service.process_device_batch(device_id, readings, db, timer)
+    response.headers["Server-Timing"] = timer.header()
+
+    if processed is None:
+        raise HTTPException(status_code=400, detail="Failed to process IoT batch")
+
+    return {"status": "success", "message": "IoT batch processed", "processed": processed}
+
+
 @router.get("/latest")
 async def get_latest_vitals(
         current_user: User = Depends(get_current_user)
@@ -110,33 +164,86 @@ async def get_alerts(
     return {"alerts": alerts}
 
 
+@router.get("/alerts/active")
+async def get_active_alerts(
+        current_user: User = Depends(get_current_user)
+):
+    """Get open alert episodes"""
+    return {"episodes": alert_episodes.active(current_user.id)}
+
+
+@router.get("/thresholds")
+async def get_alert_thresholds(
+        current_user: User = Depends(get_current_user)
+):
+    """Get effective alert thresholds for the current user"""
+    overrides = await redis_service.get_alert_overrides(current_user.id)
+    return {
+        "defaults": alert_rules.thresholds,
+        "overrides": overrides,
+        "effective": merge_thresholds(alert_rules.thresholds, overrides)
+    }
+
+
+@router.put("/thresholds/{patient_id}")
+async def set_alert_thresholds(
+        patient_id: int,
+        data: AlertThresholds,
+        current_user: User = Depends(get_current_user),
+        db: Session = Depends(get_db)
+):
+    """Set per-patient alert thresholds (assigned doctors and admins only)"""
+    if current_user.role not in (UserRole.DOCTOR, UserRole.ADMIN):
+        raise HTTPException(status_code=403, detail="Only doctors can change alert thresholds")
+
+    patient = db.query(User.id).filter(User.id == patient_id, User.role == UserRole.PATIENT).first()
+    if not patient:
+        raise HTTPException(status_code=404, detail="Patient not found")
+
+    if current_user.role == UserRole.DOCTOR:
+        # Порог может заглушить критические алерты: проверяем назначение по БД, а не по кешу recipient_index
+        assigned = (
+            db.query(PatientDoctor.id)
+            .join(Doctor, Doctor.id == PatientDoctor.doctor_id)
+            .filter(PatientDoctor.patient_id == patient_id,
+                    func.lower(Doctor.email) == func.lower(current_user.email))
+            .first()
+        )
+        if not assigned:
+            raise HTTPException(status_code=403, detail="Patient is not assigned to you")
+
+    try:
+        alert_rules.set_overrides(patient_id, data.thresholds)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    await redis_service.set_alert_overrides(patient_id, data.thresholds)
+    return {"status": "success", "patient_id": patient_id, "overrides": data.thresholds}
+
+
 @router.get("/dashboard")
 async def get_vitals_dashboard(
         current_user: User = Depends(get_current_user),
         db: Session = Depends(get_db)
 ):
     """Get vitals dashboard data"""
-    # Get from cache first
+    # Get from cache first: кешированный JSON отдаём байтами, без json.loads и повторной сериализации
     cache_key = f"vitals_dashboard:{current_user.id}"
-    cached = await redis_service.cache_get(cache_key)
+    cached = await redis_service.cache_get_raw(cache_key)
     if cached:
-        return cached
-
-    # Get latest vitals
-    latest_vitals = await redis_service.get_latest_vitals(current_user.id)
+        return Response(content=cached, media_type="application/json")
 
-    # Get 24h summaries
+    # 24h summaries одним round trip: блоки core/vital_chunks, агрегаты считает NumPy
+    latest_vitals = {}
     summaries = {}
-    for vital_type in ["heart_rate", "blood_pressure", "spo2", "temperature"]:
-        history = await redis_service.get_vitals(current_user.id, vital_type, 24)
-        if history:
-            values = [h["value"] for h in history]
-            summaries[vital_type] = {
-                "avg": round(sum(values) / len(values), 1),
-                "min": min(values),
-                "max": max(values),
-                "count": len(values)
-            }
+    latest_cutoff = (datetime.now() - timedelta(hours=1)).timestamp()
+    series_by_type = await redis_service.get_vital_series(current_user.id, VITAL_TYPES, 24)
+    for vital_type, series in series_by_type.items():
+        summary = series.summary()
+        if summary:
+            summaries[vital_type] = summary
+            if series.timestamps[-1] > latest_cutoff:
+                latest_vitals[vital_type] = series.last_point()
 
     # Get alerts count
     alerts = await redis_service.get_alerts(current_user.id, 50)
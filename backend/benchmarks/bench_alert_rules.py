@@ -0,0 +1,77 @@
+#!/usr/bin/env python
+"""Benchmark the compiled alert rule engine and windowed trend rules: evaluations/sec"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from core.alert_rules import AlertRuleEngine  # noqa: E402
+from core.trend_rules import TrendRuleEngine  # noqa: E402
+
+
+def make_readings(count: int, seed: int = 42) -> list:
+    """Synthetic readings in the IoTService._extract_vitals format, some of them out of range"""
+    rng = np.random.default_rng(seed)
+    columns = {
+        'heart_rate': rng.normal(80, 15, count).round().astype(int),
+        'spo2': rng.normal(97, 1.5, count).round(1),
+        'temperature': rng.normal(36.7, 0.4, count).round(1),
+        'bp_systolic': rng.normal(125, 15, count).round().astype(int),
+        'bp_diastolic': rng.normal(80, 8, count).round().astype(int),
+    }
+    lists = {key: values.tolist() for key, values in columns.items()}
+    return [{key: lists[key][i] for key in lists} for i in range(count)]
+
+
+def best_of(repeat: int, func) -> float:
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - started)
+    return min(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--readings', type=int, default=200_000)
+    parser.add_argument('--batch', type=int, default=100, help='readings per evaluate_batch call')
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    engine = AlertRuleEngine()
+    engine.set_overrides(1, {'heart_rate': {'high': 110}})
+    readings = make_readings(args.readings)
+    batches = [readings[i:i + args.batch] for i in range(0, len(readings), args.batch)]
+
+    alerts = sum(len(engine.evaluate(r)) for r in readings)
+    print(f"Readings: {len(readings):,}, alerts: {alerts:,}")
+
+    scalar = best_of(args.repeat, lambda: [engine.evaluate(r) for r in readings])
+    override = best_of(args.repeat, lambda: [engine.evaluate(r, 1) for r in readings])
+    batched = best_of(args.repeat, lambda: [engine.evaluate_batch(b) for b in batches])
+
+    columns = {key: np.array([r[key] for r in readings], dtype=np.float64) for key in readings[0]}
+    vectorized = best_of(args.repeat, lambda: engine.evaluate_columns(columns))
+
+    def run_trends():
+        # 100 пациентов, показание раз в 10 секунд
+        trends = TrendRuleEngine()
+        for i, reading in enumerate(readings):
+            trends.update(i % 100, reading, 1_000_000 + (i // 100) * 10)
+
+    trend = best_of(args.repeat, run_trends)
+
+    print(f"evaluate:              {len(readings) / scalar:>12,.0f} readings/s")
+    print(f"evaluate (override):   {len(readings) / override:>12,.0f} readings/s")
+    print(f"evaluate_batch({args.batch}):   {len(readings) / batched:>12,.0f} readings/s")
+    print(f"evaluate_columns:      {len(readings) / vectorized:>12,.0f} readings/s")
+    print(f"trend_rules.update:    {len(readings) / trend:>12,.0f} readings/s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,95 @@
+#!/usr/bin/env python
+"""Drive NotificationDispatcher against a local Telegram stand-in with injected failures"""
+import argparse
+import asyncio
+import os
+import random
+import sys
+import time
+from collections import defaultdict
+
+from aiohttp import web
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from services.notification_outbox import NotificationDispatcher, NotificationOutbox  # noqa: E402
+
+
+class TelegramStandIn:
+    """sendMessage stand-in: records per-chat delivery times, fails a share of requests"""
+
+    def __init__(self, error_rate: float, throttle_rate: float, latency: float):
+        self.error_rate = error_rate
+        self.throttle_rate = throttle_rate
+        self.latency = latency
+        self.deliveries = defaultdict(list)
+        self.requests = 0
+
+    async def send_message(self, request: web.Request) -> web.Response:
+        self.requests += 1
+        payload = await request.json()
+        await asyncio.sleep(self.latency)
+        roll = random.random()
+        if roll < self.throttle_rate:
+            return web.json_response({"ok": False, "error_code": 429, "parameters": {"retry_after": 1}}, status=429)
+        if roll < self.throttle_rate + self.error_rate:
+            return web.json_response({"ok": False, "error_code": 502}, status=502)
+        self.deliveries[payload["chat_id"]].append((time.monotonic(), payload["text"].count("Medical Alert")))
+        return web.json_response({"ok": True})
+
+
+async def run(args):
+    stand_in = TelegramStandIn(args.error_rate, args.throttle_rate, args.latency)
+    app = web.Application()
+    app.router.add_post('/bot{token}/sendMessage', stand_in.send_message)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, '127.0.0.1', args.port)
+    await site.start()
+
+    outbox = NotificationOutbox()
+    dispatcher = NotificationDispatcher(outbox, api_url=f"http://127.0.0.1:{args.port}", token="test",
+                                        per_chat_rate=args.per_chat_rate, global_rate=args.global_rate,
+                                        backoff_seconds=0.2, backoff_max_seconds=2)
+
+    for i in range(args.messages):
+        await outbox.enqueue(f"chat-{i % args.chats}", f"🚨 Medical Alert\n\nPatient ID: {i}")
+
+    started = time.monotonic()
+    await dispatcher.start()
+    while await outbox.pending() and time.monotonic() - started < args.timeout:
+        await asyncio.sleep(0.05)
+    # Ждём, пока уйдёт последняя пачка
+    while sum(n for d in stand_in.deliveries.values() for _, n in d) + dispatcher.stats["dead"] < args.messages \
+            and time.monotonic() - started < args.timeout:
+        await asyncio.sleep(0.05)
+    elapsed = time.monotonic() - started
+    await dispatcher.stop()
+    await runner.cleanup()
+
+    delivered = sum(n for d in stand_in.deliveries.values() for _, n in d)
+    min_gap = min((b[0] - a[0] for d in stand_in.deliveries.values() for a, b in zip(d, d[1:])), default=None)
+    print(f"Messages: {args.messages:,} to {args.chats} chats in {elapsed:.2f}s")
+    print(f"Delivered: {delivered:,}, HTTP requests: {stand_in.requests:,}, stats: {dispatcher.stats}")
+    if min_gap is not None:
+        print(f"Smallest gap between sends to one chat: {min_gap * 1000:.0f} ms "
+              f"(limit {1000 / args.per_chat_rate:.0f} ms)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--messages', type=int, default=2000)
+    parser.add_argument('--chats', type=int, default=20)
+    parser.add_argument('--per-chat-rate', type=float, default=5.0)
+    parser.add_argument('--global-rate', type=float, default=100.0)
+    parser.add_argument('--error-rate', type=float, default=0.05)
+    parser.add_argument('--throttle-rate', type=float, default=0.02)
+    parser.add_argument('--latency', type=float, default=0.02, help='stand-in response time, seconds')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--timeout', type=float, default=60)
+    args = parser.parse_args()
+    asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()
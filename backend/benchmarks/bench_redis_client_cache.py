@@ -0,0 +1,106 @@
+#!/usr/bin/env python
+"""
+Redis commands per dashboard poll: server round trips with and without the
+local client-side cache.
+
+Needs a live Redis (REDIS_URL, default redis://localhost:6379); uses the db
+given by --db and flushes it. Commands are counted from INFO commandstats,
+so the numbers are what Redis actually executed.
+"""
+import argparse
+import asyncio
+import os
+import random
+import sys
+import time
+from types import SimpleNamespace
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from api.vitals import get_vitals_dashboard  # noqa: E402
+from services.client_cache import ClientSideCache  # noqa: E402
+from services.redis_service import redis_service  # noqa: E402
+
+VITAL_TYPES = ("heart_rate", "blood_pressure", "spo2", "temperature")
+
+
+async def command_count() -> int:
+    stats = await redis_service.client.info("commandstats")
+    return sum(value["calls"] for name, value in stats.items() if name != "cmdstat_info")
+
+
+async def seed(users: int, readings: int):
+    rng = random.Random(7)
+    for user_id in range(1, users + 1):
+        for _ in range(readings):
+            for vital_type in VITAL_TYPES:
+                await redis_service.store_vital("bench", user_id, vital_type, rng.randint(60, 120))
+
+
+async def run_polls(users: int, polls: int, expire_every: int) -> tuple:
+    """polls опросов дашборда каждым пользователем; каждые expire_every раундов кеш дашборда истекает"""
+    before = await command_count()
+    started = time.perf_counter()
+    for round_number in range(polls):
+        if expire_every and round_number % expire_every == 0:
+            # Так выглядит истечение TTL дашборда: ключи удаляет сервер
+            await redis_service.client.delete(*(f"vitals_dashboard:{u}" for u in range(1, users + 1)))
+            await asyncio.sleep(0.01)  # дать инвалидациям дойти
+        for user_id in range(1, users + 1):
+            await get_vitals_dashboard(current_user=SimpleNamespace(id=user_id), db=None)
+    elapsed = time.perf_counter() - started
+    # delete() не относится к опросу
+    rounds_with_expiry = len(range(0, polls, expire_every)) if expire_every else 0
+    return await command_count() - before - rounds_with_expiry, elapsed
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--url', default=os.getenv('REDIS_URL', 'redis://localhost:6379'))
+    parser.add_argument('--db', type=int, default=15)
+    parser.add_argument('--users', type=int, default=50)
+    parser.add_argument('--readings', type=int, default=60, help='stored readings per vital type')
+    parser.add_argument('--polls', type=int, default=60, help='dashboard polls per user')
+    parser.add_argument('--expire-every', type=int, default=20, help='polls between dashboard cache expiries')
+    args = parser.parse_args()
+
+    redis_service.local_cache = ClientSideCache(prefixes=())
+    await redis_service.connect(f"{args.url.rstrip('/')}/{args.db}")
+    if not redis_service.connected:
+        sys.exit("Redis is not reachable")
+    await redis_service.client.flushdb()
+    await seed(args.users, args.readings)
+    total_polls = args.users * args.polls
+
+    # Промах кеша дашборда: полный пересчёт
+    await redis_service.client.delete(*(f"vitals_dashboard:{u}" for u in range(1, args.users + 1)))
+    miss_ops, _ = await run_polls(args.users, 1, 0)
+
+    baseline_ops, baseline_time = await run_polls(args.users, args.polls, args.expire_every)
+    await redis_service.disconnect()
+
+    redis_service.local_cache = ClientSideCache()
+    await redis_service.connect(f"{args.url.rstrip('/')}/{args.db}")
+    for _ in range(100):
+        if redis_service.local_cache.tracking:
+            break
+        await asyncio.sleep(0.01)
+    cached_ops, cached_time = await run_polls(args.users, args.polls, args.expire_every)
+    stats = dict(redis_service.local_cache.stats)
+    tracking = redis_service.local_cache.tracking
+    await redis_service.client.flushdb()
+    await redis_service.disconnect()
+
+    print(f"{args.users} users x {args.polls} polls, dashboard cache expires every {args.expire_every} polls")
+    print(f"cache miss (full rebuild):      {miss_ops / args.users:6.2f} Redis commands/poll")
+    print(f"Redis cache only:               {baseline_ops / total_polls:6.2f} Redis commands/poll, "
+          f"{baseline_time / total_polls * 1e6:7.1f} us/poll")
+    print(f"+ local cache (tracking {'on' if tracking else 'off'}):  {cached_ops / total_polls:6.2f} Redis commands/poll, "
+          f"{cached_time / total_polls * 1e6:7.1f} us/poll")
+    print(f"saved per poll:                 {(baseline_ops - cached_ops) / total_polls:6.2f} Redis commands "
+          f"({1 - cached_ops / max(baseline_ops, 1):.0%})")
+    print(f"local cache: {stats}")
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
@@ -0,0 +1,136 @@
+#!/usr/bin/env python
+"""
+Redis memory per user for vitals: legacy JSON ZSET members, compact v2 ZSET
+members and v3 time chunks (core/vital_chunks.py).
+
+Fills 24h of readings per vital type for a few users in each format, reports
+MEMORY USAGE per user and the cost of reading the 24h window back through
+RedisService.get_vitals (dicts) and get_vital_series (NumPy, as the dashboard
+reads it). Needs a live Redis (REDIS_URL); flushes --db.
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import sys
+import time
+from datetime import datetime
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from core import vital_chunks  # noqa: E402
+from core.config import settings  # noqa: E402
+from core.vital_points import encode_point  # noqa: E402
+from services.client_cache import ClientSideCache  # noqa: E402
+from services.redis_service import redis_service  # noqa: E402
+
+VITALS = {
+    "heart_rate": lambda rng: rng.randint(55, 130),
+    "blood_pressure": lambda rng: rng.randint(100, 160),
+    "spo2": lambda rng: round(rng.uniform(92, 100), 1),
+    "temperature": lambda rng: round(rng.uniform(36.0, 38.5), 1),
+    "respiratory_rate": lambda rng: rng.randint(12, 24),
+}
+
+
+def legacy_member(value, device_id: str, timestamp: float) -> str:
+    return json.dumps({"device_id": device_id, "value": value,
+                       "timestamp": datetime.fromtimestamp(timestamp).isoformat()})
+
+
+def compact_member(value, device_id: str, timestamp: float) -> str:
+    return encode_point(value, device_id, timestamp)
+
+
+async def fill(users: int, points: int, interval: float, encode) -> None:
+    rng = random.Random(11)
+    start = time.time() - points * interval
+    for user_id in range(1, users + 1):
+        device_id = f"ESP32_{user_id:04d}"
+        for vital_type, generate in VITALS.items():
+            key = f"vitals:{user_id}:{vital_type}"
+            pipe = redis_service.client.pipeline(transaction=False)
+            for i in range(points):
+                timestamp = start + i * interval
+                pipe.zadd(key, {encode(generate(rng), device_id, timestamp): timestamp})
+                if len(pipe) >= 1000:
+                    await pipe.execute()
+            await pipe.execute()
+
+
+async def fill_chunks(users: int, points: int, interval: float) -> None:
+    rng = random.Random(11)
+    start = time.time() - points * interval
+    chunk_seconds = settings.VITALS_CHUNK_SECONDS
+    for user_id in range(1, users + 1):
+        device_index = await redis_service._device_index(f"ESP32_{user_id:04d}")
+        for vital_type, generate in VITALS.items():
+            pipe = redis_service.raw.pipeline(transaction=False)
+            for i in range(points):
+                timestamp = start + i * interval
+                bucket, record = vital_chunks.encode_record(timestamp, device_index, generate(rng), chunk_seconds)
+                key = vital_chunks.chunk_key(user_id, vital_type, bucket)
+                pipe.append(key, record)
+                pipe.expireat(key, (bucket + 1) * chunk_seconds + 86_400)
+                if len(pipe) >= 1000:
+                    await pipe.execute()
+            await pipe.execute()
+
+
+async def measure(users: int) -> tuple:
+    per_user = []
+    for user_id in range(1, users + 1):
+        usage = await redis_service.vitals_memory_usage(user_id)
+        per_user.append(sum(usage.values()))
+    started = time.perf_counter()
+    for user_id in range(1, users + 1):
+        for vital_type in VITALS:
+            await redis_service.get_vitals(user_id, vital_type, 25)
+    read_seconds = (time.perf_counter() - started) / (users * len(VITALS))
+    started = time.perf_counter()
+    for user_id in range(1, users + 1):
+        await redis_service.get_vital_series(user_id, list(VITALS), 25)
+    series_seconds = (time.perf_counter() - started) / (users * len(VITALS))
+    return sum(per_user) / users, read_seconds, series_seconds
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--url', default=os.getenv('REDIS_URL', 'redis://localhost:6379'))
+    parser.add_argument('--db', type=int, default=15)
+    parser.add_argument('--users', type=int, default=3)
+    parser.add_argument('--points', type=int, default=8640, help='readings per vital type (24h at 10 s)')
+    args = parser.parse_args()
+
+    redis_service.local_cache = ClientSideCache(prefixes=())
+    await redis_service.connect(f"{args.url.rstrip('/')}/{args.db}")
+    if not redis_service.connected:
+        sys.exit("Redis is not reachable")
+    interval = 86_400 / args.points
+
+    results = {}
+    for name, encode in (("legacy JSON", legacy_member), ("compact v2", compact_member), ("chunks v3", None)):
+        await redis_service.client.flushdb()
+        # Чтение старых ZSET нужно только форматам v1/v2; для блоков — установившийся режим без него
+        settings.VITALS_LEGACY_READ = encode is not None
+        if encode is None:
+            await fill_chunks(args.users, args.points, interval)
+        else:
+            await fill(args.users, args.points, interval, encode)
+        results[name] = await measure(args.users)
+    await redis_service.client.flushdb()
+    await redis_service.disconnect()
+
+    points = args.points * len(VITALS)
+    print(f"{args.users} users, {len(VITALS)} vital types x {args.points} points (24h)")
+    for name, (memory, read_seconds, series_seconds) in results.items():
+        print(f"{name:12s} {memory / 1024 / 1024:8.2f} MiB/user  {memory / points:6.1f} B/point  "
+              f"24h read {read_seconds * 1000:6.1f} ms/series (dicts), {series_seconds * 1000:6.1f} ms/series (NumPy)")
+    legacy, compact, chunks = (results[name][0] for name in ("legacy JSON", "compact v2", "chunks v3"))
+    print(f"compact v2 saved {1 - compact / legacy:.0%} of vitals memory per user")
+    print(f"chunks v3: {compact / chunks:.1f}x less memory than compact v2, {legacy / chunks:.1f}x less than legacy JSON")
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
@@ -0,0 +1,108 @@
+#!/usr/bin/env python
+"""Benchmark the doctor ward stream: coalesced cohort frames vs per-update fan-out"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from core.ward_stream import WardHub  # noqa: E402
+
+
+class CountingSocket:
+    """WebSocket stand-in that only counts what would be written"""
+
+    def __init__(self):
+        self.frames = 0
+        self.bytes = 0
+
+    async def send_text(self, text: str):
+        self.frames += 1
+        self.bytes += len(text)
+
+
+def make_reading(rng: random.Random) -> dict:
+    return {
+        "heart_rate": rng.randint(60, 110),
+        "spo2": round(rng.uniform(94, 99), 1),
+        "temperature": round(rng.uniform(36.4, 37.4), 1),
+        "bp_systolic": rng.randint(110, 140),
+        "bp_diastolic": rng.randint(70, 90),
+    }
+
+
+async def run_hub(viewers: int, patients: int, wards: int, ticks: int, readings_per_tick: int, seed: int):
+    rng = random.Random(seed)
+    hub = WardHub()
+    sockets = [CountingSocket() for _ in range(viewers)]
+    ward_size = patients // wards
+    for i, socket in enumerate(sockets):
+        ward = i % wards
+        await hub.subscribe(f"viewer-{i}", socket, range(ward * ward_size, (ward + 1) * ward_size))
+
+    publish_time = flush_time = 0.0
+    for _ in range(ticks):
+        started = time.perf_counter()
+        for _ in range(readings_per_tick):
+            hub.publish_vitals(rng.randrange(patients), make_reading(rng))
+        publish_time += time.perf_counter() - started
+
+        started = time.perf_counter()
+        await hub.flush()
+        flush_time += time.perf_counter() - started
+
+    frames = sum(s.frames for s in sockets) - viewers
+    sent = sum(s.bytes for s in sockets)
+    return publish_time, flush_time, frames, sent
+
+
+async def run_naive(viewers: int, patients: int, wards: int, ticks: int, readings_per_tick: int, seed: int):
+    """Baseline: every reading encoded and sent to every viewer of that patient"""
+    rng = random.Random(seed)
+    sockets = [CountingSocket() for _ in range(viewers)]
+    ward_size = patients // wards
+    watchers = {}
+    for i, socket in enumerate(sockets):
+        ward = i % wards
+        for patient_id in range(ward * ward_size, (ward + 1) * ward_size):
+            watchers.setdefault(patient_id, []).append(socket)
+
+    started = time.perf_counter()
+    for _ in range(ticks):
+        for _ in range(readings_per_tick):
+            patient_id = rng.randrange(patients)
+            reading = make_reading(rng)
+            for socket in watchers.get(patient_id, ()):
+                await socket.send_text(json.dumps({"type": "vital_update", "patient_id": patient_id, "data": reading}))
+    elapsed = time.perf_counter() - started
+    return elapsed, sum(s.frames for s in sockets), sum(s.bytes for s in sockets)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--viewers', type=int, default=500)
+    parser.add_argument('--patients', type=int, default=50)
+    parser.add_argument('--wards', type=int, default=1, help='distinct patient sets among viewers')
+    parser.add_argument('--ticks', type=int, default=60)
+    parser.add_argument('--readings-per-tick', type=int, default=50, help='one reading per patient per second')
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+    params = (args.viewers, args.patients, args.wards, args.ticks, args.readings_per_tick, args.seed)
+
+    publish, flush, frames, sent = asyncio.run(run_hub(*params))
+    naive, naive_frames, naive_sent = asyncio.run(run_naive(*params))
+
+    readings = args.ticks * args.readings_per_tick
+    print(f"{args.viewers} viewers x {args.patients} patients in {args.wards} ward(s), "
+          f"{readings:,} readings over {args.ticks} ticks")
+    print(f"ward stream: publish {publish * 1e6 / readings:.1f} us/reading, "
+          f"flush {flush * 1000 / args.ticks:.2f} ms/tick, {frames:,} frames, {sent / 1e6:.1f} MB")
+    print(f"per-update:  {naive * 1000 / args.ticks:.2f} ms/tick, {naive_frames:,} frames, {naive_sent / 1e6:.1f} MB")
+
+
+if __name__ == "__main__":
+    main()
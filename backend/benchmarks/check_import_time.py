@@ -0,0 +1,111 @@
+#!/usr/bin/env python
+"""
+Import-time budget check for the backend worker.
+
+Imports the module (api.vitals by default: the ingest path that every worker
+loads) in --repeat fresh interpreters with -X importtime and prints the
+heaviest imports. Exits with status 1 if the import pulls in a module that
+must stay lazy (aiohttp, numpy, pandas by default). The median import time
+is compared with --budget; going over it only warns, because a single cold
+import on a busy CI runner is noisy. Pass --strict-budget to fail on it.
+
+    python benchmarks/check_import_time.py --budget 1.0 --repeat 5
+
+The lazy-import check and the budget (IMPORT_BUDGET_SECONDS, generous by
+default there) run under pytest in test_import_time.py.
+"""
+import argparse
+import os
+import re
+import statistics
+import subprocess
+import sys
+import time
+
+BACKEND_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+LINE = re.compile(r"import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)")
+LAZY_MODULES = ('aiohttp', 'numpy', 'pandas')
+
+
+def profile_import(module: str) -> tuple:
+    """Return (wall seconds, [(cumulative us, self us, depth, name)], stderr) for a cold import"""
+    started = time.perf_counter()
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', f'import {module}'],
+                            cwd=BACKEND_DIR, capture_output=True, text=True)
+    wall = time.perf_counter() - started
+    entries = []
+    errors = []
+    for line in result.stderr.splitlines():
+        match = LINE.match(line)
+        if match:
+            self_us, cumulative_us, indent, name = match.groups()
+            entries.append((int(cumulative_us), int(self_us), len(indent) // 2, name))
+        elif not line.startswith('import time:'):
+            errors.append(line)
+    if result.returncode != 0:
+        raise RuntimeError('\n'.join(errors[-15:]))
+    return wall, entries
+
+
+def import_total(module: str, entries: list) -> float:
+    """Cumulative seconds of the top-level import of module"""
+    return next((cumulative for cumulative, _, depth, name in entries
+                 if depth == 0 and name == module), 0) / 1e6
+
+
+def median_import(module: str, repeat: int) -> tuple:
+    """(median seconds, [seconds per run], wall of the last run, entries of the last run)"""
+    totals = []
+    for _ in range(max(1, repeat)):
+        wall, entries = profile_import(module)
+        totals.append(import_total(module, entries))
+    return statistics.median(totals), totals, wall, entries
+
+
+def eager_imports(entries: list, lazy=LAZY_MODULES) -> list:
+    imported = {name for _, _, _, name in entries}
+    return [name for name in lazy if name and name in imported]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--module', default='api.vitals', help='module to import (default: api.vitals)')
+    parser.add_argument('--budget', type=float, default=float(os.getenv('IMPORT_BUDGET_SECONDS', '1.0')),
+                        help='median import time budget in seconds')
+    parser.add_argument('--repeat', type=int, default=5, help='cold imports to take the median of')
+    parser.add_argument('--strict-budget', action='store_true', help='fail (not just warn) over the budget')
+    parser.add_argument('--lazy', default=','.join(LAZY_MODULES),
+                        help='comma-separated modules that must not be imported eagerly')
+    parser.add_argument('--top', type=int, default=15, help='heaviest imports to show')
+    args = parser.parse_args()
+
+    try:
+        total, totals, wall, entries = median_import(args.module, args.repeat)
+    except RuntimeError as e:
+        print(f"FAIL: import {args.module} raised:\n{e}")
+        sys.exit(1)
+
+    top_level = sorted((entry for entry in entries if entry[2] <= 1), reverse=True)[:args.top]
+
+    print(f"import {args.module}: median {total:.3f} s over {len(totals)} runs "
+          f"(min {min(totals):.3f} s, max {max(totals):.3f} s; last run {len(entries)} modules, wall {wall:.3f} s)")
+    print(f"{'cumulative':>12} {'self':>10}  module")
+    for cumulative, self_us, depth, name in top_level:
+        print(f"{cumulative / 1000:>10.1f}ms {self_us / 1000:>8.1f}ms  {'  ' * depth}{name}")
+
+    failed = False
+    eager = eager_imports(entries, args.lazy.split(','))
+    if eager:
+        failed = True
+        print(f"FAIL: imported eagerly, should be deferred until first use: {', '.join(eager)}")
+    if total > args.budget:
+        failed = failed or args.strict_budget
+        print(f"{'FAIL' if args.strict_budget else 'WARN'}: median import time {total:.3f} s "
+              f"exceeds budget {args.budget:.3f} s")
+    elif not failed:
+        print(f"OK: within {args.budget:.3f} s budget")
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == '__main__':
+    main()
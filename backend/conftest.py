@@ -0,0 +1,48 @@
+"""Общие фикстуры тестов: SQLite в памяти вместо PostgreSQL и TestClient с подменой пользователя"""
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+
+@pytest.fixture
+def db_session():
+    from sqlalchemy import create_engine
+    from sqlalchemy.orm import sessionmaker
+    from sqlalchemy.pool import StaticPool
+
+    import models
+    from core.query_tracker import instrument_engine
+
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    instrument_engine(engine)
+    models.Base.metadata.create_all(engine)
+    session = sessionmaker(autocommit=False, autoflush=False, bind=engine)()
+    try:
+        yield session
+    finally:
+        session.close()
+        engine.dispose()
+
+
+@pytest.fixture
+def make_client(db_session):
+    """make_client(router, prefix, user) -> TestClient; get_db отдаёт db_session, get_current_user — user"""
+    pytest.importorskip("httpx")
+    from fastapi import FastAPI
+    from fastapi.testclient import TestClient
+
+    from api.auth import get_current_user
+    from database import get_db
+
+    def make(router, prefix: str, user=None) -> TestClient:
+        app = FastAPI()
+        app.include_router(router, prefix=prefix)
+        app.dependency_overrides[get_db] = lambda: db_session
+        if user is not None:
+            app.dependency_overrides[get_current_user] = lambda: user
+        return TestClient(app)
+
+    return make
@@ -0,0 +1,183 @@
+"""
+Эпизоды алертов: состояние по паре (пациент, метрика) вместо алерта на каждое показание.
+
+- Первое срабатывание открывает эпизод и сразу уведомляет ("opened").
+- Повышение уровня (warning -> critical) уведомляет сразу ("escalated").
+- Пока эпизод открыт, повторы подавляются; напоминание ("ongoing") уходит
+  не чаще раза в ALERT_RENOTIFY_MINUTES.
+- Гистерезис: эпизод закрывается ("resolved"), а critical понижается до
+  warning, только когда значение ушло за порог на ALERT_HYSTERESIS. Значения,
+  колеблющиеся у порога, не дают серии открытий/закрытий.
+
+Состояние хранится в памяти процесса.
+"""
+import time
+from datetime import datetime
+from typing import Dict, List, Mapping, Optional, Sequence
+
+from core.alert_rules import METRIC_KEYS
+from core.config import settings
+
+SEVERITY = {"warning": 1, "critical": 2}
+
+
+class AlertEpisode:
+    __slots__ = ("level", "direction", "threshold", "started_at", "notified_at",
+                 "last_seen", "last_value", "peak_value", "suppressed")
+
+    def __init__(self, alert: dict, now: float):
+        self.level = alert["type"]
+        self.direction = alert["direction"]
+        self.threshold = alert["threshold"]
+        self.started_at = now
+        self.notified_at = now
+        self.last_seen = now
+        self.last_value = alert["value"]
+        self.peak_value = alert["value"]
+        self.suppressed = 0
+
+    def observe(self, value, now: float):
+        self.last_seen = now
+        self.last_value = value
+        if (value > self.peak_value) if self.direction == "high" else (value < self.peak_value):
+            self.peak_value = value
+
+    def to_dict(self, metric: str) -> dict:
+        return {
+            "metric": metric,
+            "type": self.level,
+            "direction": self.direction,
+            "threshold": self.threshold,
+            "started_at": datetime.fromtimestamp(self.started_at).isoformat(),
+            "last_value": self.last_value,
+            "peak_value": self.peak_value,
+            "suppressed": self.suppressed
+        }
+
+
+class AlertEpisodeTracker:
+    def __init__(self, renotify_seconds: Optional[float] = None, stale_seconds: Optional[float] = None,
+                 hysteresis: Optional[Mapping[str, float]] = None):
+        self.renotify_seconds = (renotify_seconds if renotify_seconds is not None
+                                 else settings.ALERT_RENOTIFY_MINUTES * 60)
+        self.stale_seconds = stale_seconds if stale_seconds is not None else settings.ALERT_EPISODE_STALE_MINUTES * 60
+        hysteresis = hysteresis if hysteresis is not None else settings.ALERT_HYSTERESIS
+        self.margins = {metric: hysteresis.get(config_key, 0) for metric, (_, config_key) in METRIC_KEYS.items()}
+        # Оконные правила: metric — имя правила, значение приходит в vitals под тем же именем
+        self.margins.update((rule["name"], rule.get("hysteresis", 0)) for rule in settings.VITAL_TREND_RULES)
+        self.episodes: Dict[int, Dict[str, AlertEpisode]] = {}
+        self.suppressed_total = 0
+        self._last_sweep = time.time()
+
+    def _cleared(self, metric: str, episode: AlertEpisode, value) -> bool:
+        """Значение вернулось за порог эпизода с запасом гистерезиса"""
+        margin = self.margins.get(metric, 0)
+        if episode.direction == "high":
+            return value <= episode.threshold - margin
+        return value >= episode.threshold + margin
+
+    def _notify(self, alert: dict, episode: AlertEpisode, state: str, now: float) -> dict:
+        alert["state"] = state
+        alert["episode_started"] = datetime.fromtimestamp(episode.started_at).isoformat()
+        if episode.suppressed:
+            alert["suppressed"] = episode.suppressed
+        episode.notified_at = now
+        episode.suppressed = 0
+        return alert
+
+    def _resolve(self, metric: str, episode: AlertEpisode, value, now: float) -> dict:
+        minutes = (now - episode.started_at) / 60
+        return {
+            "type": "resolved",
+            # Уровень эпизода: по нему выбираются получатели, как у исходного алерта
+            "level": episode.level,
+            "metric": metric,
+            "value": value,
+            "message": f"Resolved: {metric} back to {value} after {minutes:.0f} min (peak {episode.peak_value})",
+            "threshold": episode.threshold,
+            "direction": episode.direction,
+            "timestamp": datetime.fromtimestamp(now).isoformat(),
+            "state": "resolved",
+            "episode_started": datetime.fromtimestamp(episode.started_at).isoformat()
+        }
+
+    def update(self, user_id: int, vitals: Mapping[str, float], alerts: Sequence[dict],
+               now: Optional[float] = None) -> List[dict]:
+        """Применить показание и его алерты, вернуть то, о чём нужно уведомить"""
+        user_episodes = self.episodes.get(user_id)
+        if not alerts and not user_episodes:
+            return []
+
+        now = now if now is not None else time.time()
+        if now - self._last_sweep > self.stale_seconds:
+            self.expire_stale(now)
+            user_episodes = self.episodes.get(user_id)
+        notifications = []
+        fired = set()
+
+        for alert in alerts:
+            metric = alert["metric"]
+            fired.add(metric)
+            episode = user_episodes.get(metric) if user_episodes else None
+
+            if episode is None or episode.direction != alert["direction"] \
+                    or now - episode.last_seen > self.stale_seconds:
+                if user_episodes is None:
+                    user_episodes = self.episodes[user_id] = {}
+                episode = user_episodes[metric] = AlertEpisode(alert, now)
+                notifications.append(self._notify(alert, episode, "opened", now))
+                continue
+
+            value = alert["value"]
+            episode.observe(value, now)
+            severity = SEVERITY.get(alert["type"], 0)
+            current = SEVERITY.get(episode.level, 0)
+
+            if severity > current:
+                episode.level, episode.threshold = alert["type"], alert["threshold"]
+                notifications.append(self._notify(alert, episode, "escalated", now))
+                continue
+            if severity < current and self._cleared(metric, episode, value):
+                episode.level, episode.threshold = alert["type"], alert["threshold"]
+
+            if now - episode.notified_at >= self.renotify_seconds:
+                if episode.level != alert["type"]:
+                    # Ещё в полосе гистерезиса critical-порога: напоминаем о critical
+                    alert["type"], alert["threshold"] = episode.level, episode.threshold
+                notifications.append(self._notify(alert, episode, "ongoing", now))
+            else:
+                episode.suppressed += 1
+                self.suppressed_total += 1
+
+        if user_episodes:
+            for metric in [m for m in user_episodes if m not in fired]:
+                episode = user_episodes[metric]
+                value = vitals.get(METRIC_KEYS[metric][0] if metric in METRIC_KEYS else metric)
+                if value is None:
+                    continue
+                episode.observe(value, now)
+                if self._cleared(metric, episode, value):
+                    del user_episodes[metric]
+                    notifications.append(self._resolve(metric, episode, value, now))
+            if not user_episodes:
+                del self.episodes[user_id]
+
+        return notifications
+
+    def expire_stale(self, now: Optional[float] = None):
+        """Забыть эпизоды устройств, которые перестали присылать данные"""
+        now = now if now is not None else time.time()
+        self._last_sweep = now
+        for user_id in list(self.episodes):
+            user_episodes = self.episodes[user_id]
+            for metric in [m for m, e in user_episodes.items() if now - e.last_seen > self.stale_seconds]:
+                del user_episodes[metric]
+            if not user_episodes:
+                del self.episodes[user_id]
+
+    def active(self, user_id: int) -> List[dict]:
+        """Открытые эпизоды пациента"""
+        return [episode.to_dict(metric) for metric, episode in self.episodes.get(user_id, {}).items()]
+
+
+alert_episodes = AlertEpisodeTracker()
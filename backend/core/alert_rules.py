@@ -0,0 +1,214 @@
+"""
+Табличный движок правил алертов по показателям жизнедеятельности.
+
+Пороги берутся из settings.VITAL_THRESHOLDS и один раз компилируются в плоскую
+таблицу (vital_key, rules), где правила уже упорядочены по приоритету:
+critical_high, critical_low, high, low. Оценка одного показания — это проход
+по таблице с числовыми сравнениями; словарь алерта и текст сообщения создаются
+только для сработавшего правила.
+
+Для пациента можно переопределить отдельные пороги (set_overrides): базовые
+значения сливаются с переопределениями и компилируются в отдельную таблицу.
+evaluate_columns/evaluate_batch оценивают пакет показаний векторно через NumPy;
+NumPy импортируется при первом пакетном вызове, а не при старте воркера.
+"""
+from datetime import datetime
+from typing import TYPE_CHECKING, Dict, List, Mapping, NamedTuple, Optional, Sequence, Tuple
+import time
+
+from core.config import settings
+
+if TYPE_CHECKING:
+    import numpy as np
+
+# (ключ в данных IoTService, ключ в VITAL_THRESHOLDS, metric в алерте, подпись, единицы)
+VITAL_METRICS = (
+    ("heart_rate", "heart_rate", "heart_rate", "Heart rate", " bpm"),
+    ("spo2", "spo2", "spo2", "SpO2", "%"),
+    ("temperature", "temperature", "temperature", "Temperature", "°C"),
+    ("bp_systolic", "blood_pressure_systolic", "blood_pressure", "Systolic BP", ""),
+    ("bp_diastolic", "blood_pressure_diastolic", "blood_pressure_diastolic", "Diastolic BP", ""),
+)
+
+# (уровень порога, тип алерта, направление) в порядке приоритета
+RULE_LEVELS = (
+    ("critical_high", "critical", "high"),
+    ("critical_low", "critical", "low"),
+    ("high", "warning", "high"),
+    ("low", "warning", "low"),
+)
+
+# Старое имя метрики из AlertService.check_thresholds
+METRIC_ALIASES = {"blood_pressure": "bp_systolic"}
+
+OVERRIDES_REFRESH_SECONDS = 60
+
+_THRESHOLD_KEYS = {config_key: vital_key for vital_key, config_key, *_ in VITAL_METRICS}
+# metric в алерте -> (ключ в данных IoTService, ключ в VITAL_THRESHOLDS)
+METRIC_KEYS = {metric: (vital_key, config_key) for vital_key, config_key, metric, _, _ in VITAL_METRICS}
+_LEVEL_NAMES = {level for level, _, _ in RULE_LEVELS}
+_NO_ALERTS: Tuple[dict, ...] = ()
+
+
+class CompiledRule(NamedTuple):
+    limit: float
+    high: bool
+    level: str
+    direction: str
+    metric: str
+    template: str
+
+    def alert(self, value, timestamp: str) -> dict:
+        return {
+            "type": self.level,
+            "metric": self.metric,
+            "value": value,
+            "message": self.template.format(value=value),
+            "threshold": self.limit,
+            "direction": self.direction,
+            "timestamp": timestamp
+        }
+
+
+RuleTable = Tuple[Tuple[str, Tuple[CompiledRule, ...]], ...]
+
+
+def _message_template(level: str, direction: str, label: str, unit: str, limit) -> str:
+    prefix = "Critical" if level == "critical" else direction.capitalize()
+    return f"{prefix}: {label} {{value}}{unit} ({'above' if direction == 'high' else 'below'} {limit}{unit})"
+
+
+def compile_rules(thresholds: Mapping[str, Mapping[str, float]]) -> RuleTable:
+    """Скомпилировать пороги вида VITAL_THRESHOLDS в упорядоченную таблицу правил"""
+    table = []
+    for vital_key, config_key, metric, label, unit in VITAL_METRICS:
+        limits = thresholds.get(config_key) or {}
+        rules = tuple(
+            CompiledRule(limits[name], direction == "high", level, direction, metric,
+                         _message_template(level, direction, label, unit, limits[name]))
+            for name, level, direction in RULE_LEVELS
+            if limits.get(name) is not None
+        )
+        if rules:
+            table.append((vital_key, rules))
+    return tuple(table)
+
+
+def merge_thresholds(base: Mapping[str, Mapping[str, float]],
+                     overrides: Mapping[str, Mapping[str, float]]) -> Dict[str, Dict[str, float]]:
+    """Наложить переопределения пациента на базовые пороги, ValueError при неизвестных ключах"""
+    merged = {key: dict(limits) for key, limits in base.items()}
+    for config_key, limits in overrides.items():
+        if config_key not in _THRESHOLD_KEYS:
+            raise ValueError(f"Unknown vital: {config_key}")
+        unknown = set(limits) - _LEVEL_NAMES
+        if unknown:
+            raise ValueError(f"Unknown threshold levels for {config_key}: {sorted(unknown)}")
+        merged.setdefault(config_key, {}).update(limits)
+    return merged
+
+
+class AlertRuleEngine:
+    def __init__(self, thresholds: Optional[Mapping[str, Mapping[str, float]]] = None):
+        self.thresholds = thresholds if thresholds is not None else settings.VITAL_THRESHOLDS
+        self.table = compile_rules(self.thresholds)
+        self._patient_tables: Dict[int, RuleTable] = {}
+        self._patient_overrides: Dict[int, dict] = {}
+        self._loaded_at: Dict[int, float] = {}
+
+    def set_overrides(self, user_id: int, overrides: Optional[Mapping[str, Mapping[str, float]]]):
+        """Скомпилировать таблицу пациента; пустые переопределения возвращают базовую"""
+        self._loaded_at[user_id] = time.monotonic()
+        if not overrides:
+            self._patient_tables.pop(user_id, None)
+            self._patient_overrides.pop(user_id, None)
+            return
+        self._patient_tables[user_id] = compile_rules(merge_thresholds(self.thresholds, overrides))
+        self._patient_overrides[user_id] = {key: dict(limits) for key, limits in overrides.items()}
+
+    def get_overrides(self, user_id: int) -> dict:
+        return self._patient_overrides.get(user_id, {})
+
+    def needs_refresh(self, user_id: int) -> bool:
+        loaded_at = self._loaded_at.get(user_id)
+        return loaded_at is None or time.monotonic() - loaded_at > OVERRIDES_REFRESH_SECONDS
+
+    def table_for(self, user_id: Optional[int] = None) -> RuleTable:
+        return self._patient_tables.get(user_id, self.table)
+
+    def evaluate(self, vitals: Mapping[str, float], user_id: Optional[int] = None) -> Sequence[dict]:
+        """Алерты для одного показания: не больше одного (самого приоритетного) на показатель"""
+        alerts = None
+        for vital_key, rules in self._patient_tables.get(user_id, self.table):
+            value = vitals.get(vital_key)
+            if not value:
+                continue
+            for rule in rules:
+                if (value > rule.limit) if rule.high else (value < rule.limit):
+                    if alerts is None:
+                        alerts = []
+                        timestamp = datetime.now().isoformat()
+                    alerts.append(rule.alert(value, timestamp))
+                    break
+        return alerts or _NO_ALERTS
+
+    def check_value(self, vital_type: str, value: float, user_id: Optional[int] = None) -> Optional[dict]:
+        """Алерт по одному показателю (vital_type — ключ IoTService или имя метрики)"""
+        vital_key = METRIC_ALIASES.get(vital_type, vital_type)
+        alerts = self.evaluate({vital_key: value}, user_id)
+        return alerts[0] if alerts else None
+
+    def evaluate_columns(self, columns: Mapping[str, "np.ndarray"],
+                         user_id: Optional[int] = None) -> Dict[str, "np.ndarray"]:
+        """
+        Векторная оценка: для каждого показателя массив индексов сработавшего
+        правила в table_for(user_id) (-1 — нет алерта). NaN и 0 не срабатывают.
+        """
+        import numpy as np
+
+        result = {}
+        for vital_key, rules in self.table_for(user_id):
+            values = columns.get(vital_key)
+            if values is None:
+                continue
+            values = np.asarray(values, dtype=np.float64)
+            fired = np.full(values.shape, -1, dtype=np.int8)
+            # От низшего приоритета к высшему: приоритетное правило перезаписывает
+            for index in range(len(rules) - 1, -1, -1):
+                rule = rules[index]
+                mask = values > rule.limit if rule.high else values < rule.limit
+                fired[mask & (values != 0)] = index
+            result[vital_key] = fired
+        return result
+
+    def evaluate_batch(self, readings: Sequence[Mapping[str, float]],
+                       user_id: Optional[int] = None) -> List[Sequence[dict]]:
+        """Алерты для пакета показаний одного пациента: по списку на каждое показание"""
+        if not readings:
+            return []
+        import numpy as np
+
+        table = self.table_for(user_id)
+        columns = {
+            vital_key: np.fromiter((r.get(vital_key) or np.nan for r in readings),
+                                   dtype=np.float64, count=len(readings))
+            for vital_key, _ in table
+        }
+        fired = self.evaluate_columns(columns, user_id)
+
+        result: List[Sequence[dict]] = [_NO_ALERTS] * len(readings)
+        timestamp = None
+        for vital_key, rules in table:
+            codes = fired.get(vital_key)
+            if codes is None:
+                continue
+            for row in np.flatnonzero(codes >= 0).tolist():
+                if timestamp is None:
+                    timestamp = datetime.now().isoformat()
+                if result[row] is _NO_ALERTS:
+                    result[row] = []
+                result[row].append(rules[codes[row]].alert(readings[row][vital_key], timestamp))
+        return result
+
+
+alert_rules = AlertRuleEngine()
@@ -9,6 +9,8 @@ class Settings:
     DB_HOST: str = os.getenv("DB_HOST", "localhost")
     DB_PORT: str = os.getenv("DB_PORT", "5432")
     DB_NAME: str = os.getenv("DB_NAME", "medical_db")
+    # Таймаут установки соединения драйвером (секунды): недоступный Postgres не держит потоки
+    DB_CONNECT_TIMEOUT: int = int(os.getenv("DB_CONNECT_TIMEOUT", "5"))
 
     @property
     def DATABASE_URL(self) -> str:
@@ -16,6 +18,20 @@ class Settings:
 
     # Redis
     REDIS_URL: str = os.getenv("REDIS_URL", "redis://localhost:6379")
+    REDIS_MAX_CONNECTIONS: int = int(os.getenv("REDIS_MAX_CONNECTIONS", "50"))
+    REDIS_RAW_MAX_CONNECTIONS: int = int(os.getenv("REDIS_RAW_MAX_CONNECTIONS", "20"))
+    REDIS_POOL_TIMEOUT: float = float(os.getenv("REDIS_POOL_TIMEOUT", "5"))
+    REDIS_SOCKET_TIMEOUT: float = float(os.getenv("REDIS_SOCKET_TIMEOUT", "5"))
+    # Client-side caching (services/client_cache.py): локальная копия read-mostly ключей
+    REDIS_CLIENT_CACHE: bool = os.getenv("REDIS_CLIENT_CACHE", "1") == "1"
+    REDIS_CLIENT_CACHE_PREFIXES: tuple = tuple(
+        p for p in os.getenv("REDIS_CLIENT_CACHE_PREFIXES", "vitals_dashboard:,alert_thresholds:").split(",") if p
+    )
+    REDIS_LOCAL_CACHE_TTL: float = float(os.getenv("REDIS_LOCAL_CACHE_TTL", "60"))
+    REDIS_LOCAL_CACHE_FALLBACK_TTL: float = float(os.getenv("REDIS_LOCAL_CACHE_FALLBACK_TTL", "1"))
+    # Показатели блоками (core/vital_chunks.py): длительность блока и чтение старых ZSET-точек
+    VITALS_CHUNK_SECONDS: int = int(os.getenv("VITALS_CHUNK_SECONDS", "3600"))
+    VITALS_LEGACY_READ: bool = os.getenv("VITALS_LEGACY_READ", "1") == "1"
 
     # Security
     SECRET_KEY: str = os.getenv("SECRET_KEY", "medical_secret_key_2024")
@@ -25,6 +41,16 @@ class Settings:
     # Telegram
     TELEGRAM_BOT_TOKEN: Optional[str] = os.getenv("TELEGRAM_BOT_TOKEN")
     TELEGRAM_CHAT_ID: Optional[str] = os.getenv("TELEGRAM_CHAT_ID")
+    TELEGRAM_API_URL: str = os.getenv("TELEGRAM_API_URL", "https://api.telegram.org")
+
+    # Notification outbox (Redis stream + фоновый диспетчер)
+    NOTIFY_BATCH_SIZE: int = 50
+    NOTIFY_CONCURRENCY: int = 10
+    NOTIFY_PER_CHAT_RATE: float = 1.0  # сообщений в секунду на чат
+    NOTIFY_GLOBAL_RATE: float = 25.0  # сообщений в секунду на бота
+    NOTIFY_MAX_ATTEMPTS: int = 6
+    NOTIFY_BACKOFF_SECONDS: float = 2.0
+    NOTIFY_BACKOFF_MAX_SECONDS: float = 300.0
 
     # Thresholds
     VITAL_THRESHOLDS = {
@@ -63,16 +89,59 @@ class Settings:
         }
     }
 
+    # Alert episodes: повторное уведомление по открытому эпизоду и гистерезис закрытия
+    ALERT_RENOTIFY_MINUTES: int = int(os.getenv("ALERT_RENOTIFY_MINUTES", "15"))
+    ALERT_EPISODE_STALE_MINUTES: int = 30
+    ALERT_HYSTERESIS = {
+        "heart_rate": 5,
+        "spo2": 1,
+        "temperature": 0.2,
+        "blood_pressure_systolic": 5,
+        "blood_pressure_diastolic": 5
+    }
+
+    # Оконные правила (core/trend_rules.py); high_hr/low_hr повторяют аномалии DAG analyze_vitals
+    VITAL_TREND_RULES = [
+        {"name": "hr_rise", "vital": "heart_rate", "kind": "rise", "window_seconds": 300,
+         "threshold": 30, "hysteresis": 5, "label": "Heart rate rise"},
+        {"name": "spo2_median_low", "vital": "spo2", "kind": "median_below", "window_seconds": 120,
+         "threshold": 92, "level": "critical", "min_samples": 6, "hysteresis": 0.1,
+         "label": "SpO2 median below 92%"},
+        {"name": "high_hr", "vital": "heart_rate", "kind": "mean_above", "window_seconds": 900,
+         "threshold": 100, "min_samples": 10, "hysteresis": 3, "label": "Average heart rate"},
+        {"name": "low_hr", "vital": "heart_rate", "kind": "mean_below", "window_seconds": 900,
+         "threshold": 60, "min_samples": 10, "hysteresis": 3, "label": "Average heart rate"},
+    ]
+
     # Application
     APP_NAME: str = "Medical IoT Monitoring"
     APP_VERSION: str = "2.0.0"
     CORS_ORIGINS: list = ["*"]
+    # production: без --reload, схему создают только миграции Alembic.
+    # Один воркер по умолчанию: WebSocket, эпизоды и окна алертов пока в памяти процесса
+    APP_ENV: str = os.getenv("APP_ENV", "development")
+    WEB_CONCURRENCY: int = max(1, int(os.getenv("WEB_CONCURRENCY", "1") or 1))
+    DB_CREATE_ALL: bool = os.getenv("DB_CREATE_ALL", "0" if APP_ENV == "production" else "1") == "1"
 
     # IoT
     IOT_DATA_RETENTION_DAYS: int = 7
     IOT_AGGREGATION_INTERVAL_MINUTES: int = 15
+    # Запись входящих IoT-запросов в трассу симулятора (core/traffic_capture.py); пусто — выключено
+    IOT_TRACE_PATH: Optional[str] = os.getenv("IOT_TRACE_PATH") or None
 
     # Monitoring
+    LOOP_WATCHDOG_ENABLED: bool = os.getenv("LOOP_WATCHDOG", "0") == "1"
+    LOOP_STALL_THRESHOLD_MS: int = int(os.getenv("LOOP_STALL_THRESHOLD_MS", "100"))
+    # Профиль одного запроса по заголовку X-Profile-Token (пусто — выключено)
+    PROFILE_TOKEN: Optional[str] = os.getenv("PROFILE_TOKEN")
+    # Учёт SQL на запрос (core/query_tracker.py); заголовки X-DB-* только при DB_QUERY_DEBUG=1
+    DB_QUERY_DEBUG: bool = os.getenv("DB_QUERY_DEBUG", "0") == "1"
+    DB_SLOW_QUERY_MS: int = int(os.getenv("DB_SLOW_QUERY_MS", "200"))
+    N_PLUS_ONE_THRESHOLD: int = int(os.getenv("N_PLUS_ONE_THRESHOLD", "5"))
+    # Фоновые пробы зависимостей (services/health_service.py)
+    HEALTH_PROBE_INTERVAL_SECONDS: float = float(os.getenv("HEALTH_PROBE_INTERVAL_SECONDS", "5"))
+    HEALTH_PROBE_TIMEOUT_SECONDS: float = float(os.getenv("HEALTH_PROBE_TIMEOUT_SECONDS", "2"))
+    HEALTH_QUEUE_DEGRADED_DEPTH: int = int(os.getenv("HEALTH_QUEUE_DEGRADED_DEPTH", "1000"))
     METRICS_CACHE_TTL: int = 300  # 5 minutes
     DASHBOARD_CACHE_TTL: int = 60  # 1 minute
 
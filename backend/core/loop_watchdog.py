@@ -0,0 +1,144 @@
+"""
+Сторож цикла событий: измеряет лаг и ловит код, блокирующий цикл.
+
+Корутина-пульс просыпается каждые interval секунд и пишет запаздывание в
+гистограмму event_loop_lag_seconds. Отдельный поток следит за пульсом: если
+цикл не отвечал дольше threshold, он снимает стек потока цикла
+(sys._current_frames) прямо во время блокировки — это и есть блокирующий вызов
+(синхронный SQLAlchemy, PBKDF2 и т.п.). Маршрут берётся из ASGI scope во
+фреймах стека. Когда цикл оживает, отчёт с длительностью пишется в лог,
+в счётчик event_loop_stalls_total{route} и в список последних отчётов
+(/api/debug/loop-stalls).
+
+Включается переменной окружения LOOP_WATCHDOG=1.
+"""
+import asyncio
+import logging
+import sys
+import threading
+import time
+import traceback
+from collections import deque
+from datetime import datetime
+from typing import Optional
+
+from core.config import settings
+from core.metrics import registry
+
+logger = logging.getLogger(__name__)
+
+EVENT_LOOP_LAG = registry.histogram(
+    "event_loop_lag_seconds", "Event loop scheduling delay measured by the watchdog heartbeat",
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+)
+EVENT_LOOP_STALLS = registry.counter(
+    "event_loop_stalls_total", "Event loop stalls longer than the watchdog threshold", ("route",)
+)
+
+STACK_LIMIT = 40
+
+
+def _route_from_frames(frame) -> str:
+    """Найти ASGI scope HTTP-запроса во фреймах стека и вернуть 'METHOD module.handler'"""
+    while frame is not None:
+        scope = frame.f_locals.get("scope")
+        if isinstance(scope, dict) and scope.get("type") in ("http", "websocket"):
+            endpoint = scope.get("endpoint")
+            if endpoint is not None:
+                name = f"{endpoint.__module__}.{endpoint.__qualname__}"
+            else:
+                name = scope.get("path", "?")
+            return f"{scope.get('method', 'WS')} {name}"
+        frame = frame.f_back
+    return "background"
+
+
+class LoopWatchdog:
+    def __init__(self, threshold: float = 0.1, interval: float = 0.05, max_reports: int = 50):
+        self.threshold = threshold
+        self.interval = interval
+        self.reports: deque = deque(maxlen=max_reports)
+        self.running = False
+        self.task: Optional[asyncio.Task] = None
+        self.thread: Optional[threading.Thread] = None
+        self.loop_thread_id: Optional[int] = None
+        self.last_beat = time.perf_counter()
+        self.beat_seq = 0
+        self.pending: Optional[dict] = None
+        self.max_lag = 0.0
+
+    async def start(self):
+        if self.running:
+            return
+        self.running = True
+        self.loop_thread_id = threading.get_ident()
+        self.last_beat = time.perf_counter()
+        self.task = asyncio.create_task(self._heartbeat())
+        self.thread = threading.Thread(target=self._watch, name="loop-watchdog", daemon=True)
+        self.thread.start()
+        logger.info(f"🐕 Event loop watchdog on (threshold {self.threshold * 1000:.0f} ms)")
+
+    async def stop(self):
+        self.running = False
+        if self.task is not None:
+            self.task.cancel()
+            try:
+                await self.task
+            except asyncio.CancelledError:
+                pass
+            self.task = None
+
+    async def _heartbeat(self):
+        while self.running:
+            expected = time.perf_counter() + self.interval
+            await asyncio.sleep(self.interval)
+            now = time.perf_counter()
+            lag = max(0.0, now - expected)
+            self.last_beat = now
+            self.beat_seq += 1
+            EVENT_LOOP_LAG.observe(lag)
+            if lag > self.max_lag:
+                self.max_lag = lag
+
+            report, self.pending = self.pending, None
+            if report is not None:
+                self._finish(report, lag)
+
+    def _watch(self):
+        """Поток-сторож: снимает стек, пока цикл ещё заблокирован"""
+        captured_seq = -1
+        while self.running:
+            time.sleep(self.interval / 2)
+            seq, beat = self.beat_seq, self.last_beat
+            if seq != captured_seq and time.perf_counter() - beat > self.interval + self.threshold:
+                captured_seq = seq
+                self.pending = self._capture()
+
+    def _capture(self) -> Optional[dict]:
+        frame = sys._current_frames().get(self.loop_thread_id)
+        if frame is None:
+            return None
+        stack = traceback.format_stack(frame, limit=STACK_LIMIT)
+        return {
+            "detected_at": datetime.now().isoformat(),
+            "route": _route_from_frames(frame),
+            "stack": [line.rstrip() for line in stack]
+        }
+
+    def _finish(self, report: dict, lag: float):
+        report["blocked_ms"] = round(lag * 1000, 1)
+        self.reports.append(report)
+        EVENT_LOOP_STALLS.inc(report["route"])
+        logger.warning(f"Event loop blocked for {report['blocked_ms']} ms in {report['route']}:\n"
+                       + "\n".join(report["stack"][-12:]))
+
+    def get_reports(self, limit: int = 20) -> list:
+        return list(self.reports)[-limit:][::-1]
+
+
+loop_watchdog = LoopWatchdog(threshold=settings.LOOP_STALL_THRESHOLD_MS / 1000)
+
+
+@registry.collector("event_loop_max_lag_seconds", "Largest event loop lag seen by the watchdog")
+async def _max_lag():
+    return [({}, round(loop_watchdog.max_lag, 6))] if loop_watchdog.running else []
@@ -0,0 +1,185 @@
+"""
+Метрики в текстовом формате Prometheus без внешних зависимостей.
+
+Запись — это инкремент счётчика в словаре по кортежу меток (у гистограммы ещё
+bisect по границам бакетов), поэтому метрики можно держать включёнными в
+продакшене. Значения, которые дорого или бессмысленно считать на каждом
+запросе (пул БД, Redis RTT, WebSocket), снимаются коллекторами в момент
+запроса /metrics.
+"""
+import time
+from bisect import bisect_left
+from typing import Awaitable, Callable, Dict, Iterable, List, Sequence, Tuple
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+STAGE_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 1.0)
+
+PROCESS_START_TIME = time.time()
+
+Collector = Callable[[], Awaitable[Iterable[Tuple[Dict[str, str], float]]]]
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    pairs = [f'{name}="{str(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class Counter:
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.values: Dict[tuple, float] = {}
+
+    def inc(self, *labels, amount: float = 1.0):
+        self.values[labels] = self.values.get(labels, 0.0) + amount
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} counter"]
+        for labels, value in self.values.items():
+            lines.append(f"{self.name}{_format_labels(self.labelnames, labels)} {value}")
+        return lines
+
+
+class Histogram:
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = LATENCY_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets)
+        # labels -> [counts per bucket (+Inf last), sum]
+        self.series: Dict[tuple, list] = {}
+
+    def observe(self, value: float, *labels):
+        series = self.series.get(labels)
+        if series is None:
+            series = self.series[labels] = [[0] * (len(self.buckets) + 1), 0.0]
+        series[0][bisect_left(self.buckets, value)] += 1
+        series[1] += value
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        bounds = [repr(float(b)) for b in self.buckets] + ["+Inf"]
+        for labels, (counts, total) in self.series.items():
+            cumulative = 0
+            for bound, count in zip(bounds, counts):
+                cumulative += count
+                le = f'le="{bound}"'
+                lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, labels, le)} {cumulative}")
+            label_text = _format_labels(self.labelnames, labels)
+            lines.append(f"{self.name}_sum{label_text} {total}")
+            lines.append(f"{self.name}_count{label_text} {cumulative}")
+        return lines
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self.metrics: List = []
+        self.collectors: List[Tuple[str, str, str, Collector]] = []
+
+    def counter(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Counter:
+        metric = Counter(name, documentation, labelnames)
+        self.metrics.append(metric)
+        return metric
+
+    def histogram(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                  buckets: Sequence[float] = LATENCY_BUCKETS) -> Histogram:
+        metric = Histogram(name, documentation, labelnames, buckets)
+        self.metrics.append(metric)
+        return metric
+
+    def collector(self, name: str, documentation: str, metric_type: str = "gauge"):
+        """Декоратор: async-функция, возвращающая [(labels, value)] в момент скрейпа"""
+        def register(func):
+            self.collectors.append((name, documentation, metric_type, func))
+            return func
+        return register
+
+    async def render(self) -> str:
+        lines = []
+        for metric in self.metrics:
+            lines.extend(metric.render())
+        for name, documentation, metric_type, func in self.collectors:
+            try:
+                samples = await func()
+            except Exception as e:
+                lines.append(f"# {name} collection failed: {e}")
+                continue
+            lines.append(f"# HELP {name} {documentation}")
+            lines.append(f"# TYPE {name} {metric_type}")
+            for labels, value in samples:
+                lines.append(f"{name}{_format_labels(tuple(labels), tuple(labels.values()))} {value}")
+        lines.append("")
+        return "\n".join(lines)
+
+
+registry = MetricsRegistry()
+
+HTTP_REQUEST_DURATION = registry.histogram(
+    "http_request_duration_seconds", "HTTP request latency by route template", ("method", "route")
+)
+HTTP_REQUESTS = registry.counter(
+    "http_requests_total", "HTTP requests by route template and status", ("method", "route", "status")
+)
+INGEST_STAGE_DURATION = registry.histogram(
+    "ingest_stage_duration_seconds", "Time spent in each IoT ingest stage", ("stage",), STAGE_BUCKETS
+)
+
+
+def uptime_seconds() -> float:
+    return time.time() - PROCESS_START_TIME
+
+
+@registry.collector("process_uptime_seconds", "Seconds since the API process started")
+async def _uptime():
+    return [({}, round(uptime_seconds(), 3))]
+
+
+_route_templates: Dict[Callable, str] = {}
+
+
+def route_template(scope) -> str:
+    """Шаблон маршрута (/api/vitals/{patient_id}) для ASGI scope после роутинга"""
+    endpoint = scope.get("endpoint")
+    if endpoint is None:
+        return "unmatched"
+    template = _route_templates.get(endpoint)
+    if template is None:
+        template = "unmatched"
+        for route in scope["app"].routes:
+            if getattr(route, "endpoint", None) is endpoint:
+                template = route.path
+                break
+        _route_templates[endpoint] = template
+    return template
+
+
+class MetricsMiddleware:
+    """ASGI middleware: латентность и статус по шаблону маршрута, а не по сырому пути"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        started = time.perf_counter()
+        status = [500]
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                status[0] = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            route = route_template(scope)
+            method = scope["method"]
+            HTTP_REQUEST_DURATION.observe(time.perf_counter() - started, method, route)
+            HTTP_REQUESTS.inc(method, route, status[0])
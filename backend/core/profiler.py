@@ -0,0 +1,185 @@
+"""
+Семплирующий профайлер живого процесса без перезапуска и внешних утилит.
+
+Поток-семплер каждые interval секунд берёт стеки потоков через
+sys._current_frames() и считает одинаковые стеки (кортежи code-объектов).
+Результат отдаётся в collapsed-формате ("корень;...;лист count"), который
+понимают flamegraph.pl, speedscope и inferno. Сам процесс не
+инструментируется: пока профайлер не запущен, он ничего не стоит, а во время
+работы стоимость — один проход по стекам на семпл.
+
+Два режима:
+- POST /api/debug/profile (только admin): профиль всего воркера за N секунд;
+- заголовок X-Profile-Token: <PROFILE_TOKEN> у одного запроса: семплы только
+  этого запроса (его фрейм в потоке цикла или его обработчик в пуле потоков),
+  результат доступен по id из заголовка ответа X-Profile-Id.
+"""
+import asyncio
+import os
+import sys
+import threading
+import time
+import uuid
+from collections import Counter, OrderedDict
+from typing import Callable, Dict, Optional
+
+from core.config import settings
+
+MAX_STACK_DEPTH = 128
+MAX_STORED_PROFILES = 20
+
+
+def _short_path(filename: str) -> str:
+    for prefix in sorted(sys.path, key=len, reverse=True):
+        if prefix and filename.startswith(prefix + os.sep):
+            return filename[len(prefix) + 1:]
+    return filename
+
+
+class StackSampler(threading.Thread):
+    """Поток, который семплирует стеки до вызова stop()"""
+
+    def __init__(self, interval: float, thread_ids=None, match: Optional[Callable[[list], bool]] = None):
+        super().__init__(name="stack-sampler", daemon=True)
+        self.interval = interval
+        self.thread_ids = thread_ids
+        self.match = match
+        self.stacks: Counter = Counter()
+        self.samples = 0
+        self.started_at = 0.0
+        self.duration = 0.0
+        self._stop_event = threading.Event()
+        self._frame_names: Dict[object, str] = {}
+
+    def run(self):
+        own_id = threading.get_ident()
+        self.started_at = time.perf_counter()
+        while not self._stop_event.wait(self.interval):
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own_id or (self.thread_ids is not None and thread_id not in self.thread_ids):
+                    continue
+                frames = []
+                while frame is not None and len(frames) < MAX_STACK_DEPTH:
+                    frames.append(frame)
+                    frame = frame.f_back
+                if self.match is not None and not self.match(frames):
+                    continue
+                self.stacks[tuple(f.f_code for f in reversed(frames))] += 1
+            self.samples += 1
+        self.duration = time.perf_counter() - self.started_at
+
+    def stop(self):
+        self._stop_event.set()
+        self.join()
+
+    def _frame_name(self, code) -> str:
+        name = self._frame_names.get(code)
+        if name is None:
+            name = self._frame_names[code] = f"{code.co_qualname} ({_short_path(code.co_filename)}:{code.co_firstlineno})"
+        return name
+
+    def collapsed(self) -> str:
+        """Стек на строку, самые частые первыми"""
+        lines = [f"{';'.join(self._frame_name(code) for code in stack)} {count}"
+                 for stack, count in self.stacks.most_common()]
+        return "\n".join(lines) + "\n" if lines else ""
+
+
+class Profiler:
+    def __init__(self, max_profiles: int = MAX_STORED_PROFILES, max_request_profiles: int = 2):
+        self.busy = False
+        self.active_requests = 0
+        self.max_request_profiles = max_request_profiles
+        self.profiles: "OrderedDict[str, dict]" = OrderedDict()
+        self.max_profiles = max_profiles
+
+    async def profile(self, seconds: float, interval: float, loop_only: bool = False) -> StackSampler:
+        """Профиль всего процесса (или только потока цикла событий) за seconds"""
+        if self.busy:
+            raise RuntimeError("Profiler is already running")
+        self.busy = True
+        try:
+            sampler = StackSampler(interval, {threading.get_ident()} if loop_only else None)
+            sampler.start()
+            await asyncio.sleep(seconds)
+            await asyncio.to_thread(sampler.stop)
+            return sampler
+        finally:
+            self.busy = False
+
+    def store(self, route: str, sampler: StackSampler, profile_id: Optional[str] = None) -> str:
+        profile_id = profile_id or uuid.uuid4().hex[:12]
+        self.profiles[profile_id] = {
+            "route": route,
+            "samples": sampler.samples,
+            "duration_ms": round(sampler.duration * 1000, 1),
+            "collapsed": sampler.collapsed()
+        }
+        while len(self.profiles) > self.max_profiles:
+            self.profiles.popitem(last=False)
+        return profile_id
+
+    def get_profile(self, profile_id: str) -> Optional[dict]:
+        return self.profiles.get(profile_id)
+
+
+profiler = Profiler()
+
+
+class ProfileRequestMiddleware:
+    """
+    ASGI middleware: профиль одного запроса по заголовку X-Profile-Token.
+
+    Семпл относится к запросу, если в стеке есть фрейм этого middleware (код
+    запроса в цикле событий) или код его обработчика (sync-обработчики
+    выполняются в пуле потоков).
+    """
+
+    HEADER = b"x-profile-token"
+
+    def __init__(self, app, token: Optional[str] = None, interval: float = 0.001):
+        self.app = app
+        self.token = (token if token is not None else settings.PROFILE_TOKEN or "").encode()
+        self.interval = interval
+
+    def _requested(self, scope) -> bool:
+        if not self.token or scope["type"] != "http":
+            return False
+        for name, value in scope.get("headers", ()):
+            if name == self.HEADER:
+                return value == self.token
+        return False
+
+    async def __call__(self, scope, receive, send):
+        if not self._requested(scope) or profiler.active_requests >= profiler.max_request_profiles:
+            await self.app(scope, receive, send)
+            return
+
+        request_frame = sys._getframe()
+
+        def belongs_to_request(frames: list) -> bool:
+            endpoint = scope.get("endpoint")
+            endpoint_code = getattr(endpoint, "__code__", None)
+            for frame in frames:
+                if frame is request_frame or frame.f_code is endpoint_code:
+                    return True
+            return False
+
+        sampler = StackSampler(self.interval, match=belongs_to_request)
+        profile_id = uuid.uuid4().hex[:12]
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                headers = list(message.get("headers", ()))
+                headers.append((b"x-profile-id", profile_id.encode()))
+                message = {**message, "headers": headers}
+            await send(message)
+
+        profiler.active_requests += 1
+        sampler.start()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            await asyncio.to_thread(sampler.stop)
+            profiler.active_requests -= 1
+            profiler.store(f"{scope['method']} {scope['path']}", sampler, profile_id)
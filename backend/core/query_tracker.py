@@ -0,0 +1,179 @@
+"""
+Учёт SQL-запросов на HTTP-запрос: число, суммарное время БД, медленные
+запросы и признаки N+1.
+
+События before/after_cursor_execute движка пишут каждый запрос в QueryStats
+текущего HTTP-запроса (contextvar; run_in_threadpool копирует контекст,
+поэтому sync-обработчики и get_db тоже попадают в учёт). N+1 — это один и тот
+же SQL (SQLAlchemy подставляет параметры отдельно, поэтому текст совпадает),
+выполненный N_PLUS_ONE_THRESHOLD и более раз за запрос: число запросов растёт
+с размером выборки, как в цикле по устройствам с .count() внутри.
+
+В продакшене всё уходит в метрики db_*; при DB_QUERY_DEBUG=1 ответ ещё
+получает заголовки X-DB-Queries / X-DB-Time-Ms / X-DB-N-Plus-One.
+
+Для тестов: with assert_max_queries(3): client.get("/api/...").
+"""
+import logging
+import time
+from collections import Counter as StatementCounter
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import List, Optional, Tuple
+
+from sqlalchemy import event
+
+from core.config import settings
+from core.metrics import registry, route_template
+
+logger = logging.getLogger(__name__)
+
+QUERY_COUNT_BUCKETS = (1, 2, 3, 5, 8, 13, 21, 34, 55, 89, 144)
+
+DB_QUERY_DURATION = registry.histogram(
+    "db_query_duration_seconds", "SQL statement execution time"
+)
+DB_QUERIES_PER_REQUEST = registry.histogram(
+    "db_queries_per_request", "SQL statements executed per HTTP request", ("route",), QUERY_COUNT_BUCKETS
+)
+DB_TIME_PER_REQUEST = registry.histogram(
+    "db_time_per_request_seconds", "Total SQL time per HTTP request", ("route",)
+)
+DB_SLOW_QUERIES = registry.counter(
+    "db_slow_queries_total", "SQL statements slower than DB_SLOW_QUERY_MS", ("route",)
+)
+DB_N_PLUS_ONE = registry.counter(
+    "db_n_plus_one_requests_total", "Requests that repeated one SQL statement N_PLUS_ONE_THRESHOLD+ times",
+    ("route",)
+)
+
+STATEMENT_PREVIEW = 200
+
+
+class QueryStats:
+    __slots__ = ("count", "seconds", "slow", "statements")
+
+    def __init__(self):
+        self.count = 0
+        self.seconds = 0.0
+        self.slow: List[Tuple[float, str]] = []
+        self.statements: StatementCounter = StatementCounter()
+
+    def record(self, statement: str, seconds: float):
+        self.count += 1
+        self.seconds += seconds
+        self.statements[statement] += 1
+        if seconds * 1000 >= settings.DB_SLOW_QUERY_MS:
+            self.slow.append((seconds, statement[:STATEMENT_PREVIEW]))
+
+    def repeated(self, threshold: Optional[int] = None) -> List[Tuple[str, int]]:
+        """Запросы, повторённые threshold+ раз (кандидаты в N+1)"""
+        threshold = threshold or settings.N_PLUS_ONE_THRESHOLD
+        return [(statement[:STATEMENT_PREVIEW], count)
+                for statement, count in self.statements.most_common() if count >= threshold]
+
+
+_current: ContextVar[Optional[QueryStats]] = ContextVar("db_query_stats", default=None)
+# Наблюдатели всего процесса (assert_max_queries): TestClient исполняет приложение в другом потоке
+_watchers: List[QueryStats] = []
+
+
+def instrument_engine(engine):
+    """Повесить учёт запросов на движок (вызывается один раз в database.py)"""
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def _before(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("query_started", []).append(time.perf_counter())
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def _after(conn, cursor, statement, parameters, context, executemany):
+        seconds = time.perf_counter() - conn.info["query_started"].pop()
+        DB_QUERY_DURATION.observe(seconds)
+        for watcher in _watchers:
+            watcher.record(statement, seconds)
+        stats = _current.get()
+        if stats is not None:
+            stats.record(statement, seconds)
+        elif seconds * 1000 >= settings.DB_SLOW_QUERY_MS:
+            logger.warning(f"Slow query outside request ({seconds * 1000:.0f} ms): {statement[:STATEMENT_PREVIEW]}")
+
+    @event.listens_for(engine, "handle_error")
+    def _error(context):
+        # Упавший запрос не доходит до after_cursor_execute: снимаем его отметку, иначе список
+        # растёт на соединениях из пула
+        started = context.connection.info.get("query_started") if context.connection is not None else None
+        if started:
+            started.pop()
+
+
+@contextmanager
+def track_queries():
+    """Собрать QueryStats для кода внутри блока"""
+    stats = QueryStats()
+    token = _current.set(stats)
+    try:
+        yield stats
+    finally:
+        _current.reset(token)
+
+
+@contextmanager
+def assert_max_queries(limit: int):
+    """Тестовый помощник: упасть, если внутри блока выполнено больше limit запросов"""
+    stats = QueryStats()
+    _watchers.append(stats)
+    try:
+        yield stats
+    finally:
+        _watchers.remove(stats)
+    if stats.count > limit:
+        statements = "\n".join(f"  {count}x {statement}" for statement, count in stats.repeated(1))
+        raise AssertionError(f"Expected at most {limit} queries, got {stats.count}:\n{statements}")
+
+
+class QueryStatsMiddleware:
+    """ASGI middleware: метрики БД по шаблону маршрута и отладочные заголовки"""
+
+    def __init__(self, app, debug: Optional[bool] = None):
+        self.app = app
+        self.debug = settings.DB_QUERY_DEBUG if debug is None else debug
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        stats = QueryStats()
+        token = _current.set(stats)
+
+        async def send_wrapper(message):
+            if self.debug and message["type"] == "http.response.start":
+                headers = list(message.get("headers", ()))
+                headers.append((b"x-db-queries", str(stats.count).encode()))
+                headers.append((b"x-db-time-ms", f"{stats.seconds * 1000:.2f}".encode()))
+                repeated = stats.repeated()
+                if repeated:
+                    headers.append((b"x-db-n-plus-one", str(repeated[0][1]).encode()))
+                message = {**message, "headers": headers}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            _current.reset(token)
+            if stats.count:
+                self._report(route_template(scope), scope, stats)
+
+    @staticmethod
+    def _report(route: str, scope, stats: QueryStats):
+        DB_QUERIES_PER_REQUEST.observe(stats.count, route)
+        DB_TIME_PER_REQUEST.observe(stats.seconds, route)
+        request = f"{scope['method']} {route}"
+        for seconds, statement in stats.slow:
+            DB_SLOW_QUERIES.inc(route)
+            logger.warning(f"Slow query in {request} ({seconds * 1000:.0f} ms): {statement}")
+        repeated = stats.repeated()
+        if repeated:
+            DB_N_PLUS_ONE.inc(route)
+            statement, count = repeated[0]
+            logger.warning(f"Possible N+1 in {request}: {stats.count} queries, {count}x {statement}")
@@ -0,0 +1,27 @@
+import time
+from contextlib import contextmanager
+from typing import List, Tuple
+
+
+class StageTimer:
+    """Длительности этапов обработки одного запроса (для заголовка Server-Timing)"""
+
+    def __init__(self, histogram=None):
+        self.stages: List[Tuple[str, float]] = []
+        # Histogram из core.metrics: каждая стадия ещё и попадает в /metrics
+        self.histogram = histogram
+
+    @contextmanager
+    def stage(self, name: str):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            seconds = time.perf_counter() - started
+            self.stages.append((name, seconds))
+            if self.histogram is not None:
+                self.histogram.observe(seconds, name)
+
+    def header(self) -> str:
+        """'device_lookup;dur=0.81, db_write;dur=2.10' (миллисекунды)"""
+        return ", ".join(f"{name};dur={seconds * 1000:.2f}" for name, seconds in self.stages)
@@ -0,0 +1,78 @@
+"""
+Запись входящих IoT-запросов для воспроизведения инцидентов (включается IOT_TRACE_PATH).
+
+Формат тот же, что у iot-simulator/traffic_log.py (TraceWriter): сжатый gzip
+поток b"IOTTRACE1\\n" и записи <d offset_s> <H device_len> <H endpoint_len>
+<H headers_len> <I body_len> | device_id | endpoint | headers | body.
+Файл проигрывается без изменений: python simulator.py --mode replay --trace PATH.
+
+Пишутся исходные байты тела /api/vitals/iot и /api/vitals/iot/batch до
+обработки, в том числе запросы, завершившиеся ошибкой (кроме запросов /iot,
+не прошедших валидацию схемы, — 422). endpoint — относительно /api, как у
+симулятора. Каждый воркер пишет свой файл (при WEB_CONCURRENCY > 1 к пути
+добавляется pid), файл закрывается при остановке приложения.
+"""
+import gzip
+import json
+import logging
+import os
+import struct
+import time
+from typing import Optional
+
+from core.config import settings
+
+logger = logging.getLogger(__name__)
+
+TRACE_MAGIC = b"IOTTRACE1\n"
+RECORD_HEADER = struct.Struct("<dHHHI")
+CAPTURED_HEADERS = ("content-type", "content-encoding")
+
+
+class TrafficCapture:
+    def __init__(self, path: Optional[str] = None):
+        self.path = path
+        self.file = None
+        self.started = None
+        self.count = 0
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.path)
+
+    def _open(self):
+        path = self.path if settings.WEB_CONCURRENCY <= 1 else f"{self.path}.{os.getpid()}"
+        self.file = gzip.open(path, "wb", compresslevel=6)
+        self.file.write(TRACE_MAGIC)
+        logger.info(f"📼 Capturing IoT ingest traffic to {path}")
+
+    def write(self, device_id: str, endpoint: str, headers, body: bytes):
+        if not self.enabled:
+            return
+        try:
+            if self.file is None:
+                self._open()
+            now = time.monotonic()
+            if self.started is None:
+                self.started = now
+            device = (device_id or "").encode("utf-8")[:0xFFFF]
+            path = endpoint.encode("utf-8")
+            header_bytes = json.dumps({name: headers[name] for name in CAPTURED_HEADERS if headers.get(name)},
+                                      separators=(",", ":")).encode()
+            self.file.write(RECORD_HEADER.pack(now - self.started, len(device), len(path), len(header_bytes),
+                                               len(body)))
+            self.file.write(device + path + header_bytes + body)
+            self.count += 1
+        except Exception as e:
+            # Запись трассы не должна ронять ингест: выключаемся до перезапуска
+            logger.error(f"Traffic capture disabled after error: {e}")
+            self.path = None
+
+    def close(self):
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+            logger.info(f"📼 Captured {self.count} IoT requests")
+
+
+traffic_capture = TrafficCapture(settings.IOT_TRACE_PATH)
@@ -0,0 +1,199 @@
+"""
+Оконные правила алертов, которые считаются потоково при ингесте.
+
+Каждое правило из settings.VITAL_TREND_RULES держит на пару (пациент, правило)
+небольшое состояние, которое обновляется за O(1) амортизированно:
+- rise / drop: текущее значение минус минимум окна / максимум окна минус
+  текущее (монотонные деки);
+- mean_above / mean_below: скользящая сумма;
+- min_below / max_above: минимум/максимум окна (монотонные деки);
+- median_below / median_above: медиана окна ниже/выше порога тогда и только
+  тогда, когда ниже/выше порога больше половины значений окна, поэтому
+  достаточно счётчика, без сортировки.
+
+Значение правила (дельта, среднее, доля) попадает в алерт как value, а имя
+правила — как metric; эпизоды (core/alert_episodes.py) закрывают такие алерты
+по тем же значениям с гистерезисом из правила.
+"""
+import time
+from collections import deque
+from typing import Dict, List, Mapping, Optional, Sequence, Tuple
+
+from core.config import settings
+
+TREND_KINDS = ("rise", "drop", "mean_above", "mean_below", "min_below", "max_above",
+               "median_below", "median_above")
+
+
+class TrendRule:
+    __slots__ = ("name", "vital", "kind", "window", "threshold", "level", "min_samples",
+                 "hysteresis", "label", "track_min", "track_max", "value_threshold", "direction")
+
+    def __init__(self, name: str, vital: str, kind: str, window_seconds: float, threshold: float,
+                 level: str = "warning", min_samples: int = 3, hysteresis: float = 0, label: str = None):
+        if kind not in TREND_KINDS:
+            raise ValueError(f"Unknown trend rule kind: {kind}")
+        self.name = name
+        self.vital = vital
+        self.kind = kind
+        self.window = window_seconds
+        self.threshold = threshold
+        self.level = level
+        self.min_samples = max(2, min_samples) if kind in ("rise", "drop") else max(1, min_samples)
+        self.hysteresis = hysteresis
+        self.label = label or name
+        self.track_min = kind in ("rise", "min_below")
+        self.track_max = kind in ("drop", "max_above")
+        # Медианные правила сравнивают долю значений за порогом с 0.5
+        self.value_threshold = 0.5 if kind.startswith("median") else threshold
+        self.direction = "low" if kind in ("mean_below", "min_below") else "high"
+
+
+class WindowState:
+    """Скользящее окно одного правила для одного пациента"""
+
+    __slots__ = ("samples", "total", "beyond", "mins", "maxs")
+
+    def __init__(self):
+        self.samples: deque = deque()
+        self.total = 0.0
+        self.beyond = 0
+        self.mins: deque = deque()
+        self.maxs: deque = deque()
+
+    def push(self, rule: TrendRule, timestamp: float, value: float):
+        self.samples.append((timestamp, value))
+        self.total += value
+        if rule.kind == "median_below":
+            self.beyond += value < rule.threshold
+        elif rule.kind == "median_above":
+            self.beyond += value > rule.threshold
+        if rule.track_min:
+            while self.mins and self.mins[-1][1] >= value:
+                self.mins.pop()
+            self.mins.append((timestamp, value))
+        if rule.track_max:
+            while self.maxs and self.maxs[-1][1] <= value:
+                self.maxs.pop()
+            self.maxs.append((timestamp, value))
+
+        cutoff = timestamp - rule.window
+        samples = self.samples
+        while samples[0][0] < cutoff:
+            _, old = samples.popleft()
+            self.total -= old
+            if rule.kind == "median_below":
+                self.beyond -= old < rule.threshold
+            elif rule.kind == "median_above":
+                self.beyond -= old > rule.threshold
+        while self.mins and self.mins[0][0] < cutoff:
+            self.mins.popleft()
+        while self.maxs and self.maxs[0][0] < cutoff:
+            self.maxs.popleft()
+
+    def statistic(self, rule: TrendRule, value: float) -> Optional[float]:
+        """Значение правила по текущему окну; None, пока данных недостаточно"""
+        count = len(self.samples)
+        if count < rule.min_samples:
+            return None
+        kind = rule.kind
+        if kind == "rise":
+            return value - self.mins[0][1]
+        if kind == "drop":
+            return self.maxs[0][1] - value
+        if kind in ("mean_above", "mean_below"):
+            return self.total / count
+        if kind == "min_below":
+            return self.mins[0][1]
+        if kind == "max_above":
+            return self.maxs[0][1]
+        return self.beyond / count
+
+
+class TrendRuleEngine:
+    def __init__(self, rules: Optional[Sequence[Mapping]] = None):
+        rules = rules if rules is not None else settings.VITAL_TREND_RULES
+        self.rules: Tuple[TrendRule, ...] = tuple(TrendRule(**rule) for rule in rules)
+        self.by_vital: Dict[str, Tuple[TrendRule, ...]] = {}
+        for rule in self.rules:
+            self.by_vital[rule.vital] = self.by_vital.get(rule.vital, ()) + (rule,)
+        self.margins = {rule.name: rule.hysteresis for rule in self.rules}
+        self.states: Dict[Tuple[int, str], WindowState] = {}
+        self.last_seen: Dict[int, float] = {}
+        # Окно старше самого длинного правила пусто, его состояние можно выбросить
+        self.max_window = max((rule.window for rule in self.rules), default=0)
+        self._last_sweep = time.time()
+
+    def update(self, user_id: int, vitals: Mapping[str, float],
+               timestamp: Optional[float] = None) -> Tuple[List[dict], Dict[str, float]]:
+        """
+        Добавить показание в окна пациента. timestamp — время по часам сервера
+        (для пакетов см. IoTService._window_timestamps). Возвращает (alerts, values):
+        алерты сработавших правил и текущие значения всех правил с достаточными данными.
+        """
+        now = time.time()
+        timestamp = timestamp if timestamp is not None else now
+        if now - self._last_sweep > self.max_window:
+            self._last_sweep = now
+            self.expire_idle(self.max_window, now)
+
+        alerts, values = [], {}
+        # Окна только растут вперёд: показание старее уже учтённых (другое устройство пациента,
+        # пакет после одиночного показания) ставится на время последнего, а не выбрасывается
+        timestamp = max(timestamp, self.last_seen.get(user_id, 0))
+        self.last_seen[user_id] = timestamp
+
+        for vital, rules in self.by_vital.items():
+            value = vitals.get(vital)
+            if value is None:
+                continue
+            for rule in rules:
+                key = (user_id, rule.name)
+                state = self.states.get(key)
+                if state is None:
+                    state = self.states[key] = WindowState()
+                state.push(rule, timestamp, value)
+                statistic = state.statistic(rule, value)
+                if statistic is None:
+                    continue
+                values[rule.name] = statistic
+                fired = statistic > rule.value_threshold if rule.direction == "high" \
+                    else statistic < rule.value_threshold
+                if fired:
+                    alerts.append(self._alert(rule, statistic, value, len(state.samples), timestamp))
+        return alerts, values
+
+    @staticmethod
+    def _alert(rule: TrendRule, statistic: float, value: float, samples: int, timestamp: float) -> dict:
+        minutes = rule.window / 60
+        if rule.kind.startswith("median"):
+            detail = f"{statistic:.0%} of {samples} readings {rule.kind.split('_')[1]} {rule.threshold}"
+        else:
+            detail = f"{round(statistic, 1)} (limit {rule.threshold})"
+        return {
+            "type": rule.level,
+            "metric": rule.name,
+            "vital": rule.vital,
+            "value": round(statistic, 3),
+            "current": value,
+            "message": f"{rule.label} over {minutes:g} min: {detail}",
+            "threshold": rule.value_threshold,
+            "direction": rule.direction,
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S", time.localtime(timestamp))
+        }
+
+    def forget(self, user_id: int):
+        self.last_seen.pop(user_id, None)
+        for rule in self.rules:
+            self.states.pop((user_id, rule.name), None)
+
+    def expire_idle(self, idle_seconds: float, now: Optional[float] = None) -> int:
+        """Освободить окна пациентов, от которых давно нет данных"""
+        now = now if now is not None else time.time()
+        idle = [user_id for user_id, seen in self.last_seen.items() if now - seen > idle_seconds]
+        for user_id in idle:
+            self.forget(user_id)
+        return len(idle)
+
+
+trend_rules = TrendRuleEngine()
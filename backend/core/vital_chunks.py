@@ -0,0 +1,161 @@
+"""
+Показатели в Redis блоками фиксированной длительности вместо члена ZSET на точку.
+
+Ключ vitals:c:{user_id}:{vital_type}:{bucket}, где bucket = timestamp //
+VITALS_CHUNK_SECONDS, — строка из упакованных 16-байтовых записей: смещение
+от начала блока в мс (uint32), номер устройства (uint32) и значение (float64).
+Запись дописывается командой APPEND, блок живёт, пока его последняя точка
+не выйдет из 24-часового окна (EXPIREAT). Чтение диапазона — один MGET
+нужных блоков и np.frombuffer по всем сразу.
+
+device_id хранится один раз в словаре устройств (DEVICE_INDEX_KEY —
+device_id -> номер, DEVICE_NAMES_KEY — обратно), в записи только номер.
+
+NumPy импортируется при первом чтении: запись точки обходится struct.
+"""
+import math
+import struct
+from datetime import datetime, timezone
+from typing import TYPE_CHECKING, Dict, List, Optional, Sequence, Tuple
+
+if TYPE_CHECKING:
+    import numpy as np
+
+RECORD = struct.Struct("<IId")
+DEVICE_INDEX_KEY = "vitals:devices"
+DEVICE_NAMES_KEY = "vitals:device_ids"
+DEVICE_SEQ_KEY = "vitals:devices:seq"
+
+
+def _dtype():
+    import numpy as np
+    # Та же раскладка, что у RECORD: без выравнивания, little-endian
+    return np.dtype([("offset_ms", "<u4"), ("device", "<u4"), ("value", "<f8")])
+
+
+def chunk_key(user_id: int, vital_type: str, bucket: int) -> str:
+    return f"vitals:c:{user_id}:{vital_type}:{bucket}"
+
+
+def chunk_buckets(start: float, end: float, chunk_seconds: int) -> range:
+    return range(int(start // chunk_seconds), int(end // chunk_seconds) + 1)
+
+
+def encode_record(timestamp: float, device_index: int, value: float, chunk_seconds: int) -> Tuple[int, bytes]:
+    """(bucket, 16 байт записи) для APPEND"""
+    bucket = int(timestamp // chunk_seconds)
+    offset_ms = min(int(round((timestamp - bucket * chunk_seconds) * 1000)), chunk_seconds * 1000 - 1)
+    return bucket, RECORD.pack(offset_ms, device_index, value)
+
+
+def vital_value(value) -> Optional[float]:
+    """Значение показателя для записи float64; None — не число (строка "36.6" приводится)"""
+    if isinstance(value, bool):
+        return None
+    try:
+        number = float(value)
+    except (TypeError, ValueError):
+        return None
+    return number if math.isfinite(number) else None
+
+
+def _utc_offsets(timestamps: "np.ndarray") -> "np.ndarray":
+    """Смещение локального времени для каждой точки: переход на летнее время внутри окна учитывается"""
+    import numpy as np
+    # Переходы часовых поясов происходят на границе минуты: достаточно одного вызова на минуту
+    minutes, inverse = np.unique(np.floor(timestamps / 60).astype(np.int64), return_inverse=True)
+    offsets = np.array([datetime.fromtimestamp(minute * 60, timezone.utc).astimezone().utcoffset().total_seconds()
+                        for minute in minutes.tolist()], dtype=np.float64)
+    return offsets[inverse]
+
+
+def _plain(number):
+    number = float(number)
+    return int(number) if number.is_integer() else number
+
+
+class Series:
+    """Точки одного показателя по возрастанию времени: массивы NumPy + имена устройств"""
+
+    __slots__ = ("timestamps", "devices", "values", "names")
+
+    def __init__(self, timestamps: "np.ndarray", devices: "np.ndarray", values: "np.ndarray",
+                 names: Dict[int, str] = None):
+        self.timestamps = timestamps
+        self.devices = devices
+        self.values = values
+        self.names = names if names is not None else {}
+
+    @classmethod
+    def build(cls, timestamps, devices, values, names: Dict[int, str] = None) -> "Series":
+        """Серия из несортированных массивов (точки разных блоков, старые члены ZSET)"""
+        import numpy as np
+        timestamps = np.asarray(timestamps, dtype=np.float64)
+        order = np.argsort(timestamps, kind="stable")
+        return cls(timestamps[order], np.asarray(devices, dtype=np.uint32)[order],
+                   np.asarray(values, dtype=np.float64)[order], names)
+
+    def __len__(self) -> int:
+        return len(self.values)
+
+    def since(self, cutoff: float) -> "Series":
+        import numpy as np
+        start = int(np.searchsorted(self.timestamps, cutoff, side="left"))
+        return Series(self.timestamps[start:], self.devices[start:], self.values[start:], self.names)
+
+    def merge(self, other: "Series") -> "Series":
+        import numpy as np
+        return Series.build(np.concatenate([self.timestamps, other.timestamps]),
+                            np.concatenate([self.devices, other.devices]),
+                            np.concatenate([self.values, other.values]),
+                            {**self.names, **other.names})
+
+    def summary(self) -> Optional[dict]:
+        """avg/min/max/count для дашборда — те же поля и округление, что раньше"""
+        if not len(self):
+            return None
+        return {
+            "avg": round(float(self.values.mean()), 1),
+            "min": _plain(self.values.min()),
+            "max": _plain(self.values.max()),
+            "count": len(self)
+        }
+
+    def to_points(self, start: int = 0) -> List[dict]:
+        """Точки в прежнем API-виде {device_id, value, timestamp}"""
+        import numpy as np
+        timestamps, devices, values = self.timestamps[start:], self.devices[start:], self.values[start:]
+        if not len(values):
+            return []
+        # Локальное время без зоны, как datetime.fromtimestamp(...).isoformat()
+        micros = np.round((timestamps + _utc_offsets(timestamps)) * 1e6).astype("datetime64[us]")
+        stamps = np.datetime_as_string(micros, unit="us").tolist()
+        # Целые показатели (пульс, давление) остаются целыми в JSON
+        values = values.astype(np.int64).tolist() if np.all(values == np.round(values)) else values.tolist()
+        names = [self.names.get(index) for index in devices.tolist()]
+        return [{"device_id": name, "value": value, "timestamp": stamp}
+                for name, value, stamp in zip(names, values, stamps)]
+
+    def last_point(self) -> Optional[dict]:
+        points = self.to_points(len(self) - 1) if len(self) else []
+        return points[0] if points else None
+
+
+def decode_chunks(buckets: Sequence[int], blobs: Sequence[Optional[bytes]], chunk_seconds: int,
+                  cutoff: float = 0.0) -> Series:
+    """Склеить блоки из MGET (None — блока нет) в одну серию и отрезать точки до cutoff"""
+    import numpy as np
+    dtype = _dtype()
+    parts, starts, counts = [], [], []
+    for bucket, blob in zip(buckets, blobs):
+        if blob:
+            # Неполная запись в хвосте (не бывает при APPEND целых записей) отбрасывается
+            count = len(blob) // dtype.itemsize
+            parts.append(blob[:count * dtype.itemsize])
+            starts.append(bucket * chunk_seconds)
+            counts.append(count)
+
+    records = np.frombuffer(b"".join(parts), dtype=dtype)
+    base = np.repeat(np.asarray(starts, dtype=np.float64), counts)
+    series = Series.build(base + records["offset_ms"] / 1000.0, records["device"], records["value"])
+    return series.since(cutoff) if cutoff else series
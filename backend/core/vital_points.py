@@ -0,0 +1,61 @@
+"""
+Формат точек показателей в Redis ZSET vitals:{user_id}:{vital_type}.
+
+Время точки хранится только в score (unix-время). Член ZSET — короткая строка
+"2|<value>|<device_id>|<tag>", где tag — миллисекунды от начала суток в base36:
+без него одинаковые значения с одного устройства схлопнулись бы в один член
+ZSET. Вместо ~90 байт JSON с повторённой ISO-датой выходит ~20 байт.
+
+Читатель версионный: член, начинающийся с "{", — старый JSON (v1) со своим
+timestamp, "2|" — компактный формат. Новые точки пишутся блоками
+(core/vital_chunks.py), а эти ZSET читаются, пока включён VITALS_LEGACY_READ,
+и истекают через 24 часа после перехода — миграция не нужна.
+"""
+import json
+from datetime import datetime
+from typing import Union
+
+POINT_VERSION = "2"
+_SEPARATOR = "|"
+_DIGITS = "0123456789abcdefghijklmnopqrstuvwxyz"
+_MS_PER_DAY = 86_400_000
+
+
+def _base36(number: int) -> str:
+    if number == 0:
+        return "0"
+    digits = []
+    while number:
+        number, remainder = divmod(number, 36)
+        digits.append(_DIGITS[remainder])
+    return "".join(reversed(digits))
+
+
+def _number(text: str) -> Union[int, float]:
+    try:
+        return int(text)
+    except ValueError:
+        return float(text)
+
+
+def encode_point(value: float, device_id: str, timestamp: float) -> str:
+    """Член ZSET для точки; timestamp уходит в score отдельно"""
+    tag = _base36(int(timestamp * 1000) % _MS_PER_DAY)
+    return f"{POINT_VERSION}|{value}|{device_id}|{tag}"
+
+
+def decode_point(member: Union[bytes, str], score: float) -> dict:
+    """Точка в прежнем API-виде {device_id, value, timestamp} из члена любой версии"""
+    if isinstance(member, bytes):
+        member = member.decode()
+    if member.startswith("{"):
+        return json.loads(member)
+    version, value, rest = member.split(_SEPARATOR, 2)
+    if version != POINT_VERSION:
+        raise ValueError(f"Unknown vital point version: {version}")
+    device_id = rest.rsplit(_SEPARATOR, 1)[0]
+    return {
+        "device_id": device_id,
+        "value": _number(value),
+        "timestamp": datetime.fromtimestamp(score).isoformat()
+    }
@@ -0,0 +1,147 @@
+"""
+Декодирование пакетов показаний от шлюзов/симулятора.
+
+Поддерживаемые форматы тела запроса (Content-Type):
+- application/json          {"device_id": "...", "readings": [{...}, ...]}
+- application/msgpack       та же структура в MessagePack (если установлен msgpack)
+- application/x-vitals      компактный бинарный формат фиксированной длины (см. ниже)
+
+Content-Encoding: gzip поддерживается для любого формата. Тело (и до, и после
+распаковки) ограничено MAX_BODY_BYTES: сверх лимита — PayloadTooLargeError.
+
+Бинарный формат (little-endian), должен совпадать с iot-simulator/codec.py:
+    header:  b"VT" | version:u8 | device_id_len:u8 | device_id:utf8 | count:u16
+    record:  timestamp:f64 (unix) | heart_rate:u16 | spo2:f32 | bp_sys:u16 | bp_dia:u16
+             | temperature:f32 | activity:u8
+Ноль в поле означает отсутствие значения.
+"""
+import json
+import struct
+import zlib
+from datetime import datetime
+from typing import List, Tuple
+
+try:
+    import msgpack
+
+    MSGPACK_AVAILABLE = True
+except ImportError:
+    MSGPACK_AVAILABLE = False
+
+BINARY_CONTENT_TYPE = "application/x-vitals"
+MSGPACK_CONTENT_TYPE = "application/msgpack"
+JSON_CONTENT_TYPE = "application/json"
+
+BINARY_MAGIC = b"VT"
+BINARY_VERSION = 1
+BINARY_RECORD = struct.Struct("<dHfHHfB")
+MAX_BATCH_SIZE = 10_000
+# ~10 000 JSON-показаний с запасом; защищает и от gzip-бомб
+MAX_BODY_BYTES = 8 * 1024 * 1024
+
+
+class PayloadTooLargeError(ValueError):
+    """Тело пакета больше MAX_BODY_BYTES (HTTP 413)"""
+
+
+def _gunzip(body: bytes, limit: int) -> bytes:
+    """Распаковка gzip (в т.ч. из нескольких членов) не больше limit байт"""
+    out = []
+    size = 0
+    while body:
+        decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+        try:
+            chunk = decompressor.decompress(body, limit - size + 1)
+        except zlib.error as e:
+            raise ValueError(f"Invalid gzip body: {e}")
+        size += len(chunk)
+        if size > limit or decompressor.unconsumed_tail:
+            raise PayloadTooLargeError(f"Decompressed body exceeds {limit} bytes")
+        if not decompressor.eof:
+            raise ValueError("Invalid gzip body: truncated stream")
+        out.append(chunk)
+        body = decompressor.unused_data
+    return b"".join(out)
+
+
+def _decode_binary(body: bytes) -> Tuple[str, List[dict]]:
+    if len(body) < 6 or body[:2] != BINARY_MAGIC:
+        raise ValueError("Invalid binary vitals header")
+    version, id_len = body[2], body[3]
+    if version != BINARY_VERSION:
+        raise ValueError(f"Unsupported binary vitals version: {version}")
+
+    offset = 4 + id_len
+    device_id = body[4:offset].decode("utf-8")
+    (count,) = struct.unpack_from("<H", body, offset)
+    offset += 2
+    if len(body) - offset != count * BINARY_RECORD.size:
+        raise ValueError("Binary vitals length does not match record count")
+
+    readings = []
+    for ts, hr, spo2, bp_sys, bp_dia, temp, activity in BINARY_RECORD.iter_unpack(body[offset:]):
+        readings.append({
+            "timestamp": ts,
+            "heart_rate": hr or None,
+            "spo2": round(spo2, 1) or None,
+            "bp_systolic": bp_sys or None,
+            "bp_diastolic": bp_dia or None,
+            "temperature": round(temp, 1) or None,
+            "activity_level": activity / 100
+        })
+    return device_id, readings
+
+
+def _payload_fields(payload) -> Tuple[str, List[dict]]:
+    if not isinstance(payload, dict):
+        raise ValueError("Batch must be an object with device_id and readings")
+    return payload.get("device_id"), payload.get("readings")
+
+
+def decode_batch(body: bytes, content_type: str = None, content_encoding: str = None) -> Tuple[str, List[dict]]:
+    """
+    Вернуть (device_id, readings) из тела запроса.
+    ValueError при неверном формате, PayloadTooLargeError — если тело больше MAX_BODY_BYTES.
+    """
+    if len(body) > MAX_BODY_BYTES:
+        raise PayloadTooLargeError(f"Body exceeds {MAX_BODY_BYTES} bytes")
+    if content_encoding and content_encoding.lower() == "gzip":
+        body = _gunzip(body, MAX_BODY_BYTES)
+
+    media_type = (content_type or JSON_CONTENT_TYPE).split(";")[0].strip().lower()
+
+    try:
+        if media_type == BINARY_CONTENT_TYPE:
+            device_id, readings = _decode_binary(body)
+        elif media_type == MSGPACK_CONTENT_TYPE:
+            if not MSGPACK_AVAILABLE:
+                raise ValueError("msgpack is not installed on the server")
+            device_id, readings = _payload_fields(msgpack.unpackb(body, raw=False))
+        else:
+            device_id, readings = _payload_fields(json.loads(body))
+    except json.JSONDecodeError as e:
+        raise ValueError(f"Invalid JSON body: {e}")
+    except (struct.error, TypeError, AttributeError) as e:
+        # Обрезанный бинарный пакет, неверные типы в msgpack и т.п. — ошибка клиента, не 500
+        raise ValueError(f"Malformed batch body: {e}")
+
+    if not device_id or not isinstance(device_id, str) or not isinstance(readings, list):
+        raise ValueError("Batch must contain device_id and a readings list")
+    if len(readings) > MAX_BATCH_SIZE:
+        raise ValueError(f"Batch too large: {len(readings)} > {MAX_BATCH_SIZE}")
+    if not all(isinstance(reading, dict) for reading in readings):
+        raise ValueError("Every reading must be an object")
+
+    return device_id, readings
+
+
+def parse_reading_timestamp(value) -> datetime:
+    """Время показания: unix timestamp или ISO строка, иначе текущее время"""
+    if isinstance(value, (int, float)) and value > 0:
+        return datetime.fromtimestamp(value)
+    if isinstance(value, str):
+        try:
+            return datetime.fromisoformat(value)
+        except ValueError:
+            pass
+    return datetime.now()
@@ -0,0 +1,210 @@
+"""
+Палатный поток для врача: одно WebSocket-подключение на много пациентов.
+
+Обновления не рассылаются по каждому показанию. WardHub копит изменения:
+- publish_vitals запоминает только поля, изменившиеся с прошлого тика (дельта);
+- publish_alert откладывает алерт до ближайшего тика.
+Раз в WARD_TICK_SECONDS flush кодирует дельту каждого изменившегося пациента в
+JSON один раз и собирает из готовых фрагментов один кадр на когорту — набор
+зрителей с одинаковым списком пациентов (обычно вся палата). Стоимость тика
+растёт с числом изменений и когорт, а не с произведением пациентов на зрителей.
+
+Новый зритель сразу получает ward_snapshot с последними известными значениями,
+дальше — ward_update с дельтами.
+"""
+import asyncio
+import json
+import logging
+from datetime import datetime
+from typing import Dict, FrozenSet, Iterable, List, Set
+
+from fastapi import WebSocket
+
+logger = logging.getLogger(__name__)
+
+WARD_TICK_SECONDS = 1.0
+WARD_SEND_TIMEOUT_SECONDS = 5.0
+
+
+class WardViewer:
+    __slots__ = ("connection_id", "websocket", "patients")
+
+    def __init__(self, connection_id: str, websocket: WebSocket, patients: FrozenSet[int]):
+        self.connection_id = connection_id
+        self.websocket = websocket
+        self.patients = patients
+
+
+class WardHub:
+    def __init__(self, tick_seconds: float = WARD_TICK_SECONDS):
+        self.tick_seconds = tick_seconds
+        self.viewers: Dict[str, WardViewer] = {}
+        self.cohorts: Dict[FrozenSet[int], Set[str]] = {}
+        self.watchers: Dict[int, int] = {}
+        self.state: Dict[int, dict] = {}
+        self.pending: Dict[int, dict] = {}
+        self.pending_alerts: Dict[int, List[dict]] = {}
+        self.seq = 0
+        self.stats = {"ticks": 0, "frames": 0, "bytes": 0, "updates": 0}
+        self.task = None
+        self.running = False
+
+    async def subscribe(self, connection_id: str, websocket: WebSocket, patients: Iterable[int]):
+        """Подписать подключение на набор пациентов и отправить снимок"""
+        self.unsubscribe(connection_id)
+        patients = frozenset(patients)
+        self.viewers[connection_id] = WardViewer(connection_id, websocket, patients)
+        self.cohorts.setdefault(patients, set()).add(connection_id)
+        for patient_id in patients:
+            self.watchers[patient_id] = self.watchers.get(patient_id, 0) + 1
+
+        snapshot = {
+            "type": "ward_snapshot",
+            "seq": self.seq,
+            "timestamp": datetime.now().isoformat(),
+            "patients": {str(p): {"vitals": self.state.get(p, {})} for p in patients}
+        }
+        await self._send(connection_id, json.dumps(snapshot, default=str))
+
+    def unsubscribe(self, connection_id: str):
+        viewer = self.viewers.pop(connection_id, None)
+        if viewer is None:
+            return
+        cohort = self.cohorts.get(viewer.patients)
+        if cohort is not None:
+            cohort.discard(connection_id)
+            if not cohort:
+                del self.cohorts[viewer.patients]
+        for patient_id in viewer.patients:
+            remaining = self.watchers.get(patient_id, 0) - 1
+            if remaining > 0:
+                self.watchers[patient_id] = remaining
+            else:
+                # Никто не смотрит — состояние пациента больше не держим
+                self.watchers.pop(patient_id, None)
+                self.state.pop(patient_id, None)
+                self.pending.pop(patient_id, None)
+                self.pending_alerts.pop(patient_id, None)
+
+    def publish_vitals(self, patient_id: int, vitals: dict):
+        """Учесть показание; O(полей), без работы с подключениями"""
+        if patient_id not in self.watchers:
+            return
+        self.stats["updates"] += 1
+        last = self.state.get(patient_id)
+        if last is None:
+            last = self.state[patient_id] = {}
+        changed = self.pending.get(patient_id)
+        for key, value in vitals.items():
+            if last.get(key) != value:
+                last[key] = value
+                if changed is None:
+                    changed = self.pending[patient_id] = {}
+                changed[key] = value
+
+    def publish_alert(self, patient_id: int, alert: dict):
+        if patient_id in self.watchers:
+            self.pending_alerts.setdefault(patient_id, []).append(alert)
+
+    async def flush(self) -> int:
+        """Отправить накопленные дельты; возвращает число кадров"""
+        if not self.pending and not self.pending_alerts:
+            return 0
+        pending, alerts = self.pending, self.pending_alerts
+        self.pending, self.pending_alerts = {}, {}
+        self.seq += 1
+        self.stats["ticks"] += 1
+
+        fragments = {}
+        for patient_id in pending.keys() | alerts.keys():
+            body = {}
+            if patient_id in pending:
+                body["vitals"] = pending[patient_id]
+            if patient_id in alerts:
+                body["alerts"] = alerts[patient_id]
+            fragments[patient_id] = f'"{patient_id}":{json.dumps(body, default=str)}'
+
+        header = f'{{"type":"ward_update","seq":{self.seq},"timestamp":"{datetime.now().isoformat()}","patients":{{'
+        sends = []
+        for patients, connection_ids in self.cohorts.items():
+            if len(fragments) < len(patients):
+                parts = [fragment for patient_id, fragment in fragments.items() if patient_id in patients]
+            else:
+                parts = [fragments[patient_id] for patient_id in patients if patient_id in fragments]
+            if not parts:
+                continue
+            frame = header + ",".join(parts) + "}}"
+            for connection_id in connection_ids:
+                sends.append(self._send(connection_id, frame))
+
+        if sends:
+            await asyncio.gather(*sends)
+        return len(sends)
+
+    async def _send(self, connection_id: str, frame: str):
+        viewer = self.viewers.get(connection_id)
+        if viewer is None:
+            return
+        try:
+            await asyncio.wait_for(viewer.websocket.send_text(frame), WARD_SEND_TIMEOUT_SECONDS)
+            self.stats["frames"] += 1
+            self.stats["bytes"] += len(frame)
+        except Exception as e:
+            logger.warning(f"Ward viewer {connection_id} dropped: {e}")
+            self.unsubscribe(connection_id)
+
+    async def _run(self):
+        while self.running:
+            await asyncio.sleep(self.tick_seconds)
+            try:
+                await self.flush()
+            except Exception as e:
+                logger.error(f"Ward stream flush failed: {e}")
+
+    async def start(self):
+        if self.task is None:
+            self.running = True
+            self.task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        self.running = False
+        if self.task is not None:
+            self.task.cancel()
+            try:
+                await self.task
+            except asyncio.CancelledError:
+                pass
+            self.task = None
+
+    def get_info(self) -> dict:
+        return {
+            "viewers": len(self.viewers),
+            "cohorts": len(self.cohorts),
+            "watched_patients": len(self.watchers),
+            **self.stats
+        }
+
+
+ward_hub = WardHub()
+
+
+async def handle_ward_message(websocket: WebSocket, client_id: str, data: str, allowed: FrozenSet[int]):
+    """subscribe: сменить набор пациентов (только из разрешённых), ping: pong"""
+    try:
+        message = json.loads(data)
+    except json.JSONDecodeError as e:
+        logger.error(f"Invalid JSON from ward viewer {client_id}: {e}")
+        return
+
+    message_type = message.get("type")
+    if message_type == "ping":
+        await websocket.send_text(json.dumps({"type": "pong", "timestamp": message.get("timestamp")}))
+    elif message_type == "subscribe":
+        requested = {int(p) for p in message.get("patients") or allowed if str(p).isdigit()}
+        denied = requested - allowed
+        await ward_hub.subscribe(client_id, websocket, requested & allowed)
+        if denied:
+            await websocket.send_text(json.dumps({"type": "error", "message": "Not assigned to patients",
+                                                  "patients": sorted(denied)}))
+    else:
+        logger.warning(f"Unknown ward message type from {client_id}: {message_type}")
@@ -1,4 +1,4 @@
-from typing import Dict, Set, Optional
+from typing import Dict, Iterable, Set, Optional
 from fastapi import WebSocket, WebSocketDisconnect, Query, HTTPException
 from sqlalchemy.orm import Session
 import json
@@ -94,10 +94,19 @@ class ConnectionManager:
     async def broadcast_to_user(self, user_id: int, message: dict):
         """Отправка данных всем подключениям пользователя"""
         if user_id in self.user_connections:
-            message_text = json.dumps(message)
-            disconnected_connections = []
+            await self._send_to_users((user_id,), json.dumps(message))
 
-            for connection_id in self.user_connections[user_id].copy():
+    async def broadcast_to_users(self, user_ids: Iterable[int], message: dict):
+        """Отправка одного сообщения подключениям нескольких пользователей (JSON собирается один раз)"""
+        online = [user_id for user_id in user_ids if user_id in self.user_connections]
+        if online:
+            await self._send_to_users(online, json.dumps(message))
+
+    async def _send_to_users(self, user_ids: Iterable[int], message_text: str):
+        disconnected_connections = []
+
+        for user_id in user_ids:
+            for connection_id in self.user_connections.get(user_id, set()).copy():
                 if connection_id in self.active_connections:
                     try:
                         await self.active_connections[connection_id].send_text(message_text)
@@ -107,28 +116,30 @@ class ConnectionManager:
                 else:
                     disconnected_connections.append(connection_id)
 
-            # Очищаем неактивные подключения
-            for connection_id in disconnected_connections:
-                self.disconnect(connection_id)
+        # Очищаем неактивные подключения
+        for connection_id in disconnected_connections:
+            self.disconnect(connection_id)
 
-    async def broadcast_vital_update(self, user_id: int, vital_data: dict):
-        """Broadcast vital signs update"""
+    async def broadcast_vital_update(self, user_id: int, vital_data: dict, recipients: Iterable[int] = ()):
+        """Broadcast vital signs update to the patient and permitted viewers"""
         message = {
             "type": "vital_update",
+            "patient_id": user_id,
             "data": vital_data,
             "timestamp": vital_data.get("timestamp")
         }
-        await self.broadcast_to_user(user_id, message)
+        await self.broadcast_to_users((user_id, *recipients), message)
 
-    async def broadcast_alert(self, user_id: int, alert_data: dict):
-        """Broadcast alert to user devices"""
+    async def broadcast_alert(self, user_id: int, alert_data: dict, recipients: Iterable[int] = ()):
+        """Broadcast alert to the patient and subscribed family members/doctors"""
         message = {
             "type": "alert",
+            "patient_id": user_id,
             "data": alert_data,
             "level": alert_data.get("level", "INFO"),
             "timestamp": alert_data.get("timestamp")
         }
-        await self.broadcast_to_user(user_id, message)
+        await self.broadcast_to_users((user_id, *recipients), message)
 
     async def broadcast_system_message(self, message: dict):
         """Отправка системного сообщения всем подключениям"""
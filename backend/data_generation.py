@@ -5,8 +5,15 @@
 Создает реалистичные данные для визуализации в Grafana
 """
 
+import argparse
+import io
 import random
 import datetime
+import time
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+
+import numpy as np
 from sqlalchemy import create_engine, text
 from sqlalchemy.orm import sessionmaker
 from faker import Faker
@@ -36,13 +43,175 @@ engine = create_engine(
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
 
+# Быстрая генерация временных рядов: столбцы строятся NumPy и грузятся бинарным COPY
+PG_EPOCH = np.datetime64('2000-01-01T00:00:00', 'us')
+COPY_CHUNK_ROWS = 500_000
+
+# Типы столбцов в формате бинарного COPY (big-endian)
+_PG_BINARY_TYPES = {'int4': '>i4', 'int8': '>i8', 'float8': '>f8', 'timestamp': '>i8'}
+
+SENSOR_READING_COLUMNS = [
+    ('device_id', 'int4'), ('timestamp', 'timestamp'),
+    ('temperature', 'float8'), ('humidity', 'float8'), ('pressure', 'float8'), ('light', 'float8'),
+    ('motion', 'int4'), ('custom_value1', 'float8'), ('custom_value2', 'float8'),
+]
+
+HEART_DATA_COLUMNS = [
+    ('device_id', 'int4'), ('timestamp', 'timestamp'),
+    ('heart_rate', 'int4'), ('spo2', 'float8'), ('hrv', 'float8'),
+    ('blood_pressure_systolic', 'int4'), ('blood_pressure_diastolic', 'int4'),
+    ('temperature', 'float8'), ('activity_level', 'int4'),
+]
+
+
+def _device_rng(seed: int, device_id: int, stream: int) -> np.random.Generator:
+    """Независимый генератор на устройство: результат не зависит от порядка и разбиения"""
+    return np.random.default_rng([seed, device_id, stream])
+
+
+def _timestamps(rng: np.random.Generator, daily_counts: np.ndarray, anchor: datetime.datetime) -> np.ndarray:
+    """Случайное время внутри каждого дня, день 0 - день anchor"""
+    days = np.repeat(np.arange(len(daily_counts)), daily_counts)
+    midnight = np.datetime64(anchor.replace(hour=0, minute=0, second=0, microsecond=0), 'us')
+    seconds = rng.integers(0, 86400, days.size)
+    return midnight - days.astype('timedelta64[D]') + seconds.astype('timedelta64[s]')
+
+
+def generate_sensor_columns(device_id: int, days_back: int, readings_per_day: int, scale: float,
+                            seed: int, anchor: datetime.datetime) -> dict:
+    """Показания датчиков одного устройства (аналог create_sensor_readings)"""
+    rng = _device_rng(seed, device_id, 1)
+    daily = rng.integers(readings_per_day // 2, readings_per_day * 2 + 1, days_back)
+    daily = np.maximum((daily * scale).astype(np.int64), 0)
+    n = int(daily.sum())
+
+    return {
+        'device_id': np.full(n, device_id, dtype=np.int32),
+        'timestamp': _timestamps(rng, daily, anchor),
+        'temperature': rng.uniform(18.0, 28.0, n).round(1),
+        'humidity': rng.uniform(30.0, 80.0, n).round(1),
+        'pressure': rng.uniform(750.0, 780.0, n).round(1),
+        'light': rng.uniform(0.0, 1000.0, n).round(1),
+        'motion': rng.integers(0, 101, n),
+        'custom_value1': rng.uniform(-10.0, 50.0, n).round(2),
+        'custom_value2': rng.uniform(0.0, 100.0, n).round(2),
+    }
+
+
+def generate_heart_columns(device_id: int, days_back: int, scale: float,
+                           seed: int, anchor: datetime.datetime) -> dict:
+    """Кардиологические данные одного устройства (аналог create_heart_data), None если устройство не кардио"""
+    rng = _device_rng(seed, device_id, 2)
+    # Не все устройства кардиологические
+    if rng.random() < 0.4:
+        return None
+
+    daily = np.maximum((rng.integers(2, 9, days_back) * scale).astype(np.int64), 0)
+    n = int(daily.sum())
+    activity = rng.integers(0, 11, n)
+
+    return {
+        'device_id': np.full(n, device_id, dtype=np.int32),
+        'timestamp': _timestamps(rng, daily, anchor),
+        'heart_rate': rng.integers(60, 101, n) + activity * 10 + rng.integers(-10, 11, n),
+        'spo2': rng.uniform(95.0, 100.0, n).round(1),
+        'hrv': rng.uniform(20.0, 50.0, n).round(1),
+        'blood_pressure_systolic': rng.integers(110, 141, n),
+        'blood_pressure_diastolic': rng.integers(70, 91, n),
+        'temperature': rng.uniform(36.0, 37.5, n).round(1),
+        'activity_level': activity,
+    }
+
+
+def encode_copy_binary(columns: list, data: dict) -> bytes:
+    """Кодирование столбцов в формат PostgreSQL COPY BINARY одним структурированным массивом"""
+    n = len(data[columns[0][0]])
+    fields = [('count', '>i2')]
+    for name, pg_type in columns:
+        fields.append((f'{name}_len', '>i4'))
+        fields.append((name, _PG_BINARY_TYPES[pg_type]))
+
+    rows = np.empty(n, dtype=np.dtype(fields))
+    rows['count'] = len(columns)
+    for name, pg_type in columns:
+        values = data[name]
+        if pg_type == 'timestamp':
+            # Микросекунды от 2000-01-01
+            values = (values.astype('datetime64[us]') - PG_EPOCH).astype(np.int64)
+        rows[f'{name}_len'] = np.dtype(_PG_BINARY_TYPES[pg_type]).itemsize
+        rows[name] = values
+
+    header = b'PGCOPY\n\xff\r\n\x00' + b'\x00' * 8
+    return header + rows.tobytes() + b'\xff\xff'
+
+
+def copy_columns(cursor, table: str, columns: list, data: dict) -> int:
+    """COPY ... FROM STDIN (FORMAT binary) порциями по COPY_CHUNK_ROWS"""
+    total = len(data[columns[0][0]])
+    column_list = ', '.join(name for name, _ in columns)
+    sql = f"COPY {table} ({column_list}) FROM STDIN WITH (FORMAT binary)"
+
+    for start in range(0, total, COPY_CHUNK_ROWS):
+        chunk = {name: values[start:start + COPY_CHUNK_ROWS] for name, values in data.items()}
+        cursor.copy_expert(sql, io.BytesIO(encode_copy_binary(columns, chunk)))
+
+    return total
+
+
+def _concat_columns(parts: list) -> dict:
+    return {name: np.concatenate([part[name] for part in parts]) for name in parts[0]}
+
+
+def copy_device_series(cursor, table: str, columns: list, generate, device_ids: list) -> int:
+    """Генерация по устройствам и загрузка COPY порциями около COPY_CHUNK_ROWS строк"""
+    total = 0
+    parts, buffered = [], 0
+    for device_id in device_ids:
+        part = generate(device_id)
+        if part is None:
+            continue
+        parts.append(part)
+        buffered += len(part['device_id'])
+        if buffered >= COPY_CHUNK_ROWS:
+            total += copy_columns(cursor, table, columns, _concat_columns(parts))
+            parts, buffered = [], 0
+    if parts:
+        total += copy_columns(cursor, table, columns, _concat_columns(parts))
+    return total
+
+
+def _init_copy_worker():
+    # Соединения пула унаследованы от родителя при fork, в воркере нужны свои
+    engine.dispose(close=False)
+
+
+def _copy_shard(table: str, columns: list, generate, device_ids: list) -> tuple:
+    """Воркер пула: свой COPY поток и своя транзакция на шард устройств"""
+    started = time.perf_counter()
+    connection = engine.raw_connection()
+    try:
+        with connection.cursor() as cursor:
+            rows = copy_device_series(cursor, table, columns, generate, device_ids)
+        connection.commit()
+    finally:
+        connection.close()
+    return rows, time.perf_counter() - started
+
+
 class MedicalDataMocker:
-    def __init__(self):
+    def __init__(self, scale: float = 1.0, seed: int = 42, bulk: bool = True, workers: int = 1):
         self.session = SessionLocal()
         self.patients = []
         self.doctors = []
         self.devices = []
         self.family_members = []
+        # Параметры быстрой генерации временных рядов
+        self.scale = scale
+        self.seed = seed
+        self.bulk = bulk
+        self.workers = workers
+        self.anchor = datetime.datetime.now()
+        self.expected_rows = {}
 
     def clear_all_data(self):
         """Очистка всех таблиц перед заполнением"""
@@ -354,6 +523,76 @@ class MedicalDataMocker:
         self.session.commit()
         print(f"Создано {total_records} кардиологических записей")
 
+    def _copy_time_series(self, table: str, columns: list, generate, label: str):
+        """Загрузка временного ряда в текущей сессии или шардами устройств по пулу процессов"""
+        started = time.perf_counter()
+        active_ids = [device.id for device in self.devices if device.status == DeviceStatus.ACTIVE]
+
+        if self.workers > 1:
+            # Справочники должны быть видны воркерам до того, как они начнут COPY
+            self.session.commit()
+            shards = [active_ids[i::self.workers] for i in range(self.workers)]
+            with ProcessPoolExecutor(max_workers=self.workers, initializer=_init_copy_worker) as pool:
+                futures = [
+                    pool.submit(_copy_shard, table, columns, generate, shard)
+                    for shard in shards if shard
+                ]
+                results = [future.result() for future in futures]
+            total = sum(rows for rows, _ in results)
+            for shard_no, (rows, seconds) in enumerate(results):
+                print(f"  шард {shard_no}: {rows} строк за {seconds:.1f} с")
+        else:
+            connection = self.session.connection().connection
+            with connection.cursor() as cursor:
+                total = copy_device_series(cursor, table, columns, generate, active_ids)
+            self.session.commit()
+
+        self.expected_rows[table] = self.expected_rows.get(table, 0) + total
+        elapsed = time.perf_counter() - started
+        print(f"Создано {total} {label} за {elapsed:.1f} с ({total / elapsed if elapsed else 0:.0f} строк/с)")
+        return total
+
+    def create_sensor_readings_bulk(self, days_back=30, readings_per_day=24):
+        """Быстрый путь create_sensor_readings: NumPy + COPY, детерминирован по seed"""
+        print(f"Создание показаний датчиков за {days_back} дней (bulk, scale={self.scale})...")
+        return self._copy_time_series(
+            SensorReading.__table__.name, SENSOR_READING_COLUMNS,
+            partial(generate_sensor_columns, days_back=days_back, readings_per_day=readings_per_day,
+                    scale=self.scale, seed=self.seed, anchor=self.anchor),
+            "показаний датчиков"
+        )
+
+    def create_heart_data_bulk(self, days_back=30):
+        """Быстрый путь create_heart_data: NumPy + COPY, детерминирован по seed"""
+        print(f"Создание кардиологических данных за {days_back} дней (bulk, scale={self.scale})...")
+        return self._copy_time_series(
+            HeartData.__table__.name, HEART_DATA_COLUMNS,
+            partial(generate_heart_columns, days_back=days_back,
+                    scale=self.scale, seed=self.seed, anchor=self.anchor),
+            "кардиологических записей"
+        )
+
+    def report_time_series_consistency(self) -> bool:
+        """Сверка загруженных временных рядов: ожидаемое число строк против фактического в БД"""
+        print("\nПроверка консистентности временных рядов:")
+        active_ids = {device.id for device in self.devices if device.status == DeviceStatus.ACTIVE}
+        consistent = True
+
+        for table, expected in self.expected_rows.items():
+            actual, devices, unknown_devices, first, last = self.session.execute(text(f"""
+                SELECT COUNT(*), COUNT(DISTINCT device_id),
+                       COUNT(*) FILTER (WHERE NOT (device_id = ANY(:active_ids))),
+                       MIN(timestamp), MAX(timestamp)
+                FROM {table}
+            """), {"active_ids": list(active_ids)}).one()
+
+            ok = actual == expected and unknown_devices == 0
+            consistent = consistent and ok
+            print(f"- {table}: ожидалось {expected}, в БД {actual}, устройств {devices}, "
+                  f"период {first} .. {last} {'OK' if ok else 'РАСХОЖДЕНИЕ'}")
+
+        return consistent
+
     def create_diagnoses(self):
         """Создание диагнозов"""
         diagnoses_list = [
@@ -616,8 +855,13 @@ class MedicalDataMocker:
             self.create_family_access()
 
             # Создание временных данных
-            self.create_sensor_readings(days_back=60, readings_per_day=24)
-            self.create_heart_data(days_back=60)
+            if self.bulk:
+                self.create_sensor_readings_bulk(days_back=60, readings_per_day=24)
+                self.create_heart_data_bulk(days_back=60)
+                self.report_time_series_consistency()
+            else:
+                self.create_sensor_readings(days_back=60, readings_per_day=24)
+                self.create_heart_data(days_back=60)
 
             # Создание медицинских данных
             self.create_diagnoses()
@@ -797,8 +1041,26 @@ def create_grafana_queries():
 
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Заполнение БД тестовыми данными")
+    parser.add_argument("--scale", type=float, default=1.0,
+                        help="множитель числа показаний на устройство (для нагрузочных тестов)")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--legacy", action="store_true",
+                        help="старый путь через ORM (session.add по одной записи)")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="число процессов для загрузки временных рядов (0 - по числу ядер)")
+    args = parser.parse_args()
+
+    Faker.seed(args.seed)
+    random.seed(args.seed)
+
     # Создание и запуск мокера
-    mocker = MedicalDataMocker()
+    mocker = MedicalDataMocker(
+        scale=args.scale,
+        seed=args.seed,
+        bulk=not args.legacy,
+        workers=args.workers or os.cpu_count()
+    )
     mocker.run_full_mock()
 
     # Вывод полезных запросов
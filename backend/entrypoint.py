@@ -1,4 +1,5 @@
 #!/usr/bin/env python
+import importlib.util
 import os
 import sys
 import time
@@ -43,6 +44,34 @@ def run_migrations():
         sys.exit(1)
 
 
+MULTI_WORKER_WARNING = """
+!!! WEB_CONCURRENCY={workers}: real-time alerting is NOT multi-worker safe !!!
+WebSocket clients, the ward hub, alert episodes, trend windows and the Telegram
+rate limiter live in each worker's memory. With several workers, ingest handled
+by one worker never reaches WebSocket clients of another, the same alert can be
+sent once per worker, trend rules see only part of the readings and the
+per-chat Telegram rate is multiplied by {workers}. Use WEB_CONCURRENCY=1 until
+these share state through Redis.
+"""
+
+
+def uvicorn_args():
+    """Аргументы uvicorn: production — WEB_CONCURRENCY воркеров (по умолчанию 1), uvloop/httptools, без --reload"""
+    args = ['uvicorn', 'main:app', '--host', '0.0.0.0', '--port', '8045']
+    if os.getenv('APP_ENV', 'development') != 'production':
+        return args + ['--reload']
+
+    # Состояние алертинга и WebSocket живёт в памяти процесса: больше одного воркера — только осознанно
+    workers = max(1, int(os.getenv('WEB_CONCURRENCY', '1') or 1))
+    if workers > 1:
+        print(MULTI_WORKER_WARNING.format(workers=workers), file=sys.stderr)
+    loop = 'uvloop' if importlib.util.find_spec('uvloop') else 'asyncio'
+    http = 'httptools' if importlib.util.find_spec('httptools') else 'h11'
+    print(f"Production mode: {workers} workers, loop={loop}, http={http}")
+    return args + ['--workers', str(workers), '--loop', loop, '--http', http, '--no-access-log',
+                   '--timeout-graceful-shutdown', '30']
+
+
 def main():
     """Main entrypoint"""
     wait_for_postgres()
@@ -50,7 +79,10 @@ def main():
 
     # Start the application
     print("Starting application...")
-    os.execvp('uvicorn', ['uvicorn', 'main:app', '--host', '0.0.0.0', '--port', '8045', '--reload'])
+    # Каждый воркер считает cold start от этой отметки и пишет его в лог при готовности
+    os.environ['SERVER_LAUNCH_TIME'] = str(time.time())
+    args = uvicorn_args()
+    os.execvp(args[0], args)
 
 
 if __name__ == "__main__":
@@ -1,13 +1,27 @@
 from fastapi import FastAPI, WebSocket, WebSocketDisconnect, Query
+from fastapi.responses import JSONResponse
 from fastapi.middleware.cors import CORSMiddleware
 from contextlib import asynccontextmanager
 import logging
-from datetime import datetime
+import os
+import resource
+import time
+from datetime import datetime, timedelta
 from typing import Optional
 
-from api import auth, vitals, devices, analytics, export
-from core.websocket import manager, handle_websocket_message
+from api import auth, vitals, devices, analytics, export, metrics
+from core.metrics import MetricsMiddleware, uptime_seconds
+from core.websocket import manager, handle_websocket_message, verify_websocket_token
+from core.ward_stream import ward_hub, handle_ward_message
+from core.loop_watchdog import loop_watchdog
+from core.profiler import ProfileRequestMiddleware
+from core.query_tracker import QueryStatsMiddleware
+from core.traffic_capture import traffic_capture
 from services.redis_service import redis_service
+from services.notification_outbox import notification_dispatcher
+from services.recipient_index import recipient_index
+from services.health_service import health_service
+from core.config import settings
 from database import engine
 # ИСПРАВЛЕНО: Импортируем Base из models, а не из database
 from models import Base
@@ -16,17 +30,34 @@ logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 
+def peak_rss_mb() -> float:
+    """Пиковая RSS процесса (ru_maxrss в Linux — в КБ)"""
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+startup_report = {}
+
+
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     # Startup
+    startup_started = time.perf_counter()
     try:
         await redis_service.connect()
         logger.info("🚀 Medical Monitoring System Started")
 
-        # ИСПРАВЛЕНО: Раскомментируем создание таблиц
-        logger.info("📊 Creating database tables...")
-        Base.metadata.create_all(bind=engine)
-        logger.info("📊 Database tables created/verified")
+        if settings.TELEGRAM_BOT_TOKEN:
+            await notification_dispatcher.start()
+        await ward_hub.start()
+        if settings.LOOP_WATCHDOG_ENABLED:
+            await loop_watchdog.start()
+
+        # В production схему ведут только миграции (entrypoint.py: alembic upgrade head)
+        if settings.DB_CREATE_ALL:
+            logger.info("📊 Creating database tables...")
+            Base.metadata.create_all(bind=engine)
+            logger.info("📊 Database tables created/verified")
+        await health_service.start()
 
         logger.info("🔌 Redis connection established")
         logger.info("📁 Export functionality enabled")
@@ -34,12 +65,31 @@ async def lifespan(app: FastAPI):
         logger.error(f"Failed to start services: {e}")
         raise
 
+    launched_at = os.getenv("SERVER_LAUNCH_TIME")
+    startup_report.update({
+        "pid": os.getpid(),
+        "startup_ms": round((time.perf_counter() - startup_started) * 1000, 1),
+        "cold_start_ms": round((time.time() - float(launched_at)) * 1000, 1) if launched_at else None,
+        "peak_rss_mb": round(peak_rss_mb(), 1)
+    })
+    logger.info(f"✅ Worker {startup_report['pid']} ready: lifespan {startup_report['startup_ms']} ms, "
+                f"cold start {startup_report['cold_start_ms']} ms, peak RSS {startup_report['peak_rss_mb']} MB")
+    if settings.APP_ENV == "production" and settings.WEB_CONCURRENCY > 1:
+        # См. entrypoint.MULTI_WORKER_WARNING: алерты и WebSocket не разделяются между воркерами
+        logger.warning(f"⚠️ WEB_CONCURRENCY={settings.WEB_CONCURRENCY}: WebSocket, alert episodes, trend windows "
+                       f"and Telegram rate limits are per worker; real-time alerting is not multi-worker safe")
+
     yield
 
     # Shutdown
     try:
+        await health_service.stop()
+        await notification_dispatcher.stop()
+        await ward_hub.stop()
+        await loop_watchdog.stop()
         await redis_service.disconnect()
         await manager.disconnect_all()
+        traffic_capture.close()
         logger.info("👋 System Shutdown Complete")
     except Exception as e:
         logger.error(f"Error during shutdown: {e}")
@@ -52,6 +102,9 @@ app = FastAPI(
     lifespan=lifespan
 )
 
+app.add_middleware(QueryStatsMiddleware)
+app.add_middleware(ProfileRequestMiddleware)
+app.add_middleware(MetricsMiddleware)
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"],  # В продакшене указать конкретные домены
@@ -67,6 +120,7 @@ app.include_router(devices.router, prefix="/api/devices", tags=["devices"])
 app.include_router(analytics.router, prefix="/api/analytics", tags=["analytics"])
 # ИСПРАВЛЕНО: Убираем дублирование роутера export
 app.include_router(export.router, prefix="/api/export", tags=["export"])
+app.include_router(metrics.router, tags=["monitoring"])
 
 
 @app.get("/")
@@ -82,34 +136,21 @@ async def root():
 
 @app.get("/api/health")
 async def health_check():
-    """Проверка состояния системы"""
-    try:
-        # Проверяем Redis
-        redis_status = "connected" if redis_service else "disconnected"
-
-        # Проверяем WebSocket connections
-        ws_info = manager.get_connection_info()
-
-        return {
-            "status": "healthy",
-            "timestamp": datetime.now().isoformat(),
-            "services": {
-                "redis": redis_status,
-                "database": "connected",
-                "websocket": {
-                    "status": "active",
-                    **ws_info
-                },
-                "export": "available"
-            }
-        }
-    except Exception as e:
-        logger.error(f"Health check failed: {e}")
-        return {
-            "status": "unhealthy",
-            "timestamp": datetime.now().isoformat(),
-            "error": str(e)
-        }
+    """Состояние зависимостей по результатам последних фоновых проб (без запросов к БД)"""
+    return health_service.report()
+
+
+@app.get("/api/health/live")
+async def liveness():
+    """Liveness: процесс и цикл событий отвечают"""
+    return {"status": "alive", "timestamp": datetime.now().isoformat()}
+
+
+@app.get("/api/health/ready")
+async def readiness():
+    """Readiness: свежие пробы и доступная БД, иначе 503"""
+    report = health_service.report()
+    return JSONResponse(report, status_code=200 if health_service.is_ready() else 503)
 
 
 @app.get("/api/status")
@@ -118,8 +159,10 @@ async def system_status():
     return {
         "system": "Medical IoT Monitoring",
         "version": "2.1.0",
-        "uptime": "calculated_uptime",  # Здесь можно добавить реальный uptime
+        "uptime": str(timedelta(seconds=int(uptime_seconds()))),
+        "uptime_seconds": round(uptime_seconds(), 1),
         "connections": manager.get_connection_info(),
+        "worker": {**startup_report, "peak_rss_mb": round(peak_rss_mb(), 1)},
         "timestamp": datetime.now().isoformat(),
         "features": {
             "authentication": "JWT",
@@ -174,6 +217,50 @@ async def websocket_endpoint(
         manager.disconnect(client_id)
 
 
+@app.websocket("/ws/ward/{client_id}")
+async def ward_websocket_endpoint(
+        websocket: WebSocket,
+        client_id: str,
+        token: Optional[str] = Query(None, description="JWT access token of a doctor")
+):
+    """
+    Палатный поток: одно подключение на всех назначенных врачу пациентов (PatientDoctor)
+
+    Сначала приходит ward_snapshot, затем раз в тик ward_update с дельтами.
+    Сообщение {"type": "subscribe", "patients": [...]} сужает набор пациентов.
+    """
+    user_id = verify_websocket_token(token) if token else None
+    if user_id is None:
+        await websocket.close(code=4001, reason="Invalid token")
+        return
+
+    await recipient_index.ensure_fresh()
+    allowed = recipient_index.patients_for_doctor(user_id)
+    if not allowed:
+        await websocket.close(code=4003, reason="No assigned patients")
+        return
+
+    await websocket.accept()
+    logger.info(f"Ward stream connected for doctor user {user_id}: {len(allowed)} patients")
+    try:
+        await ward_hub.subscribe(client_id, websocket, allowed)
+        while True:
+            data = await websocket.receive_text()
+            await handle_ward_message(websocket, client_id, data, allowed)
+    except WebSocketDisconnect:
+        logger.info(f"Ward viewer {client_id} disconnected")
+    except Exception as e:
+        logger.error(f"Ward stream error for {client_id}: {e}")
+    finally:
+        ward_hub.unsubscribe(client_id)
+
+
+@app.get("/api/websocket/ward")
+async def get_ward_stream_info():
+    """Статистика палатного потока"""
+    return ward_hub.get_info()
+
+
 @app.post("/api/websocket/broadcast")
 async def broadcast_message(message: dict):
     """
@@ -213,6 +300,7 @@ if __name__ == "__main__":
         "main:app",
         host="0.0.0.0",
         port=8045,
-        reload=True,
+        reload=settings.APP_ENV != "production",
+        workers=settings.WEB_CONCURRENCY if settings.APP_ENV == "production" else None,
         log_level="info"
     )
\ No newline at end of file
@@ -0,0 +1,161 @@
+#!/usr/bin/env python
+"""
+Очистка сырых IoT данных старше settings.IOT_DATA_RETENTION_DAYS.
+
+Удаление идёт короткими пачками по диапазонам первичного ключа с паузами между
+ними, поэтому блокировки держатся недолго, а WAL пишется равномерно.
+Кардиологические данные удаляются только если для соответствующего часа
+уже есть строка в hourly_vitals_summary (её создаёт Airflow DAG).
+
+Запуск: python retention.py [--batch-size 5000] [--pause 0.5] [--dry-run]
+Периодически (сервис retention в docker-compose): python retention.py --every 900
+"""
+import argparse
+import datetime
+import time
+
+from sqlalchemy import inspect, text
+
+from core.config import settings
+from database import engine
+from models import Device, HeartData, SensorReading
+
+ROLLUP_TABLE = "hourly_vitals_summary"
+
+
+class RetentionJob:
+    def __init__(self, retention_days: int = settings.IOT_DATA_RETENTION_DAYS,
+                 batch_size: int = 5000, pause_seconds: float = 0.5, dry_run: bool = False):
+        self.retention_days = retention_days
+        self.batch_size = batch_size
+        self.pause_seconds = pause_seconds
+        self.dry_run = dry_run
+        self.cutoff = self._cutoff()
+
+    def _cutoff(self) -> datetime.datetime:
+        return datetime.datetime.now() - datetime.timedelta(days=self.retention_days)
+
+    def _id_range(self, table) -> tuple:
+        """Диапазон id строк старше порога (по индексу на id и timestamp)"""
+        with engine.connect() as conn:
+            row = conn.execute(
+                text(f"SELECT MIN(id), MAX(id) FROM {table.name} WHERE timestamp < :cutoff"),
+                {"cutoff": self.cutoff}
+            ).first()
+        return row[0], row[1]
+
+    def _heart_data_filter(self) -> tuple:
+        """JOIN и условие: удаляем только часы, для которых уже есть агрегат"""
+        using = f"{Device.__table__.name} d"
+        condition = f"""
+            t.device_id = d.id
+            AND EXISTS (
+                SELECT 1 FROM {ROLLUP_TABLE} s
+                WHERE s.user_id = d.user_id
+                  AND s.hour_timestamp = date_trunc('hour', t.timestamp)
+            )
+        """
+        return using, condition
+
+    def _purge(self, table, using: str = None, condition: str = None) -> dict:
+        """Удаление пачками по диапазону первичного ключа"""
+        where = "t.id >= :lo AND t.id < :hi AND t.timestamp < :cutoff"
+        if condition:
+            where += f" AND {condition}"
+        if self.dry_run:
+            sql = text(f"SELECT COUNT(*) FROM {table.name} t{', ' + using if using else ''} WHERE {where}")
+        else:
+            sql = text(f"DELETE FROM {table.name} t{' USING ' + using if using else ''} WHERE {where}")
+
+        lo, hi = self._id_range(table)
+        stats = {"table": table.name, "deleted": 0, "batches": 0, "seconds": 0.0}
+        if lo is None:
+            print(f"{table.name}: нет данных старше {self.cutoff:%Y-%m-%d %H:%M}")
+            return stats
+
+        print(f"{table.name}: id {lo}..{hi}, пачки по {self.batch_size}")
+        started = time.perf_counter()
+
+        for batch_lo in range(lo, hi + 1, self.batch_size):
+            params = {"lo": batch_lo, "hi": batch_lo + self.batch_size, "cutoff": self.cutoff}
+
+            # Каждая пачка в отдельной короткой транзакции
+            with engine.begin() as conn:
+                result = conn.execute(sql, params)
+                deleted = result.scalar() if self.dry_run else result.rowcount
+
+            stats["deleted"] += deleted
+            stats["batches"] += 1
+
+            if deleted and self.pause_seconds:
+                time.sleep(self.pause_seconds)
+
+        stats["seconds"] = time.perf_counter() - started
+        rate = stats["deleted"] / stats["seconds"] if stats["seconds"] else 0
+        action = "к удалению" if self.dry_run else "удалено"
+        print(f"{table.name}: {action} {stats['deleted']} строк за {stats['seconds']:.1f} с "
+              f"({rate:.0f} строк/с, {stats['batches']} пачек)")
+        return stats
+
+    def run(self) -> list:
+        self.cutoff = self._cutoff()
+        print(f"=== Очистка данных старше {self.retention_days} дней (до {self.cutoff:%Y-%m-%d %H:%M}) ===")
+        results = []
+
+        if inspect(engine).has_table(ROLLUP_TABLE):
+            results.append(self._purge(HeartData.__table__, *self._heart_data_filter()))
+        else:
+            print(f"{HeartData.__table__.name}: пропущено, таблица {ROLLUP_TABLE} ещё не создана")
+
+        # Для показаний датчиков окружающей среды агрегатов нет, удаляем только по порогу
+        results.append(self._purge(SensorReading.__table__))
+
+        # Строки без агрегатов остаются до следующего запуска
+        if results and results[0]["table"] == HeartData.__table__.name:
+            with engine.connect() as conn:
+                kept = conn.execute(
+                    text(f"SELECT COUNT(*) FROM {HeartData.__table__.name} WHERE timestamp < :cutoff"),
+                    {"cutoff": self.cutoff}
+                ).scalar()
+            if kept and not self.dry_run:
+                print(f"{HeartData.__table__.name}: оставлено {kept} строк без агрегатов за час")
+            if kept and not results[0]["deleted"]:
+                # Гейт не пропустил ни одной строки: агрегаты не пишутся, сырые данные копятся
+                print(f"ВНИМАНИЕ: {HeartData.__table__.name}: ни одна из {kept} строк старше порога не удалена — "
+                      f"в {ROLLUP_TABLE} нет их часов. Проверьте DAG medical_data_processing "
+                      f"(airflow/dags/hourly_aggregation.py) или пересчитайте агрегаты DAG hourly_vitals_backfill")
+
+        return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Batched retention cleanup for raw IoT data")
+    parser.add_argument("--days", type=int, default=settings.IOT_DATA_RETENTION_DAYS)
+    parser.add_argument("--batch-size", type=int, default=5000)
+    parser.add_argument("--pause", type=float, default=0.5, help="pause between batches, seconds")
+    parser.add_argument("--dry-run", action="store_true")
+    parser.add_argument("--every", type=float, default=0,
+                        help="repeat every N seconds instead of running once (0 = once)")
+    args = parser.parse_args()
+
+    job = RetentionJob(
+        retention_days=args.days,
+        batch_size=args.batch_size,
+        pause_seconds=args.pause,
+        dry_run=args.dry_run
+    )
+    if not args.every:
+        job.run()
+        return
+
+    while True:
+        try:
+            job.run()
+        except Exception as e:
+            # БД недоступна или перезапускается: следующая попытка по расписанию
+            print(f"Очистка не выполнена: {e}")
+        time.sleep(args.every)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,10 +1,11 @@
-import aiohttp
 import logging
 from datetime import datetime
 from typing import Dict, Optional
 import os
 
 from services.redis_service import redis_service
+from services.notification_outbox import notification_outbox
+from core.alert_rules import alert_rules
 
 logger = logging.getLogger(__name__)
 
@@ -27,12 +28,17 @@ class AlertService:
         logger.warning(f"Alert for user {user_id}: {alert_data}")
 
     async def _send_telegram_alert(self, user_id: int, alert_data: dict):
-        """Send Telegram notification"""
+        """Queue Telegram notification; delivery happens in the background dispatcher"""
         try:
-            level = alert_data.get("type", "info")
-            emoji = {"critical": "🚨", "warning": "⚠️", "info": "ℹ️"}.get(level, "📢")
+            await notification_outbox.enqueue(self.telegram_chat_id, self._format_telegram_message(user_id, alert_data))
+        except Exception as e:
+            logger.error(f"Telegram outbox error: {e}")
+
+    def _format_telegram_message(self, user_id: int, alert_data: dict) -> str:
+        level = alert_data.get("type", "info")
+        emoji = {"critical": "🚨", "warning": "⚠️", "info": "ℹ️", "resolved": "✅"}.get(level, "📢")
 
-            message = f"""
+        return f"""
 {emoji} Medical Alert
 
 Patient ID: {user_id}
@@ -43,72 +49,9 @@ Message: {alert_data.get('message', 'No message')}
 Time: {alert_data.get('timestamp', datetime.now().isoformat())}
 """.strip()
 
-            url = f"https://api.telegram.org/bot{self.telegram_token}/sendMessage"
-            payload = {
-                "chat_id": self.telegram_chat_id,
-                "text": message,
-                "parse_mode": "Markdown"
-            }
-
-            async with aiohttp.ClientSession() as session:
-                async with session.post(url, json=payload) as response:
-                    if response.status == 200:
-                        logger.info(f"Telegram alert sent for user {user_id}")
-                    else:
-                        logger.error(f"Failed to send Telegram alert: {response.status}")
-
-        except Exception as e:
-            logger.error(f"Telegram error: {e}")
-
     async def check_thresholds(self, user_id: int, vital_type: str, value: float) -> Optional[dict]:
         """Check if value exceeds thresholds"""
-        thresholds = {
-            "heart_rate": {"low": 50, "high": 100, "critical_high": 120},
-            "spo2": {"critical_low": 90, "low": 95},
-            "temperature": {"high": 37.5, "critical_high": 39.0},
-            "blood_pressure": {"high": 140, "critical_high": 180}
-        }
-
-        if vital_type not in thresholds:
-            return None
-
-        limits = thresholds[vital_type]
-        alert = None
-
-        if "critical_high" in limits and value >= limits["critical_high"]:
-            alert = {
-                "type": "critical",
-                "metric": vital_type,
-                "value": value,
-                "threshold": limits["critical_high"],
-                "direction": "high"
-            }
-        elif "critical_low" in limits and value <= limits["critical_low"]:
-            alert = {
-                "type": "critical",
-                "metric": vital_type,
-                "value": value,
-                "threshold": limits["critical_low"],
-                "direction": "low"
-            }
-        elif "high" in limits and value >= limits["high"]:
-            alert = {
-                "type": "warning",
-                "metric": vital_type,
-                "value": value,
-                "threshold": limits["high"],
-                "direction": "high"
-            }
-        elif "low" in limits and value <= limits["low"]:
-            alert = {
-                "type": "warning",
-                "metric": vital_type,
-                "value": value,
-                "threshold": limits["low"],
-                "direction": "low"
-            }
-
-        return alert
+        return alert_rules.check_value(vital_type, value, user_id)
 
 
 alert_service = AlertService()
\ No newline at end of file
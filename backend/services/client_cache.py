@@ -0,0 +1,153 @@
+"""
+Локальный кеш ключей Redis с инвалидацией от сервера (client-side caching).
+
+Для read-mostly ключей (кеш дашборда, персональные пороги) значение после
+первого GET хранится в памяти процесса в виде байтов, и повторное чтение не
+ходит в Redis вообще. Свежесть обеспечивает tracking: отдельное соединение
+включает CLIENT TRACKING ON REDIRECT <своё id> BCAST PREFIX ... и подписано
+на __redis__:invalidate, поэтому любая запись в ключ с этими префиксами (из
+любого процесса) сразу выбрасывает его из локального кеша. Работает и в
+RESP2, отдельный протокол не нужен.
+
+Если tracking недоступен (Redis < 6, соединение упало), кеш переходит на
+короткий локальный TTL (REDIS_LOCAL_CACHE_FALLBACK_TTL): устаревание
+ограничено секундой, но запросы к Redis всё равно экономятся.
+
+Гонка «прочитали старое значение, пока летела инвалидация» закрыта счётчиком
+поколений: значение кладётся в кеш, только если с момента чтения не было
+инвалидаций.
+"""
+import asyncio
+import logging
+import time
+from collections import OrderedDict
+from typing import Iterable, Optional, Sequence, Tuple
+
+from core.config import settings
+
+try:
+    from redis.exceptions import ResponseError
+except ImportError:
+    # Без redis кеш не запускается, ловить нечего
+    ResponseError = ()
+
+logger = logging.getLogger(__name__)
+
+INVALIDATE_CHANNEL = "__redis__:invalidate"
+KEEPALIVE_SECONDS = 15
+RETRY_SECONDS = 5
+
+
+class ClientSideCache:
+    def __init__(self, prefixes: Sequence[str] = None, ttl_seconds: float = None,
+                 fallback_ttl_seconds: float = None, max_entries: int = 10_000):
+        self.prefixes = tuple(prefixes if prefixes is not None else settings.REDIS_CLIENT_CACHE_PREFIXES)
+        self.ttl = ttl_seconds if ttl_seconds is not None else settings.REDIS_LOCAL_CACHE_TTL
+        self.fallback_ttl = fallback_ttl_seconds if fallback_ttl_seconds is not None \
+            else settings.REDIS_LOCAL_CACHE_FALLBACK_TTL
+        self.max_entries = max_entries
+        self.entries: "OrderedDict[str, Tuple[float, bytes]]" = OrderedDict()
+        self.generation = 0
+        self.tracking = False
+        self.supported = True
+        self.running = False
+        self.task: Optional[asyncio.Task] = None
+        self.stats = {"hits": 0, "misses": 0, "invalidations": 0}
+
+    def cacheable(self, key: str) -> bool:
+        return key.startswith(self.prefixes)
+
+    def get(self, key: str) -> Optional[bytes]:
+        entry = self.entries.get(key)
+        if entry is not None:
+            expires, value = entry
+            if time.monotonic() < expires:
+                self.stats["hits"] += 1
+                return value
+            del self.entries[key]
+        self.stats["misses"] += 1
+        return None
+
+    def put(self, key: str, value: bytes, generation: int, ttl: Optional[float] = None):
+        """Запомнить прочитанное значение, если после чтения (generation) не было инвалидаций"""
+        if generation != self.generation:
+            return
+        limit = self.ttl if self.tracking else self.fallback_ttl
+        ttl = min(ttl, limit) if ttl is not None and ttl > 0 else limit
+        self.entries[key] = (time.monotonic() + ttl, value)
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+
+    def invalidate(self, keys: Optional[Iterable] = None):
+        """keys=None — FLUSHDB/потеря соединения: сбросить всё"""
+        self.generation += 1
+        self.stats["invalidations"] += 1
+        if keys is None:
+            self.entries.clear()
+            return
+        for key in keys:
+            self.entries.pop(key.decode() if isinstance(key, bytes) else key, None)
+
+    async def start(self, pool):
+        """pool — пул без socket_timeout: соединение подписчика простаивает между инвалидациями"""
+        if self.task is None and self.prefixes:
+            self.running = True
+            self.task = asyncio.create_task(self._listen(pool))
+
+    async def stop(self):
+        self.running = False
+        if self.task is not None:
+            self.task.cancel()
+            try:
+                await self.task
+            except asyncio.CancelledError:
+                pass
+            self.task = None
+
+    async def _listen(self, pool):
+        while self.running and self.supported:
+            connection = pool.make_connection()
+            try:
+                await connection.connect()
+                await connection.send_command("CLIENT", "ID")
+                client_id = await connection.read_response()
+                command = ["CLIENT", "TRACKING", "ON", "REDIRECT", client_id, "BCAST"]
+                for prefix in self.prefixes:
+                    command += ["PREFIX", prefix]
+                await connection.send_command(*command)
+                await connection.read_response()
+                await connection.send_command("SUBSCRIBE", INVALIDATE_CHANNEL)
+                await connection.read_response()
+
+                # Пока подписки не было, инвалидации могли потеряться
+                self.invalidate(None)
+                self.tracking = True
+                logger.info(f"Redis client-side cache tracking on for {', '.join(self.prefixes)}")
+
+                awaiting_pong = False
+                while self.running:
+                    message = await connection.read_response(timeout=KEEPALIVE_SECONDS)
+                    if message is None:
+                        if awaiting_pong:
+                            raise ConnectionError("no PONG from Redis on the invalidation connection")
+                        await connection.send_command("PING")
+                        awaiting_pong = True
+                        continue
+                    awaiting_pong = False
+                    if message[0] == b"message":
+                        self.invalidate(message[2])
+            except asyncio.CancelledError:
+                raise
+            except ResponseError as e:
+                # Redis без CLIENT TRACKING (до 6.0) или запрет ACL: остаёмся на локальном TTL
+                self.supported = False
+                logger.warning(f"Redis client tracking unavailable, using {self.fallback_ttl:g}s local TTL: {e}")
+            except Exception as e:
+                logger.warning(f"Redis invalidation connection lost: {e}")
+            finally:
+                self.tracking = False
+                self.invalidate(None)
+                await connection.disconnect()
+            if self.running and self.supported:
+                await asyncio.sleep(RETRY_SECONDS)
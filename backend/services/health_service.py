@@ -0,0 +1,159 @@
+"""
+Проверки зависимостей для /api/health и проб балансировщика.
+
+Фоновая задача раз в HEALTH_PROBE_INTERVAL_SECONDS параллельно опрашивает
+Postgres (SELECT 1 через пул), Redis (PING), очередь уведомлений и состояние
+WebSocket, каждую пробу — с таймаутом. Эндпоинты отдают только закешированный
+результат, поэтому частые запросы балансировщика ничего не стоят и не
+нагружают БД.
+
+- live: процесс отвечает (цикл событий жив);
+- ready: последняя проверка свежая и база доступна. Redis не обязателен:
+  без него сервис работает на памяти, это состояние degraded.
+
+Проба БД идёт в потоке, который asyncio не может прервать, поэтому она
+ограничена и на стороне сервера (statement_timeout, connect_timeout драйвера),
+а новый поток не запускается, пока жив предыдущий: зависший Postgres не
+съедает пул по соединению за интервал.
+"""
+import asyncio
+import logging
+import time
+from datetime import datetime
+from typing import Dict, Optional
+
+from sqlalchemy import text
+
+from core.config import settings
+from core.websocket import manager
+from core.ward_stream import ward_hub
+from database import engine
+from services.redis_service import redis_service
+from services.notification_outbox import notification_outbox, notification_dispatcher
+
+logger = logging.getLogger(__name__)
+
+OK, DEGRADED, DOWN = "ok", "degraded", "down"
+CRITICAL_PROBES = ("database",)
+
+
+class HealthService:
+    def __init__(self, interval: float = None, timeout: float = None):
+        self.interval = interval or settings.HEALTH_PROBE_INTERVAL_SECONDS
+        self.timeout = timeout or settings.HEALTH_PROBE_TIMEOUT_SECONDS
+        self.results: Dict[str, dict] = {}
+        self.checked_at: Optional[float] = None
+        self.task = None
+        self.running = False
+        self._db_probe: Optional[asyncio.Future] = None
+
+    def _select_one(self):
+        with engine.connect() as connection:
+            if engine.dialect.name == "postgresql":
+                # SET LOCAL живёт до конца транзакции: соединение вернётся в пул без таймаута
+                connection.execute(text(f"SET LOCAL statement_timeout = {int(self.timeout * 1000)}"))
+            connection.execute(text("SELECT 1"))
+
+    async def _probe_database(self) -> dict:
+        if self._db_probe is not None and not self._db_probe.done():
+            raise RuntimeError("previous database probe is still running")
+        self._db_probe = asyncio.ensure_future(asyncio.to_thread(self._select_one))
+        # Ошибка пробы, пережившей таймаут, не должна всплыть как "exception was never retrieved"
+        self._db_probe.add_done_callback(lambda future: future.cancelled() or future.exception())
+        # shield: таймаут _run_probe отменяет ожидание, а не слежение за потоком
+        await asyncio.shield(self._db_probe)
+        pool = engine.pool
+        return {"status": OK, "pool": {"size": pool.size(), "checked_out": pool.checkedout(),
+                                       "overflow": pool.overflow()}}
+
+    async def _probe_redis(self) -> dict:
+        if not redis_service.connected:
+            return {"status": DOWN, "error": "not connected, using in-memory fallback"}
+        await redis_service.client.ping()
+        return {"status": OK}
+
+    async def _probe_notifications(self) -> dict:
+        depth = await notification_outbox.pending()
+        status = OK
+        if depth > settings.HEALTH_QUEUE_DEGRADED_DEPTH:
+            status = DEGRADED
+        if settings.TELEGRAM_BOT_TOKEN and not notification_dispatcher.running:
+            status = DEGRADED
+        return {"status": status, "queue_depth": depth, "local_queue": len(notification_outbox.local),
+                "dispatcher": "running" if notification_dispatcher.running else "stopped"}
+
+    async def _probe_websocket(self) -> dict:
+        return {"status": OK, **manager.get_connection_info(),
+                "ward": {"viewers": len(ward_hub.viewers), "running": ward_hub.running}}
+
+    async def _run_probe(self, name: str, probe) -> dict:
+        started = time.perf_counter()
+        try:
+            result = await asyncio.wait_for(probe(), self.timeout)
+        except asyncio.TimeoutError:
+            result = {"status": DOWN, "error": f"timed out after {self.timeout:g}s"}
+        except Exception as e:
+            result = {"status": DOWN, "error": str(e)}
+        result["latency_ms"] = round((time.perf_counter() - started) * 1000, 2)
+        if result["status"] != OK and self.results.get(name, {}).get("status") != result["status"]:
+            logger.warning(f"Health probe {name}: {result['status']} {result.get('error', '')}")
+        return result
+
+    async def refresh(self):
+        probes = {
+            "database": self._probe_database,
+            "redis": self._probe_redis,
+            "notifications": self._probe_notifications,
+            "websocket": self._probe_websocket,
+        }
+        results = await asyncio.gather(*(self._run_probe(name, probe) for name, probe in probes.items()))
+        self.results = dict(zip(probes, results))
+        self.checked_at = time.time()
+
+    async def _run(self):
+        while self.running:
+            try:
+                await self.refresh()
+            except Exception as e:
+                logger.error(f"Health refresh failed: {e}")
+            await asyncio.sleep(self.interval)
+
+    async def start(self):
+        # Первая проверка идёт в фоне: старт воркера её не ждёт, до неё ready отдаёт 503
+        if self.task is None:
+            self.running = True
+            self.task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        self.running = False
+        if self.task is not None:
+            self.task.cancel()
+            try:
+                await self.task
+            except asyncio.CancelledError:
+                pass
+            self.task = None
+
+    def is_fresh(self) -> bool:
+        return self.checked_at is not None and time.time() - self.checked_at < self.interval * 3
+
+    def is_ready(self) -> bool:
+        return self.is_fresh() and all(self.results.get(name, {}).get("status") == OK for name in CRITICAL_PROBES)
+
+    def overall_status(self) -> str:
+        if not self.is_ready():
+            return "unhealthy"
+        if any(result["status"] != OK for result in self.results.values()):
+            return "degraded"
+        return "healthy"
+
+    def report(self) -> dict:
+        return {
+            "status": self.overall_status(),
+            "timestamp": datetime.now().isoformat(),
+            "checked_at": datetime.fromtimestamp(self.checked_at).isoformat() if self.checked_at else None,
+            "services": self.results
+        }
+
+
+health_service = HealthService()
@@ -1,21 +1,34 @@
 from typing import Dict, Optional, List
 from datetime import datetime
 import logging
+import time
 from sqlalchemy.orm import Session
 
 from models import Device, HeartData, DeviceStatus
 from services.redis_service import redis_service
 from services.alert_service import alert_service
 from core.websocket import manager
+from core.vitals_codec import parse_reading_timestamp
+from core.timing import StageTimer
+from core.metrics import INGEST_STAGE_DURATION
+from core.alert_rules import alert_rules
+from core.alert_episodes import alert_episodes
+from core.trend_rules import trend_rules
+from services.recipient_index import recipient_index
+from core.ward_stream import ward_hub
 
 logger = logging.getLogger(__name__)
 
 
 class IoTService:
 
-    async def process_device_data(self, device_id: str, data: dict, db: Session):
+    async def process_device_data(self, device_id: str, data: dict, db: Session,
+                                  timer: Optional[StageTimer] = None):
         """Process incoming IoT device data"""
-        device = db.query(Device).filter(Device.device_id == device_id).first()
+        timer = timer or StageTimer(INGEST_STAGE_DURATION)
+
+        with timer.stage("device_lookup"):
+            device = db.query(Device).filter(Device.device_id == device_id).first()
         if not device:
             logger.error(f"Unknown device: {device_id}")
             return False
@@ -29,37 +42,113 @@ class IoTService:
             return False
 
         # Store in database
-        heart_data = HeartData(
-            device_id=device.id,
-            heart_rate=vital_data.get("heart_rate"),
-            spo2=vital_data.get("spo2"),
-            blood_pressure_systolic=vital_data.get("bp_systolic"),
-            blood_pressure_diastolic=vital_data.get("bp_diastolic"),
-            temperature=vital_data.get("temperature"),
-            timestamp=datetime.now()
-        )
-
-        db.add(heart_data)
-        db.commit()
+        with timer.stage("db_write"):
+            heart_data = HeartData(
+                device_id=device.id,
+                heart_rate=vital_data.get("heart_rate"),
+                spo2=vital_data.get("spo2"),
+                blood_pressure_systolic=vital_data.get("bp_systolic"),
+                blood_pressure_diastolic=vital_data.get("bp_diastolic"),
+                temperature=vital_data.get("temperature"),
+                timestamp=datetime.now()
+            )
+
+            db.add(heart_data)
+            db.commit()
 
         # Store in Redis for real-time
         user_id = device.user_id
-        for vital_type, value in vital_data.items():
-            if value is not None:
-                await redis_service.store_vital(device_id, user_id, vital_type, value)
+        with timer.stage("redis"):
+            for vital_type, value in vital_data.items():
+                if value is not None:
+                    await redis_service.store_vital(device_id, user_id, vital_type, value)
 
         # Check for alerts
-        alerts = await self._check_vital_alerts(user_id, vital_data)
-        for alert in alerts:
-            await alert_service.send_alert(user_id, alert)
-            await manager.broadcast_alert(user_id, alert)
+        with timer.stage("alerts"):
+            alerts = await self._check_vital_alerts(user_id, vital_data)
+            if alerts:
+                await recipient_index.ensure_fresh()
+            for alert in alerts:
+                await alert_service.send_alert(user_id, alert)
+                await manager.broadcast_alert(user_id, alert, recipient_index.alert_recipients_for(user_id, alert))
+                ward_hub.publish_alert(user_id, alert)
 
         # Broadcast update to connected clients
-        await manager.broadcast_vital_update(user_id, vital_data)
+        with timer.stage("broadcast"):
+            await recipient_index.ensure_fresh()
+            await manager.broadcast_vital_update(user_id, vital_data, recipient_index.vitals_recipients_for(user_id))
+            ward_hub.publish_vitals(user_id, vital_data)
 
         logger.info(f"Processed data from device {device_id}")
         return True
 
+    async def process_device_batch(self, device_id: str, readings: List[dict], db: Session,
+                                   timer: Optional[StageTimer] = None) -> Optional[int]:
+        """Process a batch of readings from one device with a single DB commit"""
+        timer = timer or StageTimer(INGEST_STAGE_DURATION)
+
+        with timer.stage("device_lookup"):
+            device = db.query(Device).filter(Device.device_id == device_id).first()
+        if not device:
+            logger.error(f"Unknown device: {device_id}")
+            return None
+
+        device.last_seen = datetime.now()
+        user_id = device.user_id
+
+        processed = []
+        timestamps = []
+        with timer.stage("db_write"):
+            for reading in readings:
+                vital_data = await self._extract_vitals(reading)
+                if not vital_data:
+                    continue
+                timestamp = parse_reading_timestamp(reading.get("timestamp"))
+                db.add(HeartData(
+                    device_id=device.id,
+                    heart_rate=vital_data.get("heart_rate"),
+                    spo2=vital_data.get("spo2"),
+                    blood_pressure_systolic=vital_data.get("bp_systolic"),
+                    blood_pressure_diastolic=vital_data.get("bp_diastolic"),
+                    temperature=vital_data.get("temperature"),
+                    timestamp=timestamp
+                ))
+                processed.append(vital_data)
+                timestamps.append(timestamp.timestamp())
+
+            # Один commit на весь пакет
+            db.commit()
+
+        with timer.stage("redis"):
+            for vital_data in processed:
+                for vital_type, value in vital_data.items():
+                    if value is not None:
+                        await redis_service.store_vital(device_id, user_id, vital_type, value)
+
+        with timer.stage("alerts"):
+            await self._load_alert_overrides(user_id)
+            notifications = []
+            for vital_data, timestamp, alerts in zip(processed, self._window_timestamps(timestamps),
+                                                     alert_rules.evaluate_batch(processed, user_id)):
+                notifications.extend(self._apply_alert_state(user_id, vital_data, alerts, timestamp))
+            if notifications:
+                await recipient_index.ensure_fresh()
+            for alert in notifications:
+                await alert_service.send_alert(user_id, alert)
+                await manager.broadcast_alert(user_id, alert, recipient_index.alert_recipients_for(user_id, alert))
+                ward_hub.publish_alert(user_id, alert)
+
+        # Клиентам отправляем только последнее состояние пакета
+        with timer.stage("broadcast"):
+            if processed:
+                await recipient_index.ensure_fresh()
+                await manager.broadcast_vital_update(user_id, processed[-1],
+                                                     recipient_index.vitals_recipients_for(user_id))
+                ward_hub.publish_vitals(user_id, processed[-1])
+
+        logger.info(f"Processed batch of {len(processed)} readings from device {device_id}")
+        return len(processed)
+
     async def _extract_vitals(self, data: dict) -> dict:
         """Extract vital signs from device data"""
         # Handle different device formats
@@ -73,8 +162,8 @@ class IoTService:
             vitals["heart_rate"] = data.get("HR") or data.get("heart_rate")
             vitals["spo2"] = data.get("SPO2") or data.get("spo2")
             vitals["temperature"] = data.get("TEMP") or data.get("temperature")
-            vitals["bp_systolic"] = data.get("BPS") or data.get("bp_systolic")
-            vitals["bp_diastolic"] = data.get("BPD") or data.get("bp_diastolic")
+            vitals["bp_systolic"] = data.get("BPS") or data.get("bp_systolic") or data.get("blood_pressure_systolic")
+            vitals["bp_diastolic"] = data.get("BPD") or data.get("bp_diastolic") or data.get("blood_pressure_diastolic")
         # Generic sensor data
         else:
             vitals = {
@@ -88,109 +177,42 @@ class IoTService:
         # Clean up None values
         return {k: v for k, v in vitals.items() if v is not None}
 
+    async def _load_alert_overrides(self, user_id: int):
+        """Подтянуть персональные пороги пациента (не чаще раза в OVERRIDES_REFRESH_SECONDS)"""
+        if alert_rules.needs_refresh(user_id):
+            overrides = await redis_service.get_alert_overrides(user_id)
+            try:
+                alert_rules.set_overrides(user_id, overrides)
+            except ValueError as e:
+                logger.error(f"Invalid alert overrides for user {user_id}: {e}")
+                alert_rules.set_overrides(user_id, None)
+
     async def _check_vital_alerts(self, user_id: int, vitals: dict) -> List[dict]:
-        """Check vitals for alert conditions"""
-        alerts = []
-        timestamp = datetime.now().isoformat()
-
-        # Heart rate
-        hr = vitals.get("heart_rate")
-        if hr:
-            if hr > 120:
-                alerts.append({
-                    "type": "critical",
-                    "metric": "heart_rate",
-                    "value": hr,
-                    "message": f"Critical: Heart rate {hr} bpm",
-                    "threshold": 120,
-                    "timestamp": timestamp
-                })
-            elif hr > 100:
-                alerts.append({
-                    "type": "warning",
-                    "metric": "heart_rate",
-                    "value": hr,
-                    "message": f"High heart rate: {hr} bpm",
-                    "threshold": 100,
-                    "timestamp": timestamp
-                })
-            elif hr < 50:
-                alerts.append({
-                    "type": "warning",
-                    "metric": "heart_rate",
-                    "value": hr,
-                    "message": f"Low heart rate: {hr} bpm",
-                    "threshold": 50,
-                    "timestamp": timestamp
-                })
-
-        # Blood pressure
-        bp_sys = vitals.get("bp_systolic")
-        if bp_sys:
-            if bp_sys > 180:
-                alerts.append({
-                    "type": "critical",
-                    "metric": "blood_pressure",
-                    "value": bp_sys,
-                    "message": f"Critical: Systolic BP {bp_sys}",
-                    "threshold": 180,
-                    "timestamp": timestamp
-                })
-            elif bp_sys > 140:
-                alerts.append({
-                    "type": "warning",
-                    "metric": "blood_pressure",
-                    "value": bp_sys,
-                    "message": f"High blood pressure: {bp_sys}",
-                    "threshold": 140,
-                    "timestamp": timestamp
-                })
-
-        # SpO2
-        spo2 = vitals.get("spo2")
-        if spo2:
-            if spo2 < 90:
-                alerts.append({
-                    "type": "critical",
-                    "metric": "spo2",
-                    "value": spo2,
-                    "message": f"Critical: Low oxygen {spo2}%",
-                    "threshold": 90,
-                    "timestamp": timestamp
-                })
-            elif spo2 < 95:
-                alerts.append({
-                    "type": "warning",
-                    "metric": "spo2",
-                    "value": spo2,
-                    "message": f"Low oxygen saturation: {spo2}%",
-                    "threshold": 95,
-                    "timestamp": timestamp
-                })
-
-        # Temperature
-        temp = vitals.get("temperature")
-        if temp:
-            if temp > 39.0:
-                alerts.append({
-                    "type": "critical",
-                    "metric": "temperature",
-                    "value": temp,
-                    "message": f"High fever: {temp}°C",
-                    "threshold": 39.0,
-                    "timestamp": timestamp
-                })
-            elif temp > 37.5:
-                alerts.append({
-                    "type": "warning",
-                    "metric": "temperature",
-                    "value": temp,
-                    "message": f"Elevated temperature: {temp}°C",
-                    "threshold": 37.5,
-                    "timestamp": timestamp
-                })
-
-        return alerts
+        """Check vitals for alert conditions, returns only alerts that should be sent"""
+        await self._load_alert_overrides(user_id)
+        return self._apply_alert_state(user_id, vitals, alert_rules.evaluate(vitals, user_id))
+
+    @staticmethod
+    def _window_timestamps(timestamps: List[float]) -> List[float]:
+        """
+        Время показаний пакета для оконных правил: по часам сервера, как у одиночных показаний.
+        Интервалы между показаниями сохраняются, самое новое попадает на момент приёма,
+        поэтому отстающие или спешащие часы устройства не сдвигают окна пациента.
+        """
+        if not timestamps:
+            return []
+        shift = time.time() - max(timestamps)
+        return [timestamp + shift for timestamp in timestamps]
+
+    def _apply_alert_state(self, user_id: int, vitals: dict, alerts, timestamp: Optional[float] = None) -> List[dict]:
+        """Добавить оконные правила и пропустить алерты через эпизоды"""
+        trend_alerts, trend_values = trend_rules.update(user_id, vitals, timestamp)
+        if trend_alerts:
+            alerts = [*alerts, *trend_alerts]
+        if trend_values:
+            vitals = {**vitals, **trend_values}
+        # Открытый эпизод подавляет повторы; уведомляем об открытии, эскалации и закрытии
+        return alert_episodes.update(user_id, vitals, alerts)
 
 
 iot_service = IoTService()
\ No newline at end of file
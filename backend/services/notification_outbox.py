@@ -0,0 +1,350 @@
+"""
+Outbox уведомлений: алерты не отправляются в Telegram из запроса ингеста.
+
+AlertService только кладёт сообщение в outbox:
+- Redis stream notifications:outbox (consumer group, переживает рестарт);
+- локальную ограниченную очередь, если Redis недоступен.
+
+NotificationDispatcher — фоновая задача с одной долгоживущей aiohttp-сессией
+(пул соединений). Он читает пачками, склеивает сообщения одного чата в одно
+(до лимита Telegram), соблюдает лимиты на чат и на бота, повторяет 429/5xx/
+сетевые ошибки с экспоненциальной задержкой (отложенные лежат в ZSET
+notifications:retry), а после NOTIFY_MAX_ATTEMPTS переносит сообщение в
+notifications:dead. Адрес API настраивается (TELEGRAM_API_URL), поэтому
+диспетчер можно прогнать против локальной заглушки
+(benchmarks/bench_notification_outbox.py).
+"""
+import asyncio
+import heapq
+import json
+import logging
+import os
+import random
+import socket
+import time
+import uuid
+from collections import deque
+from typing import TYPE_CHECKING, Dict, List, Optional, Tuple
+
+from core.config import settings
+from services.redis_service import redis_service
+
+if TYPE_CHECKING:
+    import aiohttp
+
+logger = logging.getLogger(__name__)
+
+OUTBOX_STREAM = "notifications:outbox"
+RETRY_ZSET = "notifications:retry"
+DEAD_LETTER_STREAM = "notifications:dead"
+CONSUMER_GROUP = "notification-dispatchers"
+OUTBOX_MAXLEN = 100_000
+DEAD_LETTER_MAXLEN = 10_000
+LOCAL_QUEUE_MAX = 10_000
+CLAIM_IDLE_MS = 60_000
+CLAIM_INTERVAL_SECONDS = 30
+TELEGRAM_MESSAGE_LIMIT = 4096
+RETRYABLE_STATUSES = {429, 500, 502, 503, 504}
+
+Entry = Tuple[Optional[str], dict]
+
+
+class NotificationOutbox:
+    """Очередь уведомлений: Redis stream, при недоступном Redis — память процесса"""
+
+    def __init__(self):
+        self.local: deque = deque(maxlen=LOCAL_QUEUE_MAX)
+        self.local_retry: List[Tuple[float, str, dict]] = []
+        self.local_ready = asyncio.Event()
+        self.group_ready = False
+
+    async def enqueue(self, chat_id, text: str):
+        await self._add({
+            "id": uuid.uuid4().hex,
+            "chat_id": str(chat_id),
+            "text": text,
+            "attempts": 0,
+            "created": time.time()
+        })
+
+    async def _add(self, payload: dict):
+        if redis_service.connected:
+            try:
+                await redis_service.client.xadd(OUTBOX_STREAM, {"payload": json.dumps(payload)},
+                                                maxlen=OUTBOX_MAXLEN, approximate=True)
+                return
+            except Exception as e:
+                logger.error(f"Outbox XADD failed, using local queue: {e}")
+        if len(self.local) == self.local.maxlen:
+            logger.error("Local notification queue is full, dropping the oldest message")
+        self.local.append((None, payload))
+        self.local_ready.set()
+
+    async def _ensure_group(self):
+        if self.group_ready:
+            return
+        try:
+            await redis_service.client.xgroup_create(OUTBOX_STREAM, CONSUMER_GROUP, id="0", mkstream=True)
+        except Exception as e:
+            if "BUSYGROUP" not in str(e):
+                raise
+        self.group_ready = True
+
+    async def read(self, consumer: str, count: int, block_ms: int = 1000) -> List[Entry]:
+        """Следующая пачка: сначала локальная очередь, затем stream"""
+        entries = []
+        while self.local and len(entries) < count:
+            entries.append(self.local.popleft())
+        if entries:
+            return entries
+
+        if not redis_service.connected:
+            self.local_ready.clear()
+            try:
+                await asyncio.wait_for(self.local_ready.wait(), block_ms / 1000)
+            except asyncio.TimeoutError:
+                pass
+            return entries
+
+        await self._ensure_group()
+        response = await redis_service.client.xreadgroup(
+            CONSUMER_GROUP, consumer, {OUTBOX_STREAM: ">"}, count=count, block=block_ms
+        )
+        for _stream, messages in response or []:
+            entries.extend((entry_id, json.loads(fields["payload"])) for entry_id, fields in messages)
+        return entries
+
+    async def claim_stale(self, consumer: str, count: int) -> List[Entry]:
+        """Забрать сообщения, зависшие у упавшего диспетчера"""
+        if not redis_service.connected:
+            return []
+        await self._ensure_group()
+        result = await redis_service.client.xautoclaim(
+            OUTBOX_STREAM, CONSUMER_GROUP, consumer, min_idle_time=CLAIM_IDLE_MS, start_id="0-0", count=count
+        )
+        return [(entry_id, json.loads(fields["payload"])) for entry_id, fields in result[1] if fields]
+
+    async def ack(self, entry_ids: List[str]):
+        entry_ids = [entry_id for entry_id in entry_ids if entry_id]
+        if entry_ids and redis_service.connected:
+            await redis_service.client.xack(OUTBOX_STREAM, CONSUMER_GROUP, *entry_ids)
+            await redis_service.client.xdel(OUTBOX_STREAM, *entry_ids)
+
+    async def schedule_retry(self, payload: dict, delay: float):
+        payload = {**payload, "attempts": payload.get("attempts", 0) + 1}
+        due = time.time() + delay
+        if redis_service.connected:
+            await redis_service.client.zadd(RETRY_ZSET, {json.dumps(payload): due})
+        else:
+            heapq.heappush(self.local_retry, (due, payload["id"], payload))
+
+    async def promote_due(self, limit: int = 500) -> int:
+        """Вернуть в очередь сообщения, у которых наступило время повтора"""
+        now = time.time()
+        promoted = 0
+        while self.local_retry and self.local_retry[0][0] <= now and promoted < limit:
+            _, _, payload = heapq.heappop(self.local_retry)
+            await self._add(payload)
+            promoted += 1
+
+        if redis_service.connected:
+            due = await redis_service.client.zrangebyscore(RETRY_ZSET, 0, now, start=0, num=limit)
+            for member in due:
+                # ZREM успешен только у одного диспетчера — без дублей
+                if await redis_service.client.zrem(RETRY_ZSET, member):
+                    await self._add(json.loads(member))
+                    promoted += 1
+        return promoted
+
+    async def dead_letter(self, payload: dict, reason: str):
+        logger.error(f"Notification {payload.get('id')} to chat {payload.get('chat_id')} dropped: {reason}")
+        if redis_service.connected:
+            await redis_service.client.xadd(DEAD_LETTER_STREAM,
+                                            {"payload": json.dumps(payload), "reason": reason},
+                                            maxlen=DEAD_LETTER_MAXLEN, approximate=True)
+
+    async def pending(self) -> int:
+        """Примерная глубина очереди (stream + отложенные повторы)"""
+        pending = len(self.local) + len(self.local_retry)
+        if redis_service.connected:
+            pending += await redis_service.client.xlen(OUTBOX_STREAM)
+            pending += await redis_service.client.zcard(RETRY_ZSET)
+        return pending
+
+
+class RateLimiter:
+    """Резервирование слотов: минимальный интервал на ключ (чат) и общий лимит"""
+
+    def __init__(self, per_key_rate: float, global_rate: float):
+        self.key_interval = 1.0 / per_key_rate
+        self.global_interval = 1.0 / global_rate
+        self.next_key: Dict[str, float] = {}
+        self.next_global = 0.0
+
+    def reserve(self, key: str, now: float) -> float:
+        """Зарезервировать слот, вернуть сколько ждать до отправки"""
+        slot = max(now, self.next_key.get(key, 0.0), self.next_global)
+        self.next_key[key] = slot + self.key_interval
+        self.next_global = slot + self.global_interval
+        if len(self.next_key) > 10_000:
+            self.next_key = {k: t for k, t in self.next_key.items() if t > now}
+        return slot - now
+
+    def defer(self, key: str, seconds: float, now: float):
+        """Telegram вернул retry_after: не трогаем чат указанное время"""
+        self.next_key[key] = max(self.next_key.get(key, 0.0), now + seconds)
+
+
+def _coalesce(items: List[Entry]) -> List[List[Entry]]:
+    """Склеить подряд идущие сообщения одного чата в группы до TELEGRAM_MESSAGE_LIMIT"""
+    groups, current, size = [], [], 0
+    for item in items:
+        length = len(item[1]["text"]) + 2
+        if current and size + length > TELEGRAM_MESSAGE_LIMIT:
+            groups.append(current)
+            current, size = [], 0
+        current.append(item)
+        size += length
+    if current:
+        groups.append(current)
+    return groups
+
+
+class NotificationDispatcher:
+    def __init__(self, outbox: NotificationOutbox, api_url: Optional[str] = None, token: Optional[str] = None,
+                 batch_size: int = settings.NOTIFY_BATCH_SIZE, concurrency: int = settings.NOTIFY_CONCURRENCY,
+                 per_chat_rate: float = settings.NOTIFY_PER_CHAT_RATE,
+                 global_rate: float = settings.NOTIFY_GLOBAL_RATE,
+                 max_attempts: int = settings.NOTIFY_MAX_ATTEMPTS,
+                 backoff_seconds: float = settings.NOTIFY_BACKOFF_SECONDS,
+                 backoff_max_seconds: float = settings.NOTIFY_BACKOFF_MAX_SECONDS):
+        self.outbox = outbox
+        self.api_url = (api_url or settings.TELEGRAM_API_URL).rstrip("/")
+        self.token = token if token is not None else (settings.TELEGRAM_BOT_TOKEN or "")
+        self.batch_size = batch_size
+        self.concurrency = concurrency
+        self.max_attempts = max_attempts
+        self.backoff_seconds = backoff_seconds
+        self.backoff_max_seconds = backoff_max_seconds
+        self.limiter = RateLimiter(per_chat_rate, global_rate)
+        self.consumer = f"{socket.gethostname()}:{os.getpid()}"
+        self.session: Optional["aiohttp.ClientSession"] = None
+        self.task: Optional[asyncio.Task] = None
+        self.running = False
+        self.stats = {"requests": 0, "delivered": 0, "retried": 0, "dead": 0, "errors": 0}
+
+    async def start(self):
+        if self.task:
+            return
+        # aiohttp (~0.1 с импорта) нужен только при настроенном Telegram — грузим при старте диспетчера
+        import aiohttp
+
+        connector = aiohttp.TCPConnector(limit=self.concurrency, ttl_dns_cache=300)
+        self.session = aiohttp.ClientSession(connector=connector, timeout=aiohttp.ClientTimeout(total=10))
+        self.running = True
+        self.task = asyncio.create_task(self._run())
+        logger.info(f"📬 Notification dispatcher started ({self.consumer})")
+
+    async def stop(self, timeout: float = 5.0):
+        self.running = False
+        if self.task:
+            try:
+                await asyncio.wait_for(self.task, timeout)
+            except asyncio.TimeoutError:
+                self.task.cancel()
+            self.task = None
+        if self.session:
+            await self.session.close()
+            self.session = None
+
+    async def _run(self):
+        last_claim = 0.0
+        while self.running:
+            try:
+                await self.outbox.promote_due()
+                if time.monotonic() - last_claim > CLAIM_INTERVAL_SECONDS:
+                    last_claim = time.monotonic()
+                    stale = await self.outbox.claim_stale(self.consumer, self.batch_size)
+                    if stale:
+                        await self.deliver(stale)
+
+                entries = await self.outbox.read(self.consumer, self.batch_size)
+                if entries:
+                    await self.deliver(entries)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Notification dispatcher error: {e}")
+                await asyncio.sleep(1)
+
+    async def deliver(self, entries: List[Entry]):
+        """Доставить пачку: чаты параллельно, внутри чата — по порядку"""
+        by_chat: Dict[str, List[Entry]] = {}
+        for entry in entries:
+            by_chat.setdefault(entry[1]["chat_id"], []).append(entry)
+
+        semaphore = asyncio.Semaphore(self.concurrency)
+
+        async def deliver_chat(chat_id: str, items: List[Entry]):
+            async with semaphore:
+                for group in _coalesce(items):
+                    await self._deliver_group(chat_id, group)
+
+        await asyncio.gather(*(deliver_chat(chat_id, items) for chat_id, items in by_chat.items()))
+        # Повторы уже лежат в RETRY_ZSET, поэтому подтверждаем всю пачку
+        await self.outbox.ack([entry_id for entry_id, _ in entries])
+
+    async def _deliver_group(self, chat_id: str, group: List[Entry]):
+        delay = self.limiter.reserve(chat_id, time.monotonic())
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+        text = "\n\n".join(payload["text"] for _, payload in group)
+        status, retry_after = await self._post(chat_id, text)
+
+        if status == 200:
+            self.stats["delivered"] += len(group)
+            return
+
+        if status is None or status in RETRYABLE_STATUSES:
+            if retry_after:
+                self.limiter.defer(chat_id, retry_after, time.monotonic())
+            for _, payload in group:
+                attempts = payload.get("attempts", 0) + 1
+                if attempts >= self.max_attempts:
+                    self.stats["dead"] += 1
+                    await self.outbox.dead_letter(payload, f"gave up after {attempts} attempts (last status {status})")
+                    continue
+                backoff = min(self.backoff_max_seconds, self.backoff_seconds * 2 ** payload.get("attempts", 0))
+                self.stats["retried"] += 1
+                await self.outbox.schedule_retry(payload, max(retry_after or 0, backoff * random.uniform(0.5, 1.0)))
+            return
+
+        # 4xx кроме 429 (неверный chat_id, бот заблокирован) повторять бессмысленно
+        for _, payload in group:
+            self.stats["dead"] += 1
+            await self.outbox.dead_letter(payload, f"status {status}")
+
+    async def _post(self, chat_id: str, text: str) -> Tuple[Optional[int], Optional[float]]:
+        """Отправить сообщение, вернуть (status, retry_after); status None при сетевой ошибке"""
+        import aiohttp
+
+        self.stats["requests"] += 1
+        url = f"{self.api_url}/bot{self.token}/sendMessage"
+        try:
+            async with self.session.post(url, json={"chat_id": chat_id, "text": text}) as response:
+                retry_after = None
+                if response.status == 429:
+                    body = await response.json(content_type=None)
+                    retry_after = (body.get("parameters") or {}).get("retry_after")
+                else:
+                    await response.read()
+                return response.status, retry_after
+        except (aiohttp.ClientError, asyncio.TimeoutError, ValueError) as e:
+            self.stats["errors"] += 1
+            logger.warning(f"Telegram request failed: {e}")
+            return None, None
+
+
+notification_outbox = NotificationOutbox()
+notification_dispatcher = NotificationDispatcher(notification_outbox)
@@ -0,0 +1,161 @@
+"""
+Индекс получателей: кому кроме самого пациента доставлять алерты и показатели.
+
+- Члены семьи (FamilyAccess): только активный и не истёкший доступ активного
+  пользователя; алерты critical и их закрытие — при receive_critical_alerts,
+  показатели — при can_view_vitals.
+- Лечащие врачи (PatientDoctor): запись Doctor связана с учётной записью
+  User роли DOCTOR по email; врач получает все алерты и показатели.
+
+Индекс целиком строится двумя запросами и хранится в памяти, поэтому
+рассылка при ингесте не ходит в БД. Перестраивается он при изменении этих
+таблиц в процессе (событие after_flush), по истечении ближайшего expiry_date
+и раз в RECIPIENT_INDEX_REFRESH_SECONDS, чтобы подхватить изменения из других
+процессов.
+"""
+import asyncio
+import logging
+import time
+from datetime import datetime
+from typing import Dict, FrozenSet, Optional
+
+from sqlalchemy import event, func, inspect, or_
+from sqlalchemy.orm import Session
+
+from database import SessionLocal
+from models import User, UserRole, Doctor, PatientDoctor, FamilyAccess
+
+logger = logging.getLogger(__name__)
+
+RECIPIENT_INDEX_REFRESH_SECONDS = 300
+_EMPTY: FrozenSet[int] = frozenset()
+_WATCHED_MODELS = (FamilyAccess, PatientDoctor, Doctor, User)
+_WATCHED_USER_FIELDS = ("role", "is_active", "email")
+
+
+class RecipientIndex:
+    def __init__(self, refresh_seconds: float = RECIPIENT_INDEX_REFRESH_SECONDS):
+        self.refresh_seconds = refresh_seconds
+        self.alert_recipients: Dict[int, FrozenSet[int]] = {}
+        self.critical_recipients: Dict[int, FrozenSet[int]] = {}
+        self.vitals_recipients: Dict[int, FrozenSet[int]] = {}
+        self.doctor_patients: Dict[int, FrozenSet[int]] = {}
+        self.built_at = 0.0
+        self.next_expiry: Optional[datetime] = None
+        self.dirty = True
+        self._lock = asyncio.Lock()
+
+    def invalidate(self):
+        self.dirty = True
+
+    def _is_stale(self) -> bool:
+        if self.dirty or time.monotonic() - self.built_at > self.refresh_seconds:
+            return True
+        return self.next_expiry is not None and datetime.utcnow() >= self.next_expiry
+
+    def rebuild(self, db: Session):
+        """Построить индекс заново (синхронно, два запроса)"""
+        started = time.perf_counter()
+        now = datetime.utcnow()
+        alerts, critical, vitals, doctor_patients = {}, {}, {}, {}
+        next_expiry = None
+
+        family_rows = (
+            db.query(FamilyAccess.patient_id, FamilyAccess.family_member_id, FamilyAccess.can_view_vitals,
+                     FamilyAccess.receive_critical_alerts, FamilyAccess.expiry_date)
+            .join(User, User.id == FamilyAccess.family_member_id)
+            .filter(FamilyAccess.is_active.is_(True), User.is_active.is_(True),
+                    or_(FamilyAccess.expiry_date.is_(None), FamilyAccess.expiry_date > now))
+            .all()
+        )
+        for patient_id, member_id, can_view_vitals, receive_critical, expiry_date in family_rows:
+            if receive_critical:
+                critical.setdefault(patient_id, set()).add(member_id)
+            if can_view_vitals:
+                vitals.setdefault(patient_id, set()).add(member_id)
+            if expiry_date is not None and (next_expiry is None or expiry_date < next_expiry):
+                next_expiry = expiry_date
+
+        doctor_rows = (
+            db.query(PatientDoctor.patient_id, User.id)
+            .join(Doctor, Doctor.id == PatientDoctor.doctor_id)
+            .join(User, func.lower(User.email) == func.lower(Doctor.email))
+            .filter(User.role == UserRole.DOCTOR, User.is_active.is_(True))
+            .all()
+        )
+        for patient_id, doctor_user_id in doctor_rows:
+            alerts.setdefault(patient_id, set()).add(doctor_user_id)
+            critical.setdefault(patient_id, set()).add(doctor_user_id)
+            vitals.setdefault(patient_id, set()).add(doctor_user_id)
+            doctor_patients.setdefault(doctor_user_id, set()).add(patient_id)
+
+        self.alert_recipients = {patient: frozenset(users) for patient, users in alerts.items()}
+        self.critical_recipients = {patient: frozenset(users) for patient, users in critical.items()}
+        self.vitals_recipients = {patient: frozenset(users) for patient, users in vitals.items()}
+        self.doctor_patients = {doctor: frozenset(patients) for doctor, patients in doctor_patients.items()}
+        self.next_expiry = next_expiry
+        self.built_at = time.monotonic()
+        self.dirty = False
+        logger.info(f"Recipient index rebuilt: {len(family_rows)} family grants, {len(doctor_rows)} doctor "
+                    f"assignments in {(time.perf_counter() - started) * 1000:.0f} ms")
+
+    def _rebuild_with_session(self):
+        db = SessionLocal()
+        try:
+            self.rebuild(db)
+        finally:
+            db.close()
+
+    async def ensure_fresh(self):
+        """Перестроить индекс в пуле потоков, если он устарел; ошибки оставляют прежний индекс"""
+        if not self._is_stale():
+            return
+        async with self._lock:
+            if not self._is_stale():
+                return
+            try:
+                await asyncio.to_thread(self._rebuild_with_session)
+            except Exception as e:
+                # Не долбим БД на каждом показании, пробуем снова через refresh_seconds
+                self.built_at = time.monotonic()
+                self.dirty = False
+                logger.error(f"Recipient index rebuild failed: {e}")
+
+    def alert_recipients_for(self, patient_id: int, alert: dict) -> FrozenSet[int]:
+        # Закрытие эпизода уходит тем же, кто получил его алерт
+        if alert.get("type") == "critical" or alert.get("level") == "critical":
+            return self.critical_recipients.get(patient_id, _EMPTY)
+        return self.alert_recipients.get(patient_id, _EMPTY)
+
+    def vitals_recipients_for(self, patient_id: int) -> FrozenSet[int]:
+        return self.vitals_recipients.get(patient_id, _EMPTY)
+
+    def patients_for_doctor(self, user_id: int) -> FrozenSet[int]:
+        """Пациенты, назначенные врачу с этой учётной записью (PatientDoctor)"""
+        return self.doctor_patients.get(user_id, _EMPTY)
+
+
+recipient_index = RecipientIndex()
+
+
+def _user_access_changed(user: User) -> bool:
+    state = inspect(user)
+    return any(state.attrs[name].history.has_changes() for name in _WATCHED_USER_FIELDS)
+
+
+@event.listens_for(Session, "after_flush")
+def _invalidate_on_change(session: Session, flush_context):
+    """Изменения доступа в этом процессе сразу помечают индекс устаревшим"""
+    for instance in session.deleted:
+        if isinstance(instance, _WATCHED_MODELS):
+            recipient_index.invalidate()
+            return
+    for instance in (*session.new, *session.dirty):
+        if isinstance(instance, User):
+            # Вход в систему меняет last_login — это не повод перестраивать индекс
+            if _user_access_changed(instance):
+                recipient_index.invalidate()
+                return
+        elif isinstance(instance, _WATCHED_MODELS):
+            recipient_index.invalidate()
+            return
@@ -1,9 +1,16 @@
 import json
 import asyncio
+import time
 from datetime import datetime, timedelta
-from typing import Optional, List, Dict, Any
+from typing import Optional, List, Dict, Any, Sequence
 import logging
 
+from core.config import settings
+from core import vital_chunks
+from core.vital_chunks import Series
+from core.vital_points import decode_point
+from services.client_cache import ClientSideCache
+
 try:
     import redis.asyncio as aioredis
 
@@ -13,13 +20,38 @@ except ImportError:
 
 logger = logging.getLogger(__name__)
 
+VITALS_RETENTION_SECONDS = 24 * 3600
+VITAL_TYPES = ["heart_rate", "blood_pressure", "spo2", "temperature"]
+
 
 class RedisService:
     def __init__(self):
         self.client = None
+        # Клиент без декодирования: горячие ключи читаются байтами и сразу идут в json.loads / ответ
+        self.raw = None
         self.pubsub = None
         self.connected = False
         self.memory_cache = {}
+        self.local_cache = ClientSideCache()
+        self._invalidation_pool = None
+        # Словарь устройств core/vital_chunks: device_id <-> номер в записях блоков
+        self._device_indexes: Dict[str, int] = {}
+        self._device_names: Dict[int, str] = {}
+        self._legacy_expiring = set()
+
+    @staticmethod
+    def _pool(redis_url: str, max_connections: int, decode_responses: bool):
+        # Блокирующий пул: при исчерпании запрос ждёт свободное соединение, а не открывает новое
+        return aioredis.BlockingConnectionPool.from_url(
+            redis_url,
+            max_connections=max_connections,
+            timeout=settings.REDIS_POOL_TIMEOUT,
+            decode_responses=decode_responses,
+            # Недоступный Redis не должен держать старт воркера дольше нескольких секунд
+            socket_connect_timeout=3,
+            socket_timeout=settings.REDIS_SOCKET_TIMEOUT,
+            health_check_interval=30
+        )
 
     async def connect(self, redis_url: str = "redis://redis:6379"):
         if not REDIS_AVAILABLE:
@@ -27,37 +59,65 @@ class RedisService:
             return
 
         try:
-            self.client = aioredis.from_url(redis_url, decode_responses=True)
+            self.client = aioredis.Redis(connection_pool=self._pool(redis_url, settings.REDIS_MAX_CONNECTIONS, True))
+            self.raw = aioredis.Redis(connection_pool=self._pool(redis_url, settings.REDIS_RAW_MAX_CONNECTIONS, False))
             await self.client.ping()
             self.pubsub = self.client.pubsub()
             self.connected = True
-            logger.info("✅ Redis connected")
+            logger.info(f"✅ Redis connected (pool {settings.REDIS_MAX_CONNECTIONS} + "
+                        f"{settings.REDIS_RAW_MAX_CONNECTIONS} bytes-mode)")
         except Exception as e:
             logger.error(f"❌ Redis error: {e}")
+            return
+
+        if settings.REDIS_CLIENT_CACHE:
+            self._invalidation_pool = aioredis.ConnectionPool.from_url(redis_url, socket_connect_timeout=3)
+            await self.local_cache.start(self._invalidation_pool)
 
     async def disconnect(self):
+        await self.local_cache.stop()
         if self.pubsub:
             await self.pubsub.close()
         if self.client:
             await self.client.close()
+        if self.raw:
+            await self.raw.close()
+        if self._invalidation_pool:
+            await self._invalidation_pool.disconnect()
 
     async def store_vital(self, device_id: str, user_id: int, vital_type: str, value: float):
         """Store vital sign with timestamp"""
-        timestamp = datetime.now().isoformat()
+        now = datetime.now()
         key = f"vitals:{user_id}:{vital_type}"
 
+        # Блоки хранят float64: строковые числа приводим, остальное не пишем, а не роняем ингест
+        number = vital_chunks.vital_value(value)
+        if number is None:
+            logger.warning(f"Skipping non-numeric {vital_type} value from {device_id}: {value!r}")
+            return
+        if not isinstance(value, (int, float)):
+            value = number
+
         data = {
             "device_id": device_id,
             "value": value,
-            "timestamp": timestamp
+            "timestamp": now.isoformat()
         }
 
         if self.connected:
-            # Store in sorted set
-            await self.client.zadd(key, {json.dumps(data): datetime.now().timestamp()})
-            # Keep only last 24 hours
-            cutoff = (datetime.now() - timedelta(hours=24)).timestamp()
-            await self.client.zremrangebyscore(key, 0, cutoff)
+            # Блок core/vital_chunks: APPEND 16-байтовой записи, TTL — пока последняя точка блока в окне
+            chunk_seconds = settings.VITALS_CHUNK_SECONDS
+            bucket, record = vital_chunks.encode_record(now.timestamp(), await self._device_index(device_id),
+                                                        value, chunk_seconds)
+            chunk = vital_chunks.chunk_key(user_id, vital_type, bucket)
+            pipe = self.raw.pipeline(transaction=False)
+            pipe.append(chunk, record)
+            pipe.expireat(chunk, (bucket + 1) * chunk_seconds + VITALS_RETENTION_SECONDS)
+            if settings.VITALS_LEGACY_READ and key not in self._legacy_expiring:
+                # Старый ZSET больше не пополняется и не чистится по окну: пусть истечёт сам
+                pipe.expire(key, VITALS_RETENTION_SECONDS)
+                self._legacy_expiring.add(key)
+            await pipe.execute()
             # Publish update
             await self.publish_vital_update(user_id, vital_type, data)
         else:
@@ -71,11 +131,10 @@ class RedisService:
     async def get_vitals(self, user_id: int, vital_type: str, hours: int = 24) -> List[Dict]:
         """Get vitals for last N hours"""
         key = f"vitals:{user_id}:{vital_type}"
-        cutoff = (datetime.now() - timedelta(hours=hours)).timestamp()
 
         if self.connected:
-            results = await self.client.zrangebyscore(key, cutoff, "+inf")
-            return [json.loads(r) for r in results]
+            series = await self.get_vital_series(user_id, [vital_type], hours)
+            return series[vital_type].to_points()
         else:
             if key in self.memory_cache:
                 cutoff_dt = datetime.now() - timedelta(hours=hours)
@@ -85,12 +144,109 @@ class RedisService:
                 ]
             return []
 
+    async def get_vital_series(self, user_id: int, vital_types: Sequence[str], hours: int = 24) -> Dict[str, Series]:
+        """
+        Серии NumPy за последние hours часов по нескольким показателям за один round trip:
+        MGET только тех блоков, что пересекают окно, и (пока VITALS_LEGACY_READ) старые ZSET-точки.
+        """
+        if not self.connected:
+            return {vital_type: self._memory_series(user_id, vital_type, hours) for vital_type in vital_types}
+
+        chunk_seconds = settings.VITALS_CHUNK_SECONDS
+        now = time.time()
+        cutoff = now - hours * 3600
+        # Старше окна хранения блоков нет: не запрашивать заведомо пустые ключи
+        buckets = vital_chunks.chunk_buckets(max(cutoff, now - VITALS_RETENTION_SECONDS - chunk_seconds),
+                                             now, chunk_seconds)
+
+        pipe = self.raw.pipeline(transaction=False)
+        for vital_type in vital_types:
+            pipe.mget([vital_chunks.chunk_key(user_id, vital_type, bucket) for bucket in buckets])
+            if settings.VITALS_LEGACY_READ:
+                pipe.zrangebyscore(f"vitals:{user_id}:{vital_type}", cutoff, "+inf", withscores=True)
+        replies = iter(await pipe.execute())
+
+        result = {}
+        for vital_type in vital_types:
+            series = vital_chunks.decode_chunks(buckets, next(replies), chunk_seconds, cutoff)
+            if settings.VITALS_LEGACY_READ:
+                legacy = next(replies)
+                if legacy:
+                    series = series.merge(await self._legacy_series(legacy))
+            series.names = await self._device_names_for(series.devices)
+            result[vital_type] = series
+        return result
+
+    def _memory_series(self, user_id: int, vital_type: str, hours: int) -> Series:
+        points = self.memory_cache.get(f"vitals:{user_id}:{vital_type}", [])
+        indexes = {}
+        devices = [indexes.setdefault(point["device_id"], len(indexes)) for point in points]
+        series = Series.build([datetime.fromisoformat(point["timestamp"]).timestamp() for point in points],
+                              devices, [point["value"] for point in points],
+                              {index: device_id for device_id, index in indexes.items()})
+        return series.since(time.time() - hours * 3600)
+
+    async def _legacy_series(self, members: list) -> Series:
+        """Точки старых ZSET (core/vital_points, v1/v2) в виде серии"""
+        points = [(score, decode_point(member, score)) for member, score in members]
+        # Старый формат принимал любой JSON: нечисловые точки в серию float64 не попадают
+        points = [(score, point, vital_chunks.vital_value(point["value"])) for score, point in points]
+        points = [point for point in points if point[2] is not None]
+        devices = [await self._device_index(point["device_id"]) for _, point, _ in points]
+        return Series.build([score for score, _, _ in points], devices, [value for _, _, value in points])
+
+    async def _device_index(self, device_id: str) -> int:
+        """Номер устройства в словаре; новый выдаётся через INCR, гонку воркеров решает HSETNX"""
+        index = self._device_indexes.get(device_id)
+        if index is not None:
+            return index
+        stored = await self.client.hget(vital_chunks.DEVICE_INDEX_KEY, device_id)
+        if stored is None:
+            candidate = await self.client.incr(vital_chunks.DEVICE_SEQ_KEY)
+            # Имя пишется до номера: номер, видимый другим воркерам, всегда разрешается
+            await self.client.hset(vital_chunks.DEVICE_NAMES_KEY, candidate, device_id)
+            if await self.client.hsetnx(vital_chunks.DEVICE_INDEX_KEY, device_id, candidate):
+                stored = candidate
+            else:
+                stored = await self.client.hget(vital_chunks.DEVICE_INDEX_KEY, device_id)
+        index = int(stored)
+        self._device_indexes[device_id] = index
+        self._device_names[index] = device_id
+        return index
+
+    async def _device_names_for(self, devices) -> Dict[int, str]:
+        indexes = set(devices.tolist())
+        missing = [index for index in indexes if index not in self._device_names]
+        if missing:
+            names = await self.client.hmget(vital_chunks.DEVICE_NAMES_KEY, missing)
+            for index, name in zip(missing, names):
+                if name is not None:
+                    self._device_names[index] = name
+                    self._device_indexes[name] = index
+        return {index: self._device_names.get(index) for index in indexes}
+
+    async def vitals_memory_usage(self, user_id: int) -> Dict[str, int]:
+        """MEMORY USAGE (байты) показателей пациента по типам: блоки и старые ZSET"""
+        if not self.connected:
+            return {}
+        usage = {}
+        for pattern, type_field in ((f"vitals:c:{user_id}:*", 3), (f"vitals:{user_id}:*", 2)):
+            async for key in self.client.scan_iter(match=pattern, count=100):
+                vital_type = key.split(":")[type_field]
+                usage[vital_type] = usage.get(vital_type, 0) + (await self.client.memory_usage(key, samples=0) or 0)
+        return usage
+
     async def get_latest_vitals(self, user_id: int) -> Dict[str, Any]:
         """Get latest vital signs for all types"""
-        vital_types = ["heart_rate", "blood_pressure", "spo2", "temperature"]
         latest = {}
 
-        for vtype in vital_types:
+        if self.connected:
+            for vtype, series in (await self.get_vital_series(user_id, VITAL_TYPES, hours=1)).items():
+                if len(series):
+                    latest[vtype] = series.last_point()
+            return latest
+
+        for vtype in VITAL_TYPES:
             vitals = await self.get_vitals(user_id, vtype, hours=1)
             if vitals:
                 latest[vtype] = vitals[-1]
@@ -101,16 +257,38 @@ class RedisService:
         """Set cache value"""
         if self.connected:
             await self.client.setex(key, expire_seconds, json.dumps(value, default=str))
+            # Своя запись: не ждём инвалидации от сервера
+            self.local_cache.invalidate([key])
         else:
             self.memory_cache[key] = {
                 'value': value,
                 'expires': datetime.now() + timedelta(seconds=expire_seconds)
             }
 
+    async def get_raw(self, key: str) -> Optional[bytes]:
+        """GET байтами; ключи с префиксами REDIS_CLIENT_CACHE_PREFIXES читаются из локального кеша"""
+        cacheable = self.local_cache.cacheable(key)
+        if cacheable:
+            value = self.local_cache.get(key)
+            if value is not None:
+                return value
+            generation = self.local_cache.generation
+        value = await self.raw.get(key)
+        if cacheable and value is not None:
+            self.local_cache.put(key, value, generation)
+        return value
+
+    async def cache_get_raw(self, key: str) -> Optional[bytes]:
+        """Кешированный JSON как есть — можно отдавать в ответ без разбора и повторной сериализации"""
+        if self.connected:
+            return await self.get_raw(key)
+        value = await self.cache_get(key)
+        return json.dumps(value, default=str).encode() if value is not None else None
+
     async def cache_get(self, key: str) -> Optional[Any]:
         """Get cache value"""
         if self.connected:
-            value = await self.client.get(key)
+            value = await self.get_raw(key)
             return json.loads(value) if value else None
         else:
             if key in self.memory_cache:
@@ -160,5 +338,26 @@ class RedisService:
         else:
             return self.memory_cache.get(key, [])[:limit]
 
+    async def get_alert_overrides(self, user_id: int) -> dict:
+        """Персональные пороги алертов пациента"""
+        key = f"alert_thresholds:{user_id}"
+        if self.connected:
+            value = await self.get_raw(key)
+            return json.loads(value) if value else {}
+        return self.memory_cache.get(key, {})
+
+    async def set_alert_overrides(self, user_id: int, overrides: dict):
+        """Сохранить персональные пороги (пустой dict удаляет переопределения)"""
+        key = f"alert_thresholds:{user_id}"
+        if self.connected:
+            if overrides:
+                await self.client.set(key, json.dumps(overrides))
+            else:
+                await self.client.delete(key)
+            self.local_cache.invalidate([key])
+        elif overrides:
+            self.memory_cache[key] = overrides
+        else:
+            self.memory_cache.pop(key, None)
 
 redis_service = RedisService()
\ No newline at end of file
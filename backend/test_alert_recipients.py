@@ -0,0 +1,33 @@
+"""Кому уходят алерты эпизода: уведомление о закрытии получают те же, кто получил сам алерт"""
+from core.alert_episodes import AlertEpisodeTracker
+from core.alert_rules import alert_rules
+from models import FamilyAccess, User, UserRole
+from services.recipient_index import RecipientIndex
+
+
+def add_user(db, username: str, role: UserRole) -> User:
+    user = User(username=username, email=f"{username}@example.com", password_hash="x", role=role)
+    db.add(user)
+    db.commit()
+    return user
+
+
+def test_family_member_gets_critical_alert_and_its_resolution(db_session):
+    patient = add_user(db_session, "patient", UserRole.PATIENT)
+    relative = add_user(db_session, "relative", UserRole.PATIENT)
+    db_session.add(FamilyAccess(patient_id=patient.id, family_member_id=relative.id, relationship_type="child",
+                                can_view_vitals=False, receive_critical_alerts=True))
+    db_session.commit()
+    index = RecipientIndex()
+    index.rebuild(db_session)
+
+    tracker = AlertEpisodeTracker(renotify_seconds=600, stale_seconds=600, hysteresis={})
+    vitals = {"heart_rate": 190}
+    opened = tracker.update(patient.id, vitals, alert_rules.evaluate(vitals), now=1000)
+    vitals = {"heart_rate": 70}
+    resolved = tracker.update(patient.id, vitals, alert_rules.evaluate(vitals), now=1060)
+
+    assert [(a["state"], a["type"]) for a in opened + resolved] == [("opened", "critical"), ("resolved", "resolved")]
+    assert resolved[0]["level"] == "critical"
+    for alert in opened + resolved:
+        assert relative.id in index.alert_recipients_for(patient.id, alert)
@@ -0,0 +1,71 @@
+"""PUT /api/vitals/thresholds/{patient_id}: кто может менять пороги алертов пациента"""
+import pytest
+
+from models import Doctor, PatientDoctor, User, UserRole
+
+THRESHOLDS = {"thresholds": {"heart_rate": {"high": 110}}}
+
+
+def add_user(db, username: str, role: UserRole) -> User:
+    user = User(username=username, email=f"{username}@example.com", password_hash="x", role=role)
+    db.add(user)
+    db.commit()
+    return user
+
+
+@pytest.fixture
+def ward(db_session):
+    patient = add_user(db_session, "patient", UserRole.PATIENT)
+    other_patient = add_user(db_session, "other_patient", UserRole.PATIENT)
+    doctor_user = add_user(db_session, "doctor", UserRole.DOCTOR)
+    doctor = Doctor(name="Dr. House", specialty="cardiology", email="DOCTOR@example.com")
+    db_session.add(doctor)
+    db_session.commit()
+    db_session.add(PatientDoctor(patient_id=patient.id, doctor_id=doctor.id))
+    db_session.commit()
+    return {
+        "patient": patient, "other_patient": other_patient, "doctor": doctor_user,
+        "admin": add_user(db_session, "admin", UserRole.ADMIN),
+    }
+
+
+@pytest.fixture
+def put_thresholds(make_client, monkeypatch):
+    from api import vitals
+    from core.alert_rules import alert_rules
+
+    # Скомпилированные таблицы пациентов не должны утекать между тестами
+    for name in ("_patient_tables", "_patient_overrides", "_loaded_at"):
+        monkeypatch.setattr(alert_rules, name, {})
+
+    async def no_redis(*args, **kwargs):
+        pass
+
+    monkeypatch.setattr(vitals.redis_service, "set_alert_overrides", no_redis)
+
+    def put(user, patient_id: int):
+        return make_client(vitals.router, "/api/vitals", user).put(f"/api/vitals/thresholds/{patient_id}",
+                                                                   json=THRESHOLDS)
+    return put
+
+
+def test_assigned_doctor_can_set_thresholds(ward, put_thresholds):
+    response = put_thresholds(ward["doctor"], ward["patient"].id)
+    assert response.status_code == 200, response.text
+
+
+def test_unassigned_doctor_is_forbidden(ward, put_thresholds):
+    assert put_thresholds(ward["doctor"], ward["other_patient"].id).status_code == 403
+
+
+def test_admin_can_set_thresholds_for_any_patient(ward, put_thresholds):
+    assert put_thresholds(ward["admin"], ward["other_patient"].id).status_code == 200
+
+
+def test_unknown_or_non_patient_is_not_found(ward, put_thresholds):
+    assert put_thresholds(ward["admin"], 9999).status_code == 404
+    assert put_thresholds(ward["admin"], ward["doctor"].id).status_code == 404
+
+
+def test_patient_cannot_set_thresholds(ward, put_thresholds):
+    assert put_thresholds(ward["patient"], ward["patient"].id).status_code == 403
@@ -0,0 +1,25 @@
+"""Бюджет времени импорта воркера: тяжёлые опциональные зависимости не импортируются при старте"""
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'benchmarks'))
+
+from check_import_time import LAZY_MODULES, eager_imports, median_import, profile_import  # noqa: E402
+
+# Цель — 1 с (benchmarks/check_import_time.py); в тесте запас на медленные CI-раннеры
+IMPORT_BUDGET_SECONDS = float(os.getenv("IMPORT_BUDGET_SECONDS", "3.0"))
+
+
+@pytest.mark.parametrize("module", ["api.vitals", "services.redis_service", "services.iot_service"])
+def test_heavy_dependencies_stay_lazy(module):
+    _, entries = profile_import(module)
+    assert entries, f"no -X importtime output for {module}"
+    assert eager_imports(entries, LAZY_MODULES) == []
+
+
+def test_ingest_import_within_budget():
+    median, totals, _, _ = median_import("api.vitals", repeat=3)
+    assert median <= IMPORT_BUDGET_SECONDS, \
+        f"import api.vitals: median {median:.3f} s over budget {IMPORT_BUDGET_SECONDS} s (runs: {totals})"
@@ -0,0 +1,58 @@
+"""Бюджет SQL-запросов на эндпоинт (core/query_tracker.assert_max_queries)"""
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import text
+from sqlalchemy.exc import OperationalError
+
+from core.query_tracker import assert_max_queries
+from models import Device, HeartData, User, UserRole
+
+
+@pytest.fixture
+def patient_with_devices(db_session):
+    user = User(username="patient", email="patient@example.com", password_hash="x", role=UserRole.PATIENT)
+    db_session.add(user)
+    db_session.commit()
+    now = datetime.now()
+    for i in range(5):
+        device = Device(name=f"Device {i}", device_id=f"ESP32_{i:04d}", user_id=user.id, last_seen=now)
+        db_session.add(device)
+        db_session.commit()
+        for minutes in range(i):
+            db_session.add(HeartData(device_id=device.id, heart_rate=70, timestamp=now - timedelta(minutes=minutes)))
+        db_session.add(HeartData(device_id=device.id, heart_rate=70, timestamp=now - timedelta(days=30)))
+    db_session.commit()
+    return user
+
+
+def test_device_stats_query_count_does_not_grow_with_devices(make_client, patient_with_devices):
+    from api import analytics
+
+    client = make_client(analytics.router, "/api/analytics", patient_with_devices)
+    # Пользователь, устройства, агрегат по показаниям; раньше было 2 запроса на каждое устройство
+    with assert_max_queries(3):
+        response = client.get("/api/analytics/devices/stats")
+
+    assert response.status_code == 200, response.text
+    body = response.json()
+    assert body["total_devices"] == 5
+    assert [device["readings_week"] for device in body["devices"]] == [0, 1, 2, 3, 4]
+    assert all(device["last_reading"] for device in body["devices"])
+
+
+def test_assert_max_queries_reports_repeated_statements(db_session):
+    with pytest.raises(AssertionError, match="Expected at most 1 queries, got 3"):
+        with assert_max_queries(1):
+            for _ in range(3):
+                db_session.execute(text("SELECT 1"))
+
+
+def test_failed_statement_does_not_leak_timer(db_session):
+    connection = db_session.connection()
+    for _ in range(3):
+        with pytest.raises(OperationalError):
+            db_session.execute(text("SELECT * FROM missing_table"))
+        db_session.rollback()
+        connection = db_session.connection()
+    assert not connection.info.get("query_started")
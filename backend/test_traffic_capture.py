@@ -0,0 +1,52 @@
+"""Запись IoT-запросов (core/traffic_capture) читается трассой симулятора без изменений"""
+import json
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "iot-simulator"))
+
+from traffic_log import read_trace  # noqa: E402
+
+
+def test_ingest_requests_are_captured_in_simulator_trace_format(make_client, monkeypatch, tmp_path):
+    from api import vitals
+    from core.traffic_capture import traffic_capture
+
+    async def processed(*args, **kwargs):
+        return True
+
+    monkeypatch.setattr(vitals.iot_service, "process_device_data", processed)
+    monkeypatch.setattr(traffic_capture, "path", str(tmp_path / "ingest.trace"))
+    monkeypatch.setattr(traffic_capture, "started", None)
+    monkeypatch.setattr(traffic_capture, "count", 0)
+    client = make_client(vitals.router, "/api/vitals")
+
+    single = json.dumps({"device_id": "ESP32_0001", "data": {"vitals": {"heart_rate": 72}}}).encode()
+    assert client.post("/api/vitals/iot", content=single,
+                       headers={"content-type": "application/json"}).status_code == 200
+    # Нераскодированный пакет тоже попадает в трассу
+    assert client.post("/api/vitals/iot/batch", content=b"VT\x01",
+                       headers={"content-type": "application/x-vitals", "content-encoding": "identity"}
+                       ).status_code == 400
+    traffic_capture.close()
+
+    records = list(read_trace(str(tmp_path / "ingest.trace")))
+    assert [(r.device_id, r.endpoint, r.body) for r in records] == [
+        ("ESP32_0001", "/vitals/iot", single), ("", "/vitals/iot/batch", b"VT\x01"),
+    ]
+    assert records[0].headers == {"content-type": "application/json"}
+    assert records[1].headers == {"content-type": "application/x-vitals", "content-encoding": "identity"}
+    assert records[0].offset <= records[1].offset
+
+
+def test_capture_is_off_by_default(make_client, monkeypatch):
+    from api import vitals
+    from core.traffic_capture import traffic_capture
+
+    if traffic_capture.enabled:
+        pytest.skip("IOT_TRACE_PATH is set in the environment")
+    client = make_client(vitals.router, "/api/vitals")
+    client.post("/api/vitals/iot/batch", content=b"x", headers={"content-type": "application/json"})
+    assert traffic_capture.file is None
@@ -0,0 +1,65 @@
+"""Порядок показаний в окнах core/trend_rules при нескольких источниках времени"""
+import time
+
+from core.trend_rules import TrendRuleEngine
+from services.iot_service import IoTService
+
+RULES = [{"name": "hr_mean", "vital": "heart_rate", "kind": "mean_above", "window_seconds": 300,
+          "threshold": 100, "min_samples": 1}]
+
+
+def test_late_reading_is_counted_not_dropped():
+    engine = TrendRuleEngine(RULES)
+    now = time.time()
+    engine.update(1, {"heart_rate": 80}, now)
+    # Второе устройство пациента с отстающими на минуту часами
+    _, values = engine.update(1, {"heart_rate": 120}, now - 60)
+    assert values["hr_mean"] == 100
+    assert len(engine.states[(1, "hr_mean")].samples) == 2
+
+
+def test_batch_timestamps_follow_server_clock():
+    now = time.time()
+    device_clock = [now - 3600 + i * 10 for i in range(5)]  # часы устройства отстают на час
+    window = IoTService._window_timestamps(device_clock)
+    assert abs(window[-1] - now) < 5
+    assert [round(b - a, 6) for a, b in zip(window, window[1:])] == [10.0] * 4
+
+
+def test_batch_after_single_reading_keeps_all_samples():
+    engine = TrendRuleEngine(RULES)
+    engine.update(1, {"heart_rate": 90})
+    slow_device = [time.time() - 120 + i * 10 for i in range(6)]
+    for timestamp in IoTService._window_timestamps(slow_device):
+        engine.update(1, {"heart_rate": 110}, timestamp)
+    assert len(engine.states[(1, "hr_mean")].samples) == 7
+
+
+def run_readings(vital: str, readings, interval: float = 10, gap_after: int = None, gap: float = 0):
+    """Показания через TrendRuleEngine и AlertEpisodeTracker, как в IoTService; уведомления по порядку"""
+    from core.alert_episodes import AlertEpisodeTracker
+    from core.config import settings
+
+    engine = TrendRuleEngine([rule for rule in settings.VITAL_TREND_RULES if rule["vital"] == vital])
+    tracker = AlertEpisodeTracker(renotify_seconds=3600, stale_seconds=3600)
+    start = time.time()
+    notifications = []
+    for i, value in enumerate(readings):
+        timestamp = start + i * interval + (gap if gap_after is not None and i >= gap_after else 0)
+        alerts, values = engine.update(1, {vital: value}, timestamp)
+        notifications += tracker.update(1, {vital: value, **values}, alerts, now=timestamp)
+    return notifications, tracker
+
+
+def test_rise_episode_resolves_on_flat_plateau():
+    # Скачок 70 -> 110 и ровные 110 без шума: подъём за окно падает ровно до 0
+    notifications, tracker = run_readings("heart_rate", [70] * 31 + [110] * 60)
+    assert [(n["metric"], n["state"]) for n in notifications] == [("hr_rise", "opened"), ("hr_rise", "resolved")]
+    assert not tracker.active(1)
+
+
+def test_spo2_median_episode_resolves_when_fraction_is_zero():
+    # Пауза длиннее окна: первое значение после неё — доля 0.0, а не постепенный спад
+    notifications, tracker = run_readings("spo2", [88] * 12 + [98] * 12, gap_after=12, gap=300)
+    assert [n["state"] for n in notifications] == ["opened", "resolved"]
+    assert not tracker.active(1)
@@ -0,0 +1,112 @@
+"""Блоки показателей core/vital_chunks: формат записи, склейка со старыми ZSET-точками, приём значений"""
+import asyncio
+import time
+from datetime import datetime
+
+import pytest
+
+np = pytest.importorskip("numpy")
+
+from core import vital_chunks  # noqa: E402
+from core.vital_chunks import RECORD, Series, decode_chunks, encode_record  # noqa: E402
+from core.vital_points import encode_point  # noqa: E402
+
+CHUNK = 3600
+START = 1_700_000_000.0
+
+
+def chunk_blobs(points):
+    """{bucket: bytes} так же, как их собирает APPEND в store_vital"""
+    blobs = {}
+    for timestamp, device, value in points:
+        bucket, record = encode_record(timestamp, device, value, CHUNK)
+        blobs[bucket] = blobs.get(bucket, b"") + record
+    buckets = sorted(blobs)
+    return buckets, [blobs[bucket] for bucket in buckets]
+
+
+def test_round_trip_across_chunks():
+    points = [(START + 10.5, 1, 72), (START + CHUNK + 0.123, 2, 36.6), (START + 2 * CHUNK, 1, 120)]
+    buckets, blobs = chunk_blobs(points)
+    assert len(buckets) == 3 and all(len(blob) == RECORD.size for blob in blobs)
+
+    series = decode_chunks(buckets, blobs, CHUNK)
+    assert series.timestamps.tolist() == pytest.approx([t for t, _, _ in points], abs=1e-3)
+    assert series.devices.tolist() == [1, 2, 1]
+    assert series.values.tolist() == [72, 36.6, 120]
+
+
+def test_missing_chunks_and_cutoff():
+    buckets, blobs = chunk_blobs([(START, 1, 60), (START + 1, 1, 61), (START + CHUNK, 1, 62)])
+    series = decode_chunks([buckets[0] - 1] + buckets, [None] + blobs, CHUNK, cutoff=START + 1)
+    assert series.values.tolist() == [61, 62]
+
+
+def test_partial_tail_record_is_dropped():
+    buckets, blobs = chunk_blobs([(START, 1, 60), (START + 1, 1, 61)])
+    series = decode_chunks(buckets, [blobs[0] + RECORD.pack(5000, 1, 99.0)[:7]], CHUNK)
+    assert series.values.tolist() == [60, 61]
+
+
+def test_legacy_points_merge_in_time_order():
+    from services.redis_service import RedisService
+
+    service = RedisService()
+    # Номера устройств уже в локальном словаре — Redis не нужен
+    service._device_indexes.update({"ESP32_0001": 1, "ESP32_0002": 2})
+    service._device_names.update({1: "ESP32_0001", 2: "ESP32_0002"})
+    members = [
+        (encode_point(70, "ESP32_0002", START + 5), START + 5),
+        ('{"device_id": "ESP32_0001", "value": 71, "timestamp": "2023-11-14T22:13:25"}', START + 25),
+        ('{"device_id": "ESP32_0001", "value": "n/a", "timestamp": "2023-11-14T22:13:30"}', START + 30),
+    ]
+    legacy = asyncio.run(service._legacy_series(members))
+    buckets, blobs = chunk_blobs([(START, 1, 69), (START + 20, 2, 72)])
+
+    series = decode_chunks(buckets, blobs, CHUNK).merge(legacy)
+    series.names.update(service._device_names)
+    assert [(p["device_id"], p["value"]) for p in series.to_points()] == [
+        ("ESP32_0001", 69), ("ESP32_0002", 70), ("ESP32_0002", 72), ("ESP32_0001", 71),
+    ]
+
+
+@pytest.fixture
+def berlin_tz(monkeypatch):
+    if not hasattr(time, "tzset"):
+        pytest.skip("time.tzset is not available")
+    monkeypatch.setenv("TZ", "Europe/Berlin")
+    time.tzset()
+    yield
+    monkeypatch.undo()
+    time.tzset()
+
+
+def test_to_points_local_time_across_dst(berlin_tz):
+    # 2024-03-31 01:00 UTC: Берлин переходит с UTC+1 на UTC+2
+    switch = 1711846800.0
+    timestamps = [switch - 1800.25, switch - 0.5, switch, switch + 1800]
+    series = Series.build(timestamps, [0] * 4, [60, 61, 62, 63], {0: "ESP32_0001"})
+    stamps = [datetime.fromisoformat(point["timestamp"]) for point in series.to_points()]
+    assert stamps == [datetime.fromtimestamp(t) for t in timestamps]
+    assert [s.hour for s in stamps] == [1, 1, 3, 3]
+
+
+@pytest.mark.parametrize("value, expected", [
+    (72, 72.0), (36.6, 36.6), ("36.6", 36.6), (" 98 ", 98.0),
+    ("high", None), (None, None), ({"v": 1}, None), (True, None), (float("nan"), None), ("inf", None),
+])
+def test_vital_value(value, expected):
+    assert vital_chunks.vital_value(value) == expected
+
+
+def test_store_vital_skips_non_numeric_values():
+    from services.redis_service import RedisService
+
+    service = RedisService()
+    asyncio.run(service.store_vital("ESP32_0001", 1, "temperature", "36.6"))
+    asyncio.run(service.store_vital("ESP32_0001", 1, "temperature", "high"))
+    assert [point["value"] for point in service.memory_cache["vitals:1:temperature"]] == [36.6]
+
+    # В Redis не пишется ничего: raw отсутствует, обращение к нему упало бы
+    service.connected = True
+    asyncio.run(service.store_vital("ESP32_0001", 1, "temperature", None))
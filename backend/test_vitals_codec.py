@@ -0,0 +1,109 @@
+"""Error paths of core/vitals_codec.decode_batch and the /api/vitals/iot/batch status codes"""
+import gzip
+import json
+import os
+import struct
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from core import vitals_codec  # noqa: E402
+from core.vitals_codec import (  # noqa: E402
+    BINARY_CONTENT_TYPE, BINARY_RECORD, MAX_BODY_BYTES, PayloadTooLargeError, decode_batch
+)
+
+
+def binary_batch(device_id: str = "ESP32_0001", count: int = 2) -> bytes:
+    encoded = device_id.encode()
+    header = b"VT" + bytes([1, len(encoded)]) + encoded + struct.pack("<H", count)
+    records = b"".join(BINARY_RECORD.pack(1_700_000_000 + i, 72, 98.0, 120, 80, 36.6, 50) for i in range(count))
+    return header + records
+
+
+def test_json_round_trip():
+    body = json.dumps({"device_id": "ESP32_0001", "readings": [{"heart_rate": 72}]}).encode()
+    assert decode_batch(body) == ("ESP32_0001", [{"heart_rate": 72}])
+
+
+def test_binary_round_trip_gzip():
+    device_id, readings = decode_batch(gzip.compress(binary_batch()), BINARY_CONTENT_TYPE, "gzip")
+    assert device_id == "ESP32_0001"
+    assert [r["heart_rate"] for r in readings] == [72, 72]
+
+
+@pytest.mark.parametrize("body", [
+    binary_batch()[:5],            # короче заголовка
+    binary_batch()[:15],           # обрезан счётчик записей
+    binary_batch()[:-3],           # обрезана последняя запись
+    b"VT\x01\xff" + b"x" * 10,     # device_id_len больше тела
+])
+def test_truncated_binary_is_value_error(body):
+    with pytest.raises(ValueError):
+        decode_batch(body, BINARY_CONTENT_TYPE)
+
+
+@pytest.mark.parametrize("payload", [
+    [1, 2],
+    "x",
+    None,
+    {"device_id": 5, "readings": []},
+    {"device_id": "ESP32_0001", "readings": {"heart_rate": 72}},
+    {"device_id": "ESP32_0001", "readings": [1, "x"]},
+    {"device_id": "ESP32_0001", "readings": [{"heart_rate": 72}, None]},
+])
+def test_malformed_json_payload_is_value_error(payload):
+    with pytest.raises(ValueError):
+        decode_batch(json.dumps(payload).encode(), "application/json")
+
+
+def test_malformed_msgpack_payload_is_value_error():
+    msgpack = pytest.importorskip("msgpack")
+    for payload in ([1, 2], "x", {"device_id": "ESP32_0001", "readings": [3]}):
+        with pytest.raises(ValueError):
+            decode_batch(msgpack.packb(payload), "application/msgpack")
+
+
+def test_invalid_gzip_is_value_error():
+    with pytest.raises(ValueError):
+        decode_batch(b"not gzip", "application/json", "gzip")
+    with pytest.raises(ValueError):
+        decode_batch(gzip.compress(b'{"device_id": "x", "readings": []}')[:-10], "application/json", "gzip")
+
+
+def test_gzip_bomb_is_rejected_without_full_decompression():
+    bomb = gzip.compress(b"0" * (MAX_BODY_BYTES * 4))
+    assert len(bomb) < MAX_BODY_BYTES
+    with pytest.raises(PayloadTooLargeError):
+        decode_batch(bomb, "application/json", "gzip")
+
+
+def test_oversized_raw_body_is_rejected(monkeypatch):
+    monkeypatch.setattr(vitals_codec, "MAX_BODY_BYTES", 64)
+    with pytest.raises(PayloadTooLargeError):
+        decode_batch(b" " * 65)
+
+
+@pytest.fixture
+def client():
+    pytest.importorskip("fastapi")
+    from fastapi import FastAPI
+    from fastapi.testclient import TestClient
+    from api import vitals
+
+    app = FastAPI()
+    app.include_router(vitals.router, prefix="/api/vitals")
+    return TestClient(app)
+
+
+def test_batch_endpoint_status_codes(client):
+    url = "/api/vitals/iot/batch"
+    assert client.post(url, content=binary_batch()[:-3],
+                       headers={"content-type": BINARY_CONTENT_TYPE}).status_code == 400
+    assert client.post(url, content=b"[1, 2]", headers={"content-type": "application/json"}).status_code == 400
+    assert client.post(url, content=b'{"device_id": "d", "readings": [1]}',
+                       headers={"content-type": "application/json"}).status_code == 400
+    bomb = gzip.compress(b"0" * (MAX_BODY_BYTES * 2))
+    assert client.post(url, content=bomb, headers={"content-type": "application/json",
+                                                   "content-encoding": "gzip"}).status_code == 413
@@ -0,0 +1,75 @@
+"""
+Кодирование пакетов показаний для /api/vitals/iot/batch.
+
+Бинарный формат должен совпадать с backend/core/vitals_codec.py:
+    header:  b"VT" | version:u8 | device_id_len:u8 | device_id:utf8 | count:u16
+    record:  timestamp:f64 (unix) | heart_rate:u16 | spo2:f32 | bp_sys:u16 | bp_dia:u16
+             | temperature:f32 | activity:u8
+"""
+import gzip
+import json
+import struct
+from datetime import datetime
+from typing import List, Tuple
+
+try:
+    import msgpack
+
+    MSGPACK_AVAILABLE = True
+except ImportError:
+    MSGPACK_AVAILABLE = False
+
+ENCODINGS = ("json", "msgpack", "struct")
+
+CONTENT_TYPES = {
+    "json": "application/json",
+    "msgpack": "application/msgpack",
+    "struct": "application/x-vitals",
+}
+
+BINARY_MAGIC = b"VT"
+BINARY_VERSION = 1
+BINARY_RECORD = struct.Struct("<dHfHHfB")
+
+
+def _timestamp(value) -> float:
+    if isinstance(value, str):
+        return datetime.fromisoformat(value).timestamp()
+    return float(value)
+
+
+def _encode_struct(device_id: str, readings: List[dict]) -> bytes:
+    device_bytes = device_id.encode("utf-8")
+    parts = [BINARY_MAGIC, bytes([BINARY_VERSION, len(device_bytes)]), device_bytes,
+             struct.pack("<H", len(readings))]
+    for r in readings:
+        parts.append(BINARY_RECORD.pack(
+            _timestamp(r["timestamp"]),
+            r.get("heart_rate") or 0,
+            r.get("spo2") or 0.0,
+            r.get("blood_pressure_systolic") or 0,
+            r.get("blood_pressure_diastolic") or 0,
+            r.get("temperature") or 0.0,
+            int(round((r.get("activity_level") or 0) * 100))
+        ))
+    return b"".join(parts)
+
+
+def encode_batch(device_id: str, readings: List[dict], encoding: str = "json",
+                 compress: bool = False) -> Tuple[bytes, dict]:
+    """Вернуть (body, headers) для отправки пакета"""
+    if encoding == "struct":
+        body = _encode_struct(device_id, readings)
+    elif encoding == "msgpack":
+        if not MSGPACK_AVAILABLE:
+            raise RuntimeError("msgpack is not installed")
+        body = msgpack.packb({"device_id": device_id, "readings": readings}, use_bin_type=True)
+    else:
+        body = json.dumps({"device_id": device_id, "readings": readings}, separators=(",", ":")).encode()
+
+    headers = {"Content-Type": CONTENT_TYPES[encoding]}
+    if compress:
+        # mtime=0: без времени сжатия в заголовке одинаковые пакеты дают одинаковые байты
+        body = gzip.compress(body, compresslevel=5, mtime=0)
+        headers["Content-Encoding"] = "gzip"
+    return body, headers
@@ -0,0 +1,273 @@
+#!/usr/bin/env python3
+"""
+Load-test mode for the IoT simulator.
+
+Drives tens of thousands of virtual devices from one process: a hashed
+timing wheel decides who sends on each tick, every request goes through one
+shared aiohttp connection pool, and latencies are recorded into per-endpoint
+HDR-style histograms (log-bucketed, ~1% precision, constant memory).
+"""
+import asyncio
+import logging
+import math
+import random
+import time
+from collections import defaultdict
+from typing import Callable, Dict, List, Optional
+
+import aiohttp
+
+logger = logging.getLogger(__name__)
+
+
+class LatencyHistogram:
+    """HDR-style histogram of integer microsecond values with 2^SUB_BITS sub-buckets per power of two"""
+
+    SUB_BITS = 7
+    SUB_COUNT = 1 << SUB_BITS
+    HALF_COUNT = SUB_COUNT >> 1
+
+    def __init__(self, max_shift: int = 40):
+        self.counts = [0] * ((max_shift + 2) * self.HALF_COUNT)
+        self.total = 0
+        self.max_value = 0
+        self.min_value = None
+
+    def _index(self, value: int) -> int:
+        if value < self.SUB_COUNT:
+            return value
+        shift = value.bit_length() - self.SUB_BITS
+        return shift * self.HALF_COUNT + (value >> shift)
+
+    def _value_at(self, index: int) -> int:
+        """Highest value that falls into the bucket"""
+        if index < self.SUB_COUNT:
+            return index
+        shift = index // self.HALF_COUNT - 1
+        sub = index - shift * self.HALF_COUNT
+        return ((sub + 1) << shift) - 1
+
+    def record(self, value_us: int):
+        value_us = max(0, int(value_us))
+        self.counts[self._index(value_us)] += 1
+        self.total += 1
+        if value_us > self.max_value:
+            self.max_value = value_us
+        if self.min_value is None or value_us < self.min_value:
+            self.min_value = value_us
+
+    def merge(self, other: "LatencyHistogram"):
+        for index, count in enumerate(other.counts):
+            if count:
+                self.counts[index] += count
+        self.total += other.total
+        self.max_value = max(self.max_value, other.max_value)
+        if other.min_value is not None:
+            self.min_value = other.min_value if self.min_value is None else min(self.min_value, other.min_value)
+
+    def percentiles(self, quantiles=(50, 90, 99, 99.9)) -> Dict[float, int]:
+        """Values (microseconds) at the requested percentiles, computed in one pass"""
+        if not self.total:
+            return {q: 0 for q in quantiles}
+
+        targets = sorted((max(1, math.ceil(self.total * q / 100)), q) for q in quantiles)
+        result = {}
+        seen = 0
+        pos = 0
+        for index, count in enumerate(self.counts):
+            if not count:
+                continue
+            seen += count
+            while pos < len(targets) and seen >= targets[pos][0]:
+                result[targets[pos][1]] = min(self._value_at(index), self.max_value)
+                pos += 1
+            if pos == len(targets):
+                break
+        return result
+
+
+class EndpointStats:
+    """Latency histogram plus status counters for one endpoint"""
+
+    def __init__(self):
+        self.latency = LatencyHistogram()
+        self.statuses = defaultdict(int)
+        self.errors = 0
+        self.readings = 0
+        self.bytes_sent = 0
+
+    def summary(self, elapsed: float) -> str:
+        p = self.latency.percentiles()
+        ok = sum(count for status, count in self.statuses.items() if 200 <= status < 300)
+        rate = self.latency.total / elapsed if elapsed else 0
+        readings_rate = self.readings / elapsed if elapsed else 0
+        avg_bytes = self.bytes_sent / self.latency.total if self.latency.total else 0
+        statuses = ", ".join(f"{status}={count}" for status, count in sorted(self.statuses.items()))
+        return (
+            f"{self.latency.total} req ({rate:.0f}/s, {readings_rate:.0f} readings/s, {avg_bytes:.0f} B/req), "
+            f"ok={ok}, errors={self.errors} [{statuses}] | "
+            f"p50={p[50] / 1000:.1f}ms p90={p[90] / 1000:.1f}ms p99={p[99] / 1000:.1f}ms "
+            f"p99.9={p[99.9] / 1000:.1f}ms max={self.latency.max_value / 1000:.1f}ms"
+        )
+
+
+class TimingWheel:
+    """Hashed timing wheel: O(1) schedule, O(slot) expiry per tick"""
+
+    def __init__(self, tick: float, slots: int):
+        self.tick = tick
+        self.slots: List[list] = [[] for _ in range(slots)]
+        self.position = 0
+
+    def schedule(self, item, delay: float):
+        ticks = max(1, int(round(delay / self.tick)))
+        rounds, offset = divmod(ticks, len(self.slots))
+        self.slots[(self.position + offset) % len(self.slots)].append((rounds, item))
+
+    def advance(self) -> list:
+        """Move one tick forward and return the items that expire now"""
+        self.position = (self.position + 1) % len(self.slots)
+        slot = self.slots[self.position]
+        if not slot:
+            return []
+
+        due, pending = [], []
+        for rounds, item in slot:
+            if rounds:
+                pending.append((rounds - 1, item))
+            else:
+                due.append(item)
+        self.slots[self.position] = pending
+        return due
+
+
+class ArrivalPattern:
+    """When each virtual device sends next: steady, burst or diurnal"""
+
+    def __init__(self, name: str, interval: float, burst_window: float = 0.1, diurnal_period: float = 600.0):
+        if name not in ("steady", "burst", "diurnal"):
+            raise ValueError(f"Unknown arrival pattern: {name}")
+        self.name = name
+        self.interval = interval
+        self.burst_window = burst_window
+        self.diurnal_period = diurnal_period
+        self.started = time.monotonic()
+
+    def initial_delay(self) -> float:
+        if self.name == "burst":
+            # Все устройства просыпаются в начале интервала, как после переподключения шлюзов
+            return random.uniform(0, self.interval * self.burst_window)
+        return random.uniform(0, self.interval)
+
+    def rate_factor(self, now: float) -> float:
+        """Diurnal load multiplier in [0.2, 1.0]; one simulated day per diurnal_period seconds"""
+        phase = 2 * math.pi * ((now - self.started) % self.diurnal_period) / self.diurnal_period
+        return 0.6 - 0.4 * math.cos(phase)
+
+    def next_delay(self, now: float) -> float:
+        if self.name == "steady":
+            return self.interval
+        if self.name == "burst":
+            # Держим выравнивание по границе интервала, чтобы всплески повторялись
+            elapsed = (now - self.started) % self.interval
+            return self.interval - elapsed + random.uniform(0, self.interval * self.burst_window)
+        return self.interval / self.rate_factor(now)
+
+
+class LoadGenerator:
+    """Runs many virtual devices through a timing wheel and a shared connection pool"""
+
+    def __init__(self, api_url: str, device_factory: Callable, device_count: int,
+                 pattern: ArrivalPattern, tick: float = 0.01, pool_size: int = 200,
+                 max_inflight: int = 2000, report_interval: float = 10.0):
+        self.api_url = api_url
+        self.devices = [device_factory(i) for i in range(device_count)]
+        self.pattern = pattern
+        self.tick = tick
+        self.pool_size = pool_size
+        self.max_inflight = max_inflight
+        self.report_interval = report_interval
+
+        wheel_slots = max(16, int(math.ceil(pattern.interval / tick)) + 1)
+        self.wheel = TimingWheel(tick, wheel_slots)
+        self.stats: Dict[str, EndpointStats] = defaultdict(EndpointStats)
+        self.scheduler_lag = LatencyHistogram()
+        self.inflight = 0
+        self.dropped = 0
+        self.tasks = set()
+        self.running = False
+
+    async def _send(self, session: aiohttp.ClientSession, device):
+        self.inflight += 1
+        stats = self.stats[getattr(device, "label", device.endpoint)]
+        started = time.perf_counter()
+        try:
+            status, _ = await device.send_request(session)
+            stats.statuses[status] += 1
+            stats.bytes_sent += device.last_request_bytes
+            if 200 <= status < 300:
+                stats.readings += getattr(device, "batch_size", 1)
+        except Exception:
+            stats.errors += 1
+        finally:
+            stats.latency.record((time.perf_counter() - started) * 1_000_000)
+            self.inflight -= 1
+
+    def _dispatch(self, session: aiohttp.ClientSession, due: list, now: float):
+        for device in due:
+            self.wheel.schedule(device, self.pattern.next_delay(now))
+            if self.inflight >= self.max_inflight:
+                # Не копим бесконечную очередь задач: фиксируем перегрузку генератора
+                self.dropped += 1
+                continue
+            task = asyncio.create_task(self._send(session, device))
+            self.tasks.add(task)
+            task.add_done_callback(self.tasks.discard)
+
+    def report(self, elapsed: float, final: bool = False):
+        title = "Final" if final else "Progress"
+        logger.info(f"📊 {title} after {elapsed:.0f}s: inflight={self.inflight}, dropped={self.dropped}")
+        for endpoint, stats in sorted(self.stats.items()):
+            logger.info(f"   {endpoint}: {stats.summary(elapsed)}")
+        lag = self.scheduler_lag.percentiles((50, 99))
+        logger.info(f"   scheduler lag: p50={lag[50] / 1000:.1f}ms p99={lag[99] / 1000:.1f}ms")
+
+    async def run(self, duration: Optional[float] = None):
+        self.running = True
+        for device in self.devices:
+            self.wheel.schedule(device, self.pattern.initial_delay())
+
+        connector = aiohttp.TCPConnector(limit=self.pool_size, ttl_dns_cache=300)
+        timeout = aiohttp.ClientTimeout(total=30)
+        logger.info(f"🚀 Load test: {len(self.devices)} devices, pattern={self.pattern.name}, "
+                    f"interval={self.pattern.interval}s, pool={self.pool_size}")
+
+        started = time.monotonic()
+        next_tick = started + self.tick
+        next_report = started + self.report_interval
+
+        async with aiohttp.ClientSession(connector=connector, timeout=timeout) as session:
+            while self.running:
+                now = time.monotonic()
+                if duration and now - started >= duration:
+                    break
+
+                # Догоняем пропущенные тики, если цикл событий был занят
+                while next_tick <= now:
+                    self.scheduler_lag.record((now - next_tick) * 1_000_000)
+                    self._dispatch(session, self.wheel.advance(), now)
+                    next_tick += self.tick
+
+                if now >= next_report:
+                    self.report(now - started)
+                    next_report += self.report_interval
+
+                await asyncio.sleep(max(0.0, next_tick - time.monotonic()))
+
+            if self.tasks:
+                await asyncio.gather(*self.tasks, return_exceptions=True)
+
+        self.report(time.monotonic() - started, final=True)
+
+    def stop(self):
+        self.running = False
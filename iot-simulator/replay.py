@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+"""
+Deterministic replay of a recorded ingest trace.
+
+Requests are sent with their original bodies and relative timing scaled by
+--speed (1 = real time, N = N times faster, 0 = as fast as possible). The
+backend reports per-stage timings in the Server-Timing header; they are
+aggregated into per-stage histograms next to the client-side latency.
+"""
+import asyncio
+import logging
+import time
+from collections import defaultdict
+from typing import Dict
+
+import aiohttp
+
+from loadgen import EndpointStats, LatencyHistogram
+from traffic_log import read_trace
+
+logger = logging.getLogger(__name__)
+
+
+def parse_server_timing(header: str) -> Dict[str, float]:
+    """'db_write;dur=1.2, redis;dur=0.4' -> {'db_write': 1.2, 'redis': 0.4} (milliseconds)"""
+    stages = {}
+    for entry in header.split(","):
+        parts = [p.strip() for p in entry.split(";")]
+        if not parts[0]:
+            continue
+        for param in parts[1:]:
+            if param.startswith("dur="):
+                try:
+                    stages[parts[0]] = float(param[4:])
+                except ValueError:
+                    pass
+    return stages
+
+
+class TraceReplayer:
+    def __init__(self, api_url: str, trace_path: str, speed: float = 1.0,
+                 pool_size: int = 200, max_inflight: int = 1000):
+        self.api_url = api_url
+        self.trace_path = trace_path
+        self.speed = speed
+        self.pool_size = pool_size
+        self.semaphore = asyncio.Semaphore(max_inflight)
+        self.stats: Dict[str, EndpointStats] = defaultdict(EndpointStats)
+        self.stages: Dict[str, LatencyHistogram] = defaultdict(LatencyHistogram)
+
+    async def _send(self, session: aiohttp.ClientSession, record):
+        stats = self.stats[record.endpoint]
+        started = time.perf_counter()
+        try:
+            async with session.post(f"{self.api_url}{record.endpoint}", data=record.body,
+                                    headers=record.headers) as response:
+                await response.read()
+                stats.statuses[response.status] += 1
+                stats.bytes_sent += len(record.body)
+                for stage, ms in parse_server_timing(response.headers.get("Server-Timing", "")).items():
+                    self.stages[stage].record(ms * 1000)
+        except Exception:
+            stats.errors += 1
+        finally:
+            stats.latency.record((time.perf_counter() - started) * 1_000_000)
+            self.semaphore.release()
+
+    async def run(self):
+        connector = aiohttp.TCPConnector(limit=self.pool_size, ttl_dns_cache=300)
+        timeout = aiohttp.ClientTimeout(total=30)
+        speed = "max" if not self.speed else f"{self.speed}x"
+        logger.info(f"▶️  Replaying {self.trace_path} at {speed} against {self.api_url}")
+
+        tasks = set()
+        started = time.monotonic()
+        async with aiohttp.ClientSession(connector=connector, timeout=timeout) as session:
+            for record in read_trace(self.trace_path):
+                if self.speed:
+                    delay = record.offset / self.speed - (time.monotonic() - started)
+                    if delay > 0:
+                        await asyncio.sleep(delay)
+
+                await self.semaphore.acquire()
+                task = asyncio.create_task(self._send(session, record))
+                tasks.add(task)
+                task.add_done_callback(tasks.discard)
+
+            if tasks:
+                await asyncio.gather(*tasks, return_exceptions=True)
+
+        self.report(time.monotonic() - started)
+
+    def report(self, elapsed: float):
+        logger.info(f"📊 Replay finished in {elapsed:.1f}s")
+        for endpoint, stats in sorted(self.stats.items()):
+            logger.info(f"   {endpoint}: {stats.summary(elapsed)}")
+        if not self.stages:
+            logger.info("   server did not return Server-Timing headers")
+        for stage, histogram in sorted(self.stages.items()):
+            p = histogram.percentiles((50, 90, 99))
+            logger.info(f"   server {stage}: p50={p[50] / 1000:.2f}ms p90={p[90] / 1000:.2f}ms "
+                        f"p99={p[99] / 1000:.2f}ms max={histogram.max_value / 1000:.2f}ms")
@@ -7,15 +7,41 @@ import logging
 from datetime import datetime
 import math
 import os
+import argparse
+from typing import Optional
+
+from codec import ENCODINGS, encode_batch
+from loadgen import ArrivalPattern, LoadGenerator
+from replay import TraceReplayer
+from traffic_log import TraceWriter
+
+# Начало виртуальных часов при --seed без --clock-start: одинаковые прогоны дают одинаковые байты
+SEEDED_CLOCK_START = 1_700_000_000.0
 
 logging.basicConfig(level=logging.INFO, format='%(asctime)s %(levelname)s:%(name)s:%(message)s')
 logger = logging.getLogger(__name__)
 
 
 class IoTDeviceSimulator:
-    def __init__(self, device_id: str, api_url: str):
+    def __init__(self, device_id: str, api_url: str, batch_size: int = 1, encoding: str = "json",
+                 compress: bool = False, reading_interval: float = 10, seed: Optional[int] = None,
+                 clock_start: Optional[float] = None, recorder: Optional[TraceWriter] = None):
         self.device_id = device_id
         self.api_url = api_url
+        # Транспорт: размер пакета, формат и сжатие
+        self.batch_size = batch_size
+        self.encoding = encoding
+        self.compress = compress
+        self.reading_interval = reading_interval
+        self.last_request_bytes = 0
+        # С seed у каждого устройства свой детерминированный генератор
+        self.seed = seed
+        self.rng = random.Random(f"{seed}:{device_id}") if seed is not None else random
+        # Виртуальные часы: clock_start + номер показания * reading_interval
+        self.clock_start = clock_start if clock_start is not None else (
+            SEEDED_CLOCK_START if seed is not None else None)
+        self.readings_generated = 0
+        self.recorder = recorder
         self.running = False
         self.base_hr = 75
         self.base_temp = 36.6
@@ -25,40 +51,52 @@ class IoTDeviceSimulator:
         self.activity_level = 0
         self.stress_level = 0
 
+    @property
+    def virtual_clock(self) -> bool:
+        return self.clock_start is not None
+
+    def _vitals_clock(self) -> float:
+        """Wall clock, or a virtual clock advancing by reading_interval per reading (for replayable runs)"""
+        if not self.virtual_clock:
+            return datetime.now().timestamp()
+        return self.clock_start + self.readings_generated * self.reading_interval
+
     def generate_vitals(self):
         """Generate realistic vital signs with variations"""
         # Time-based variations
-        time_factor = math.sin(datetime.now().timestamp() / 3600) * 0.1
+        timestamp = self._vitals_clock()
+        time_factor = math.sin(timestamp / 3600) * 0.1
+        self.readings_generated += 1
 
         # Activity simulation
-        if random.random() < 0.1:  # 10% chance of activity change
-            self.activity_level = random.uniform(0, 1)
+        if self.rng.random() < 0.1:  # 10% chance of activity change
+            self.activity_level = self.rng.uniform(0, 1)
 
         # Stress simulation
-        if random.random() < 0.05:  # 5% chance of stress event
-            self.stress_level = random.uniform(0, 1)
+        if self.rng.random() < 0.05:  # 5% chance of stress event
+            self.stress_level = self.rng.uniform(0, 1)
         else:
             self.stress_level *= 0.95  # Gradual decrease
 
         # Calculate vitals
-        hr = self.base_hr + (self.activity_level * 40) + (self.stress_level * 20) + random.gauss(0, 3) + time_factor * 5
-        temp = self.base_temp + (self.activity_level * 0.5) + random.gauss(0, 0.1)
-        spo2 = self.base_spo2 - (self.activity_level * 2) + random.gauss(0, 0.5)
+        hr = self.base_hr + (self.activity_level * 40) + (self.stress_level * 20) + self.rng.gauss(0, 3) + time_factor * 5
+        temp = self.base_temp + (self.activity_level * 0.5) + self.rng.gauss(0, 0.1)
+        spo2 = self.base_spo2 - (self.activity_level * 2) + self.rng.gauss(0, 0.5)
         spo2 = max(94, min(100, spo2))  # Clamp to realistic range
-        bp_sys = self.base_bp_sys + (self.activity_level * 20) + (self.stress_level * 15) + random.gauss(0, 5)
-        bp_dia = self.base_bp_dia + (self.activity_level * 10) + (self.stress_level * 8) + random.gauss(0, 3)
+        bp_sys = self.base_bp_sys + (self.activity_level * 20) + (self.stress_level * 15) + self.rng.gauss(0, 5)
+        bp_dia = self.base_bp_dia + (self.activity_level * 10) + (self.stress_level * 8) + self.rng.gauss(0, 3)
 
         # Occasional anomalies
-        if random.random() < 0.02:  # 2% chance
-            anomaly_type = random.choice(["hr", "bp", "spo2", "temp"])
+        if self.rng.random() < 0.02:  # 2% chance
+            anomaly_type = self.rng.choice(["hr", "bp", "spo2", "temp"])
             if anomaly_type == "hr":
-                hr = random.choice([45, 140])  # Bradycardia or tachycardia
+                hr = self.rng.choice([45, 140])  # Bradycardia or tachycardia
             elif anomaly_type == "bp":
-                bp_sys = random.choice([90, 160])  # Hypotension or hypertension
+                bp_sys = self.rng.choice([90, 160])  # Hypotension or hypertension
             elif anomaly_type == "spo2":
-                spo2 = random.uniform(88, 93)  # Low oxygen
+                spo2 = self.rng.uniform(88, 93)  # Low oxygen
             elif anomaly_type == "temp":
-                temp = random.uniform(37.8, 39.0)  # Fever
+                temp = self.rng.uniform(37.8, 39.0)  # Fever
 
         return {
             "heart_rate": int(hr),
@@ -67,31 +105,86 @@ class IoTDeviceSimulator:
             "blood_pressure_systolic": int(bp_sys),
             "blood_pressure_diastolic": int(bp_dia),
             "activity_level": round(self.activity_level, 2),
-            "timestamp": datetime.now().isoformat()
+            # На виртуальных часах — epoch: локальное время зависело бы от часового пояса машины
+            "timestamp": timestamp if self.virtual_clock else datetime.fromtimestamp(timestamp).isoformat()
         }
 
-    async def send_data(self, session: aiohttp.ClientSession):
-        """Send data to API"""
-        vitals = self.generate_vitals()
+    @property
+    def batched(self) -> bool:
+        return self.batch_size > 1 or self.encoding != "json" or self.compress
 
-        # Format for IoT endpoint
-        payload = {
-            "device_id": self.device_id,
-            "data": vitals
-        }
+    @property
+    def endpoint(self) -> str:
+        return "/vitals/iot/batch" if self.batched else "/vitals/iot"
+
+    @property
+    def label(self) -> str:
+        """Endpoint plus transport, used as the stats key in load mode"""
+        if not self.batched:
+            return self.endpoint
+        return f"{self.endpoint} [{self.encoding}{'+gzip' if self.compress else ''} x{self.batch_size}]"
+
+    def generate_batch(self) -> list:
+        """batch_size readings spaced by reading_interval, the newest one now (or at the virtual clock)"""
+        if self.virtual_clock:
+            readings = []
+            for _ in range(self.batch_size):
+                timestamp = self._vitals_clock()
+                vitals = self.generate_vitals()
+                vitals["timestamp"] = timestamp
+                readings.append(vitals)
+            return readings
+
+        now = datetime.now().timestamp()
+        readings = []
+        for i in range(self.batch_size):
+            vitals = self.generate_vitals()
+            vitals["timestamp"] = now - (self.batch_size - 1 - i) * self.reading_interval
+            readings.append(vitals)
+        return readings
+
+    async def send_request(self, session: aiohttp.ClientSession):
+        """Send one reading (or one batch), returns (status, vitals)"""
+        if self.batched:
+            vitals = self.generate_batch()
+            body, headers = encode_batch(self.device_id, vitals, self.encoding, self.compress)
+        else:
+            vitals = self.generate_vitals()
+
+            # Format for IoT endpoint
+            payload = {
+                "device_id": self.device_id,
+                "data": vitals
+            }
+            body = json.dumps(payload).encode()
+            headers = {"Content-Type": "application/json"}
+
+        self.last_request_bytes = len(body)
+        if self.recorder:
+            self.recorder.write(self.device_id, self.endpoint, headers, body)
 
+        async with session.post(
+                f"{self.api_url}{self.endpoint}",
+                data=body,
+                headers=headers
+        ) as response:
+            if response.status != 200:
+                vitals = await response.text()
+            else:
+                await response.read()
+            return response.status, vitals
+
+    async def send_data(self, session: aiohttp.ClientSession):
+        """Send data to API"""
         try:
-            async with session.post(
-                    f"{self.api_url}/vitals/iot",
-                    json=payload,
-                    headers={"Content-Type": "application/json"}
-            ) as response:
-                if response.status == 200:
-                    logger.info(
-                        f"✅ {self.device_id}: HR={vitals['heart_rate']}, SpO2={vitals['spo2']}, BP={vitals['blood_pressure_systolic']}/{vitals['blood_pressure_diastolic']}")
-                else:
-                    response_text = await response.text()
-                    logger.error(f"❌ {self.device_id}: HTTP {response.status} - {response_text}")
+            status, vitals = await self.send_request(session)
+            if status == 200 and self.batched:
+                logger.info(f"✅ {self.device_id}: batch of {len(vitals)} readings, {self.last_request_bytes} bytes")
+            elif status == 200:
+                logger.info(
+                    f"✅ {self.device_id}: HR={vitals['heart_rate']}, SpO2={vitals['spo2']}, BP={vitals['blood_pressure_systolic']}/{vitals['blood_pressure_diastolic']}")
+            else:
+                logger.error(f"❌ {self.device_id}: HTTP {status} - {vitals}")
         except Exception as e:
             logger.error(f"❌ {self.device_id}: {e}")
 
@@ -100,10 +193,12 @@ class IoTDeviceSimulator:
         self.running = True
         logger.info(f"🚀 {self.device_id} started - sending every {interval}s")
 
+        self.reading_interval = interval
         async with aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=30)) as session:
             while self.running:
                 await self.send_data(session)
-                await asyncio.sleep(interval)
+                # Пакет из N показаний отправляется раз в N интервалов
+                await asyncio.sleep(interval * self.batch_size)
 
     def stop(self):
         """Stop the simulator"""
@@ -112,13 +207,14 @@ class IoTDeviceSimulator:
 
 
 class MultiDeviceSimulator:
-    def __init__(self, api_url: str):
+    def __init__(self, api_url: str, **transport):
         self.api_url = api_url
         self.devices = []
+        self.transport = transport
 
     def add_device(self, device_id: str):
         """Add a device to simulate"""
-        device = IoTDeviceSimulator(device_id, self.api_url)
+        device = IoTDeviceSimulator(device_id, self.api_url, **self.transport)
         self.devices.append(device)
         return device
 
@@ -131,17 +227,13 @@ class MultiDeviceSimulator:
         await asyncio.gather(*tasks)
 
 
-async def main():
-    """Основная функция"""
+async def run_simple(args, API_URL: str, recorder: Optional[TraceWriter] = None):
+    """Обычный режим: несколько устройств, лог каждой отправки"""
     print("🏥 Medical IoT Simulator - ПРОСТАЯ ВЕРСИЯ")
     print("=" * 50)
 
-    # Configuration
-    API_URL = os.getenv("API_URL", "http://nginx/api")  # Through nginx in Docker
-    # API_URL = "http://localhost/api"  # Local testing through nginx
-
     # Create simulator
-    simulator = MultiDeviceSimulator(API_URL)
+    simulator = MultiDeviceSimulator(API_URL, reading_interval=args.interval, **transport_options(args, recorder))
 
     # Add devices
     devices = [
@@ -158,10 +250,107 @@ async def main():
     logger.info("💡 Для остановки нажмите Ctrl+C")
 
     try:
-        await simulator.run_all(interval=10)
+        await simulator.run_all(interval=args.interval)
     except KeyboardInterrupt:
         logger.info("⏹️  Симулятор остановлен пользователем")
 
 
+async def run_load_test(args, api_url: str, recorder: Optional[TraceWriter] = None):
+    """Режим нагрузочного тестирования: тысячи виртуальных устройств в одном процессе"""
+    # Устройство с пакетами по N показаний отправляет запрос раз в N интервалов
+    pattern = ArrivalPattern(
+        args.pattern,
+        interval=args.interval * args.batch_size,
+        burst_window=args.burst_window,
+        diurnal_period=args.diurnal_period
+    )
+    generator = LoadGenerator(
+        api_url,
+        device_factory=lambda i: IoTDeviceSimulator(
+            f"{args.device_prefix}{i + 1:06d}", api_url, reading_interval=args.interval,
+            **transport_options(args, recorder)
+        ),
+        device_count=args.devices,
+        pattern=pattern,
+        tick=args.tick,
+        pool_size=args.pool_size,
+        max_inflight=args.max_inflight,
+        report_interval=args.report_interval
+    )
+    await generator.run(duration=args.duration)
+
+
+def transport_options(args, recorder: Optional[TraceWriter] = None) -> dict:
+    return {
+        "batch_size": args.batch_size,
+        "encoding": args.encoding,
+        "compress": args.compress,
+        "seed": args.seed,
+        "clock_start": args.clock_start,
+        "recorder": recorder
+    }
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Medical IoT simulator")
+    parser.add_argument("--mode", choices=["simple", "load", "replay"], default=os.getenv("SIMULATOR_MODE", "simple"))
+    parser.add_argument("--interval", type=float, default=10, help="seconds between readings per device")
+    parser.add_argument("--seed", type=int, default=None,
+                        help="deterministic per-device vitals and timestamps (virtual clock)")
+    parser.add_argument("--clock-start", type=float, default=None,
+                        help=f"unix time of the first reading on the virtual clock "
+                             f"(default with --seed: {SEEDED_CLOCK_START:.0f})")
+    parser.add_argument("--record", metavar="PATH", help="write every sent request to a trace file")
+
+    replay = parser.add_argument_group("replay mode")
+    replay.add_argument("--trace", metavar="PATH", help="trace file to replay")
+    replay.add_argument("--speed", type=float, default=1.0, help="1 = real time, N = N times faster, 0 = max")
+
+    transport = parser.add_argument_group("transport")
+    transport.add_argument("--batch-size", type=int, default=1, help="readings per request")
+    transport.add_argument("--encoding", choices=ENCODINGS, default="json")
+    transport.add_argument("--compress", action="store_true", help="gzip request bodies")
+
+    load = parser.add_argument_group("load mode")
+    load.add_argument("--devices", type=int, default=10_000)
+    load.add_argument("--device-prefix", default="LOAD_")
+    load.add_argument("--pattern", choices=["steady", "burst", "diurnal"], default="steady")
+    load.add_argument("--burst-window", type=float, default=0.1, help="share of interval used by a burst")
+    load.add_argument("--diurnal-period", type=float, default=600, help="seconds per simulated day")
+    load.add_argument("--duration", type=float, default=60, help="seconds, 0 = until Ctrl+C")
+    load.add_argument("--tick", type=float, default=0.01, help="timing wheel resolution, seconds")
+    load.add_argument("--pool-size", type=int, default=200, help="max open HTTP connections")
+    load.add_argument("--max-inflight", type=int, default=2000)
+    load.add_argument("--report-interval", type=float, default=10)
+    return parser.parse_args()
+
+
+async def main():
+    """Основная функция"""
+    args = parse_args()
+
+    # Configuration
+    API_URL = os.getenv("API_URL", "http://nginx/api")  # Through nginx in Docker
+    # API_URL = "http://localhost/api"  # Local testing through nginx
+
+    if args.mode == "replay":
+        if not args.trace:
+            raise SystemExit("--trace is required in replay mode")
+        await TraceReplayer(API_URL, args.trace, speed=args.speed,
+                            pool_size=args.pool_size, max_inflight=args.max_inflight).run()
+        return
+
+    recorder = TraceWriter(args.record) if args.record else None
+    try:
+        if args.mode == "load":
+            await run_load_test(args, API_URL, recorder)
+        else:
+            await run_simple(args, API_URL, recorder)
+    finally:
+        if recorder:
+            recorder.close()
+            logger.info(f"💾 Recorded {recorder.count} requests to {args.record}")
+
+
 if __name__ == "__main__":
     asyncio.run(main())
\ No newline at end of file
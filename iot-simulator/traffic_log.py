@@ -0,0 +1,83 @@
+"""
+Compact on-disk log of ingest requests for deterministic replay.
+
+File layout (gzip stream):
+    b"IOTTRACE1\\n"
+    record*: <d offset_s> <H device_len> <H endpoint_len> <H headers_len> <I body_len>
+             device_id | endpoint | headers (compact JSON) | body (raw request bytes)
+
+offset_s is seconds since the first recorded request, so a trace can be
+replayed at any speed.
+
+Traces come from the simulator itself (--record) or from real devices: with
+IOT_TRACE_PATH set, the backend writes the same format for every request to
+/api/vitals/iot and /api/vitals/iot/batch (backend/core/traffic_capture.py).
+"""
+import gzip
+import json
+import struct
+import time
+from typing import Iterator, NamedTuple
+
+TRACE_MAGIC = b"IOTTRACE1\n"
+RECORD_HEADER = struct.Struct("<dHHHI")
+
+
+class TraceRecord(NamedTuple):
+    offset: float
+    device_id: str
+    endpoint: str
+    headers: dict
+    body: bytes
+
+
+class TraceWriter:
+    """Append-only trace writer; safe to share between devices within one event loop"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.file = gzip.open(path, "wb", compresslevel=6)
+        self.file.write(TRACE_MAGIC)
+        self.started = None
+        self.count = 0
+
+    def write(self, device_id: str, endpoint: str, headers: dict, body: bytes):
+        now = time.monotonic()
+        if self.started is None:
+            self.started = now
+
+        device = device_id.encode("utf-8")
+        path = endpoint.encode("utf-8")
+        header_bytes = json.dumps(headers, separators=(",", ":")).encode()
+        self.file.write(RECORD_HEADER.pack(now - self.started, len(device), len(path), len(header_bytes), len(body)))
+        self.file.write(device + path + header_bytes + body)
+        self.count += 1
+
+    def close(self):
+        self.file.close()
+
+
+def read_trace(path: str) -> Iterator[TraceRecord]:
+    with gzip.open(path, "rb") as f:
+        if f.read(len(TRACE_MAGIC)) != TRACE_MAGIC:
+            raise ValueError(f"{path} is not an IoT trace file")
+
+        while True:
+            header = f.read(RECORD_HEADER.size)
+            if not header:
+                return
+            if len(header) < RECORD_HEADER.size:
+                raise ValueError(f"Truncated trace record in {path}")
+
+            offset, device_len, endpoint_len, headers_len, body_len = RECORD_HEADER.unpack(header)
+            payload = f.read(device_len + endpoint_len + headers_len + body_len)
+            device_end = device_len
+            endpoint_end = device_end + endpoint_len
+            headers_end = endpoint_end + headers_len
+            yield TraceRecord(
+                offset,
+                payload[:device_end].decode("utf-8"),
+                payload[device_end:endpoint_end].decode("utf-8"),
+                json.loads(payload[endpoint_end:headers_end]),
+                payload[headers_end:]
+            )